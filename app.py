@@ -1,9 +1,11 @@
-from flask import request
+import os
 
-from settings import app, server
+from flask import Flask, Response, request
+
+import settings
+from base.metrics import registry, CONTENT_TYPE
 
 
-@app.route('/', methods=['GET'])
 def verify():
     """
     When the endpoint is registered as a webhook, it must echo back
@@ -17,9 +19,40 @@ def verify():
     return "Hello world", 200
 
 
-@app.route('/', methods=['POST'])
 def listen():
-    return server.handle_request(request)
+    return settings.get_server().handle_request(request)
+
+
+def metrics():
+    """
+    Metrics of current process in Prometheus text format
+    """
+    return Response(registry.render(), content_type=CONTENT_TYPE)
+
+
+def create_app(preload=True):
+    """
+    Create flask app.
+    Webhook server is created on first request in process or by
+    gunicorn post_fork hook, so connections and threads are never
+    shared by forked workers
+
+    :param: preload: bool: load classifier and dictionaries now,
+            otherwise they are loaded on first use
+    :return: flask.Flask
+    """
+    if preload:
+        settings.preload()
+
+    app = Flask(__name__)
+    app.add_url_rule('/', 'verify', verify, methods=['GET'])
+    app.add_url_rule('/', 'listen', listen, methods=['POST'])
+    app.add_url_rule('/metrics', 'metrics', metrics, methods=['GET'])
+    return app
+
+
+# LAZY_LOADING=1 speeds up startup when it's not forked, e.g. in development
+app = create_app(preload=os.environ.get('LAZY_LOADING') != '1')
 
 if __name__ == '__main__':
     app.run(debug=True)
@@ -0,0 +1,98 @@
+import os
+import json
+from urllib.parse import parse_qs
+
+import settings
+from base.aio import close_session
+from base.metrics import registry, CONTENT_TYPE
+from base.server import STAGE_SECONDS
+
+
+# LAZY_LOADING=1 loads classifier and dictionaries on first use
+if os.environ.get('LAZY_LOADING') != '1':
+    settings.preload()
+
+
+async def send_response(send, body, status,
+                        content_type='text/plain; charset=utf-8'):
+    """
+    Send plain text response
+
+    :param: send: ASGI send callable
+    :param: body: str
+    :param: status: int
+    :param: content_type: str
+    """
+    await send({
+        'type': 'http.response.start',
+        'status': status,
+        'headers': [(b'content-type', content_type.encode('utf-8'))],
+    })
+    await send({'type': 'http.response.body', 'body': body.encode('utf-8')})
+
+
+async def read_body(receive):
+    """
+    Read whole request body
+
+    :param: receive: ASGI receive callable
+    :return: bytes
+    """
+    body = b''
+    more_body = True
+    while more_body:
+        message = await receive()
+        body += message.get('body', b'')
+        more_body = message.get('more_body', False)
+    return body
+
+
+async def verify(scope):
+    """
+    When the endpoint is registered as a webhook, it must echo back
+    the 'hub.challenge' value it receives in the query arguments
+    """
+    args = {key: values[0] for key, values in
+            parse_qs(scope['query_string'].decode('utf-8')).items()}
+    if args.get("hub.mode") == "subscribe" and args.get("hub.challenge"):
+        if not args.get("hub.verify_token") == os.environ["VERIFY_TOKEN"]:
+            return "Verification token mismatch", 403
+        return args["hub.challenge"], 200
+
+    return "Hello world", 200
+
+
+async def lifespan(receive, send):
+    while True:
+        message = await receive()
+        if message['type'] == 'lifespan.startup':
+            settings.get_async_server()
+            await send({'type': 'lifespan.startup.complete'})
+        elif message['type'] == 'lifespan.shutdown':
+            await close_session()
+            await send({'type': 'lifespan.shutdown.complete'})
+            return
+
+
+async def app(scope, receive, send):
+    """
+    ASGI application, e.g. `uvicorn asgi:app`
+    """
+    if scope['type'] == 'lifespan':
+        await lifespan(receive, send)
+        return
+
+    if scope['path'] == '/metrics' and scope['method'] == 'GET':
+        await send_response(send, registry.render(), 200, CONTENT_TYPE)
+    elif scope['path'] != '/':
+        await send_response(send, "Not found", 404)
+    elif scope['method'] == 'GET':
+        await send_response(send, *(await verify(scope)))
+    elif scope['method'] == 'POST':
+        body = await read_body(receive)
+        with STAGE_SECONDS.time(stage='parse'):
+            data = json.loads(body.decode('utf-8'))
+        server = settings.get_async_server()
+        await send_response(send, *(await server.handle_request(data)))
+    else:
+        await send_response(send, "Method not allowed", 405)
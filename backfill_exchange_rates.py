@@ -0,0 +1,57 @@
+import os
+import argparse
+from datetime import datetime, timedelta
+
+from mongoengine import connect
+
+from base.exchange_rates import (ExchangeRateService, CURRENCY_IDS,
+                                 BASE_CURRENCY)
+from base.models import ExchangeRate
+
+
+# cbr.ru answers slowly on long periods, so period is loaded in chunks
+CHUNK_DAYS = 365
+
+
+def parse_date(value):
+    return datetime.strptime(value, '%Y-%m-%d').date()
+
+
+def main():
+    """
+    Loading historical exchange rates from cbr.ru to MongoDB
+    """
+    parser = argparse.ArgumentParser(description=main.__doc__)
+    parser.add_argument('date_from', type=parse_date, help='YYYY-MM-DD')
+    parser.add_argument('date_to', type=parse_date, nargs='?',
+                        default=datetime.now().date(), help='YYYY-MM-DD')
+    parser.add_argument('--currency', action='append',
+                        choices=sorted(CURRENCY_IDS))
+    parser.add_argument('--replace', action='store_true',
+                        help='remove saved rates of period before loading, '
+                             'e.g. ones saved by previous versions')
+    args = parser.parse_args()
+
+    connect(host=os.environ.get('MONGODB_URI'))
+    service = ExchangeRateService()
+
+    for currency in args.currency or sorted(CURRENCY_IDS):
+        chunk_from = args.date_from
+        while chunk_from <= args.date_to:
+            chunk_to = min(chunk_from + timedelta(days=CHUNK_DAYS - 1),
+                           args.date_to)
+            if args.replace:
+                # previous versions saved today's rate under requested
+                # dates, cbr.ru has no rates to overwrite them on holidays
+                ExchangeRate.objects(
+                    currency_from=currency, currency_to=BASE_CURRENCY,
+                    date__gte=chunk_from, date__lte=chunk_to
+                ).delete()
+            count = service.backfill(currency, chunk_from, chunk_to)
+            print("{}: {} - {}: {} rates".format(currency, chunk_from,
+                                                 chunk_to, count))
+            chunk_from = chunk_to + timedelta(days=1)
+
+
+if __name__ == '__main__':
+    main()
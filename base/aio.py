@@ -0,0 +1,43 @@
+import asyncio
+import functools
+
+import aiohttp
+
+
+_session = None
+
+
+def get_session():
+    """
+    Get aiohttp client session shared by all coroutines of the event loop
+
+    :return: aiohttp.ClientSession
+    """
+    global _session
+    if _session is None or _session.closed:
+        _session = aiohttp.ClientSession()
+    return _session
+
+
+async def close_session():
+    """
+    Close shared client session
+    """
+    global _session
+    if _session is not None:
+        await _session.close()
+        _session = None
+
+
+async def run_blocking(func, *args, **kwargs):
+    """
+    Run blocking function (mongoengine query, CPU bound handler)
+    in default executor of the event loop
+
+    :param: func: callable
+    :return: func result
+    """
+    loop = asyncio.get_event_loop()
+    return await loop.run_in_executor(
+        None, functools.partial(func, *args, **kwargs)
+    )
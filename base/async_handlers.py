@@ -0,0 +1,160 @@
+import os
+import json
+import asyncio
+
+from .aio import get_session, run_blocking
+from .dates import parse_period
+from .exchange_rates import CBR_DATE_FORMAT
+from .utils import log, WARNING, ERROR
+from .handlers import (
+    get_message_date, exchange_rate_service, format_exchange_rate_message,
+    format_exchange_rate_period_message, weather_service,
+    format_weather_message,
+    data_science_message_handler, choose_phrase_message_handler,
+    usd_rub_rate_postback_handler, euro_rub_rate_postback_handler
+)
+
+
+# dates -> futures of cbr.ru documents being loaded
+_exchange_rates_loading = dict()
+
+
+async def load_exchange_rates(date):
+    """
+    Load cbr.ru rates document and save its rates,
+    concurrent calls for the same date share one download
+
+    :param: date: datetime.date
+    :return: dict: currency char code -> rate
+    """
+    future = _exchange_rates_loading.get(date)
+    if future is None:
+        future = asyncio.ensure_future(_load_exchange_rates(date))
+        _exchange_rates_loading[date] = future
+        future.add_done_callback(
+            lambda _: _exchange_rates_loading.pop(date, None)
+        )
+    return await asyncio.shield(future)
+
+
+async def _load_exchange_rates(date):
+    params = {'date_req': date.strftime(CBR_DATE_FORMAT)}
+    async with get_session().get(exchange_rate_service.url,
+                                 params=params) as response:
+        xml_text = await response.text()
+    return await run_blocking(exchange_rate_service.ingest, date, xml_text)
+
+
+# Message handlers
+async def exchange_rate_date_message_handler(currency_from, currency_to,
+                                             request):
+    """
+    Get exchange rate for specified period
+
+    :param: currency_from: str
+    :param: currency_to: str
+    :param: request: dict
+    """
+    text = request.get('text')
+    period = parse_period(text)
+    if period:
+        stats = await run_blocking(exchange_rate_service.get_period_stats,
+                                   currency_from, currency_to, *period)
+        return format_exchange_rate_period_message(
+            currency_from, currency_to, period, stats
+        ), None
+
+    date = await run_blocking(get_message_date, text)
+
+    rate = await run_blocking(exchange_rate_service.get_known_rate,
+                              currency_from, currency_to, date)
+    if rate is None:
+        rates = await load_exchange_rates(date)
+        rate = rates.get(currency_from)
+
+    return format_exchange_rate_message(currency_from, currency_to, date,
+                                        rate), None
+
+
+async def usd_rub_exchange_rate_date_message_handler(request):
+    return await exchange_rate_date_message_handler('USD', 'RUB', request)
+
+
+async def euro_rub_exchange_rate_date_message_handler(request):
+    return await exchange_rate_date_message_handler('EUR', 'RUB', request)
+
+
+# cities -> futures of weather being loaded
+_weather_loading = dict()
+# background refreshes of stale weather, kept until they are done
+_weather_refreshing = set()
+
+
+def load_weather(city):
+    """
+    Load weather from openweathermap.org and save it,
+    concurrent calls for the same city share one request
+
+    :param: city: str
+    :return: asyncio.Future: CityWeather
+    """
+    future = _weather_loading.get(city)
+    if future is None:
+        future = asyncio.ensure_future(_load_weather(city))
+        _weather_loading[city] = future
+        future.add_done_callback(lambda _: _weather_loading.pop(city, None))
+    return future
+
+
+async def _load_weather(city):
+    payload = {'q': city, 'units': 'metric',
+               'appid': os.environ.get('OWM_APPID')}
+    async with get_session().get(weather_service.url,
+                                 params=payload) as response:
+        if response.status != 200:
+            log("openweathermap.org responded %s", response.status,
+                level=WARNING)
+        data = json.loads(await response.text())
+
+    return await run_blocking(weather_service.store, city, data)
+
+
+def refresh_weather(city):
+    """
+    Load weather in background, errors are logged
+
+    :param: city: str
+    """
+    future = load_weather(city)
+    _weather_refreshing.add(future)
+    future.add_done_callback(_weather_refreshed)
+
+
+def _weather_refreshed(future):
+    _weather_refreshing.discard(future)
+    if not future.cancelled() and future.exception() is not None:
+        log(future.exception(), level=ERROR)
+
+
+# Postback handlers
+async def weather_postback_handler(city):
+    """
+    Get weather data from openweathermap.org
+
+    :param: city: str: openweathermap.org city name
+    """
+    weather, fresh = await run_blocking(weather_service.get_cached, city)
+    if weather is None:
+        weather = await asyncio.shield(load_weather(city))
+    elif not fresh:
+        refresh_weather(city)
+
+    return format_weather_message(weather), None
+
+
+async def current_weather_message_handler(request):
+    return await weather_postback_handler('Moscow')
+
+
+async def spb_weather_postback_handler(request):
+    return await weather_postback_handler('Saint Petersburg')
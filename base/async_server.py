@@ -0,0 +1,172 @@
+import asyncio
+import inspect
+
+from .aio import run_blocking
+from .utils import log, DEBUG, ERROR
+from .exceptions import (MessageHandlerNotSettedException,
+                         PostbackHandlerUndefinedException)
+from .server import (WebhookServer, group_events_by_sender,
+                     REQUEST_SECONDS, STAGE_SECONDS, HANDLER_SECONDS,
+                     EVENTS, EVENT_ERRORS)
+
+
+class AsyncWebhookServer(WebhookServer):
+    """
+    Webhook server for asyncio event loop.
+    Handlers can be coroutine functions or plain functions,
+    plain functions and database queries are run in executor
+    """
+
+    def create_batch_executor(self):
+        # senders are handled concurrently by event loop
+        return None
+
+    async def call_handler(self, handler, request):
+        """
+        Call message or postback handler
+
+        :param: handler: function or coroutine function
+        :param: request: dict
+        :return: (str, str): Pair of message and next handler code
+        """
+        if inspect.iscoroutinefunction(handler):
+            return await handler(request)
+
+        return await run_blocking(handler, request)
+
+    async def send_message(self, recipient_id, message_text):
+        """
+        Send message to recipient, retrying and throttling
+        like threaded server
+
+        :param: recipient_id: int
+        :param: message_text: str
+        """
+        log("sending message to %s: %s", recipient_id, message_text,
+            level=DEBUG)
+        await self.sender.send_aio(recipient_id, message_text)
+
+    async def handle_message(self, message, sender_id):
+        """
+        Handle a message
+
+        :param: message: dict
+        :param: sender_id: int
+        """
+        with STAGE_SECONDS.time(stage='user_state'):
+            message_handler_code = await run_blocking(
+                self.get_user_message_handler_code, sender_id
+            )
+        message_handler = self.message_handlers.get(message_handler_code)
+        if not message_handler:
+            raise MessageHandlerNotSettedException
+
+        with HANDLER_SECONDS.time(handler=message_handler_code):
+            reponse_message, next_handler = await self.call_handler(
+                message_handler, message
+            )
+
+        with STAGE_SECONDS.time(stage='audit'):
+            await run_blocking(
+                self.save_request_response,
+                user_id=str(sender_id), request_type='message',
+                request_message=message.get('text'),
+                response_text=reponse_message,
+                model_version=message.get('_model_version')
+            )
+
+        with STAGE_SECONDS.time(stage='state_switch'):
+            await run_blocking(self.switch_user_message_handler,
+                               sender_id, next_handler)
+        with STAGE_SECONDS.time(stage='send'):
+            await self.send_message(sender_id, reponse_message)
+
+    async def handle_postback(self, postback, sender_id):
+        """
+        Handle a postback
+
+        :param: postback: dict
+        :param: sender_id: int
+        """
+        postback_code = postback.get('payload')
+        postback_handler = self.postback_handlers.get(postback_code)
+        if not postback_handler:
+            raise PostbackHandlerUndefinedException
+
+        with HANDLER_SECONDS.time(handler=postback_code):
+            message, next_message_handler = await self.call_handler(
+                postback_handler, postback
+            )
+
+        with STAGE_SECONDS.time(stage='audit'):
+            await run_blocking(
+                self.save_request_response,
+                user_id=str(sender_id), request_type='postback',
+                postback_type=postback_code, response_text=message
+            )
+
+        with STAGE_SECONDS.time(stage='state_switch'):
+            await run_blocking(self.switch_user_message_handler,
+                               sender_id, next_message_handler)
+        with STAGE_SECONDS.time(stage='send'):
+            await self.send_message(sender_id, message)
+
+    async def handle_messaging_event(self, messaging_event):
+        """
+        Dispatch single messaging event to message or postback handler
+
+        :param: messaging_event: dict
+        """
+        try:
+            sender_id = messaging_event["sender"]["id"]
+
+            # handling a message
+            message = messaging_event.get("message", None)
+            if message is not None:
+                EVENTS.inc(type='message')
+                await self.handle_message(message, sender_id)
+
+            # handling a postback
+            postback = messaging_event.get("postback", None)
+            if postback is not None:
+                EVENTS.inc(type='postback')
+                await self.handle_postback(postback, sender_id)
+        except Exception as exc:
+            EVENT_ERRORS.inc(exception=type(exc).__name__)
+            log(exc, level=ERROR)
+
+    async def handle_events(self, messaging_events, semaphore):
+        """
+        Handle events of one sender one by one
+
+        :param: messaging_events: list
+        :param: semaphore: asyncio.Semaphore: limit of concurrent senders
+        """
+        async with semaphore:
+            for messaging_event in messaging_events:
+                await self.handle_messaging_event(messaging_event)
+
+    async def handle_request(self, data):
+        """
+        Dispatch request to right handler
+        and set message handler to handle next message request.
+        Events of different senders are handled concurrently, at most
+        batch_concurrency senders at once, events of the same sender
+        are handled in order they came
+
+        :param: data: dict: decoded request body
+        """
+        log("webhook request: %s", data, level=DEBUG)
+
+        with REQUEST_SECONDS.time():
+            if data["object"] == "page":
+                # shared store of deduplicator is queried in executor
+                messaging_events = await run_blocking(self.get_new_events,
+                                                      data)
+                semaphore = asyncio.Semaphore(self.batch_concurrency)
+                await asyncio.gather(*[
+                    self.handle_events(events, semaphore)
+                    for events in group_events_by_sender(messaging_events)
+                ])
+
+        return "ok", 200
@@ -0,0 +1,135 @@
+import time
+import atexit
+import threading
+from collections import deque
+
+from .storage import MongoStorage
+from .utils import log, ERROR
+
+
+DROP = 'drop'
+BLOCK = 'block'
+
+
+class AuditLog:
+    """
+    Buffer of RequestResponse records, written to storage in bulk
+    when batch is full or flush interval passes.
+
+    When buffer is full because storage is slow, new records are
+    dropped or appending blocks until there is space, depending on policy
+    """
+
+    def __init__(self, max_buffer_size=10000, batch_size=500,
+                 flush_interval=1.0, policy=DROP, storage=None):
+        """
+        :param: max_buffer_size: int: max number of buffered records
+        :param: batch_size: int: max number of records in one insert
+        :param: flush_interval: float: max seconds record stays in buffer
+        :param: policy: str: DROP or BLOCK
+        :param: storage: base.storage.Storage: MongoStorage by default
+        """
+        if policy not in (DROP, BLOCK):
+            raise ValueError("Unknown audit log policy '%s'" % policy)
+
+        self.max_buffer_size = max_buffer_size
+        self.batch_size = batch_size
+        self.flush_interval = flush_interval
+        self.policy = policy
+        self.storage = storage or MongoStorage()
+
+        self.written = 0
+        self.dropped = 0
+
+        self._buffer = deque()
+        self._condition = threading.Condition()
+        self._flusher = None
+        self._stopped = False
+
+    def append(self, **fields):
+        """
+        Add record to buffer
+
+        :param: fields: RequestResponse fields
+        """
+        with self._condition:
+            while len(self._buffer) >= self.max_buffer_size:
+                if self.policy == DROP or self._stopped:
+                    self.dropped += 1
+                    return
+                self._condition.wait()
+
+            self._buffer.append(fields)
+            if len(self._buffer) >= self.batch_size:
+                self._condition.notify_all()
+
+        if self._flusher is None:
+            self._start_flusher()
+
+    def flush(self):
+        """
+        Write all buffered records to storage
+        """
+        while True:
+            with self._condition:
+                batch = [self._buffer.popleft() for _ in
+                         range(min(self.batch_size, len(self._buffer)))]
+                self._condition.notify_all()
+            if not batch:
+                return
+
+            try:
+                self.storage.save_request_responses(batch)
+            except Exception:
+                self.dropped += len(batch)
+                raise
+            self.written += len(batch)
+
+    def close(self):
+        """
+        Stop background flushing and write buffered records
+        """
+        with self._condition:
+            self._stopped = True
+            self._condition.notify_all()
+        if self._flusher is not None:
+            self._flusher.join()
+            self._flusher = None
+        self.flush()
+
+    def stats(self):
+        """
+        :return: dict: numbers of buffered, written and dropped records
+        """
+        return {
+            'buffered': len(self._buffer),
+            'written': self.written,
+            'dropped': self.dropped,
+        }
+
+    def _start_flusher(self):
+        with self._condition:
+            if self._flusher is not None:
+                return
+            self._flusher = threading.Thread(target=self._flush_loop,
+                                             daemon=True)
+            self._flusher.start()
+        atexit.register(self.close)
+
+    def _flush_loop(self):
+        while True:
+            deadline = time.monotonic() + self.flush_interval
+            with self._condition:
+                while not self._stopped and \
+                        len(self._buffer) < self.batch_size:
+                    timeout = deadline - time.monotonic()
+                    if timeout <= 0:
+                        break
+                    self._condition.wait(timeout)
+                if self._stopped:
+                    return
+
+            try:
+                self.flush()
+            except Exception as exc:
+                log(exc, level=ERROR)
@@ -0,0 +1,227 @@
+import re
+import calendar
+import importlib
+from datetime import date, timedelta
+
+from .cache import LRUCache
+
+
+# dateparser is slow to import, it's imported on first use
+dateparser = None
+
+
+# month stems, match nominative, genitive and prepositional forms
+MONTHS = (
+    ('январ', 1), ('феврал', 2), ('март', 3), ('апрел', 4), ('ма[йяе]', 5),
+    ('июн', 6), ('июл', 7), ('август', 8), ('сентябр', 9), ('октябр', 10),
+    ('ноябр', 11), ('декабр', 12),
+)
+MONTH_REGEX = re.compile(
+    r'\b(?:за|в)\s+(?P<month>' + '|'.join(
+        r'{}\w*'.format(stem) for stem, _ in MONTHS
+    ) + r')(?:\s+(?P<year>\d{4}))?'
+)
+LAST_DAYS_REGEX = re.compile(
+    r'\bза\s+(?:последн\w+\s+)?(?:(?P<count>\d+)\s+)?'
+    r'(?P<unit>дн|день|недел|месяц|год|лет)\w*'
+)
+UNIT_DAYS = {'дн': 1, 'день': 1, 'недел': 7, 'месяц': 30, 'год': 365,
+             'лет': 365}
+# longer periods are cut, cbr.ru has rates since 1992 only
+MAX_PERIOD_DAYS = 50 * 365
+
+RELATIVE_DAYS = (
+    ('позавчера', -2), ('послезавтра', 2), ('сегодня', 0), ('вчера', -1),
+    ('завтра', 1),
+)
+RELATIVE_DAYS_REGEX = re.compile(
+    r'\b(?P<word>' + '|'.join(word for word, _ in RELATIVE_DAYS) + r')\b'
+)
+DAYS_AGO_REGEX = re.compile(
+    r'\b(?P<count>\d+)\s+(?P<unit>дн|день|недел)\w*\s+назад'
+)
+# lookarounds keep regexes from matching part of longer date,
+# sentence ending dot after date is allowed
+ISO_DATE_REGEX = re.compile(
+    r'(?<![\d./-])(?P<year>\d{4})-(?P<month>\d{1,2})-(?P<day>\d{1,2})'
+    r'(?!\d|[./-]\d)'
+)
+NUMERIC_DATE_REGEX = re.compile(
+    r'(?<![\d./-])(?P<day>\d{1,2})[./-](?P<month>\d{1,2})'
+    r'(?:[./-](?P<year>\d{4}|\d{2}))?(?!\d|[./-]\d)'
+)
+TEXT_DATE_REGEX = re.compile(
+    r'\b(?P<day>\d{1,2})\s+(?P<month>' + '|'.join(
+        r'{}\w*'.format(stem) for stem, _ in MONTHS
+    ) + r')(?:\s+(?P<year>\d{4}))?'
+)
+
+
+def load_dateparser():
+    """
+    :return: module: dateparser
+    """
+    global dateparser
+    if dateparser is None:
+        dateparser = importlib.import_module('dateparser')
+    return dateparser
+
+
+def month_number(word):
+    """
+    :param: word: str: month name in any case
+    :return: int
+    """
+    for stem, number in MONTHS:
+        if re.match(stem, word):
+            return number
+
+
+def parse_period(text, today=None):
+    """
+    Get period mentioned in message, like
+    "за неделю", "за 3 дня", "за март", "в марте 2017"
+
+    :param: text: str
+    :param: today: datetime.date
+    :return: (datetime.date, datetime.date): first and last days of period
+             or None if text doesn't mention period
+    """
+    today = today or date.today()
+    text = (text or '').lower()
+
+    match = MONTH_REGEX.search(text)
+    if match:
+        month = month_number(match.group('month'))
+        if match.group('year'):
+            year = int(match.group('year'))
+        else:
+            # month that has not come yet is a month of last year
+            year = today.year if month <= today.month else today.year - 1
+        last_day = calendar.monthrange(year, month)[1]
+        return date(year, month, 1), min(date(year, month, last_day), today)
+
+    match = LAST_DAYS_REGEX.search(text)
+    if match:
+        count = int(match.group('count') or 1)
+        days = min(count * UNIT_DAYS[match.group('unit')], MAX_PERIOD_DAYS)
+        if days < 2:
+            return None
+        return today - timedelta(days=days - 1), today
+
+    return None
+
+
+class DateResolver:
+    """
+    Resolves date mentioned in message.
+    Common russian relative and numeric forms are parsed with
+    precompiled regexes, other texts with dateparser.
+    Results are cached by normalized text: relative forms as offset
+    from today, dateparser results only for the day they were computed
+    """
+
+    OFFSET = 'offset'
+    DATE = 'date'
+    NONE = 'none'
+
+    def __init__(self, cache_size=1024, languages=('ru',)):
+        """
+        :param: cache_size: int: max number of cached texts
+        :param: languages: tuple: dateparser languages
+        """
+        self.cache = LRUCache(max_size=cache_size)
+        self.languages = list(languages)
+
+        self.fast_path_hits = 0
+        self.dateparser_calls = 0
+
+    def preload(self):
+        """
+        Load dateparser language data, so first request doesn't wait for it
+        """
+        load_dateparser().parse('1 января 2017', languages=self.languages)
+
+    def resolve(self, text, today=None):
+        """
+        :param: text: str
+        :param: today: datetime.date
+        :return: datetime.date or None if text doesn't mention date
+        """
+        today = today or date.today()
+        key = ' '.join((text or '').lower().split())
+
+        cached = self.cache.get(key)
+        if cached is not None:
+            kind, value, computed_on = cached
+            if kind == self.OFFSET:
+                return today + timedelta(days=value)
+            if computed_on == today:
+                return value if kind == self.DATE else None
+
+        result = self.parse_fast(key, today)
+        if result is not None:
+            self.fast_path_hits += 1
+            kind, value = result
+        else:
+            self.dateparser_calls += 1
+            parsed = load_dateparser().parse(text or '',
+                                             languages=self.languages)
+            kind, value = (self.DATE, parsed.date()) if parsed \
+                else (self.NONE, None)
+
+        self.cache.set(key, (kind, value, today))
+        if kind == self.OFFSET:
+            return today + timedelta(days=value)
+        return value
+
+    def parse_fast(self, text, today):
+        """
+        Parse common date forms
+
+        :param: text: str: lowercased text
+        :param: today: datetime.date
+        :return: (str, object): OFFSET and offset in days or DATE and date,
+                 None if text has no known form
+        """
+        match = RELATIVE_DAYS_REGEX.search(text)
+        if match:
+            return self.OFFSET, dict(RELATIVE_DAYS)[match.group('word')]
+
+        match = DAYS_AGO_REGEX.search(text)
+        if match:
+            days = int(match.group('count')) * UNIT_DAYS[match.group('unit')]
+            # date would overflow, text is left to dateparser
+            if days > MAX_PERIOD_DAYS:
+                return None
+            return self.OFFSET, -days
+
+        for regex in (ISO_DATE_REGEX, NUMERIC_DATE_REGEX, TEXT_DATE_REGEX):
+            match = regex.search(text)
+            if not match:
+                continue
+
+            month = match.group('month')
+            month = int(month) if month.isdigit() else month_number(month)
+            year = match.group('year')
+            if year is None:
+                year = today.year
+            elif len(year) == 2:
+                year = 2000 + int(year)
+            try:
+                return self.DATE, date(int(year), month,
+                                       int(match.group('day')))
+            except ValueError:
+                return None
+
+        return None
+
+    def stats(self):
+        """
+        :return: dict: cache statistics, numbers of fast path hits
+                 and dateparser calls
+        """
+        stats = self.cache.stats()
+        stats['fast_path_hits'] = self.fast_path_hits
+        stats['dateparser_calls'] = self.dateparser_calls
+        return stats
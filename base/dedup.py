@@ -0,0 +1,84 @@
+import threading
+
+from .cache import LRUCache
+from .metrics import registry
+from .utils import log, DEBUG, ERROR
+
+
+DUPLICATE_EVENTS = registry.counter(
+    'webhook_duplicate_events_total',
+    'Redelivered messaging events skipped by deduplicator'
+)
+
+# facebook redelivers events for several hours at most
+DEFAULT_TTL = 4 * 60 * 60
+
+
+def get_event_key(messaging_event):
+    """
+    Key identifying messaging event in redelivered requests:
+    message id, or sender, timestamp and payload of postback
+
+    :param: messaging_event: dict
+    :return: str: key or None if event can't be identified
+    """
+    message = messaging_event.get('message')
+    if message is not None and message.get('mid'):
+        return 'mid:' + message['mid']
+
+    timestamp = messaging_event.get('timestamp')
+    sender_id = messaging_event.get('sender', {}).get('id')
+    if timestamp is None or sender_id is None:
+        return None
+
+    postback = messaging_event.get('postback') or {}
+    return 'event:{}:{}:{}'.format(sender_id, timestamp,
+                                   postback.get('payload', ''))
+
+
+class EventDeduplicator:
+    """
+    Remembers keys of handled messaging events for `ttl` seconds,
+    so events redelivered by facebook are skipped.
+    Keys are kept in process memory and, if storage is set,
+    in storage shared by all processes
+    """
+
+    def __init__(self, ttl=DEFAULT_TTL, max_size=100000, storage=None):
+        """
+        :param: ttl: float: seconds event is remembered
+        :param: max_size: int: max number of events kept in memory
+        :param: storage: base.storage.Storage: shared store of events
+        """
+        self.ttl = ttl
+        self.storage = storage
+        self.seen = LRUCache(max_size=max_size, ttl=ttl)
+        self._lock = threading.Lock()
+
+    def is_duplicate(self, messaging_event):
+        """
+        Check if event is seen already and remember it
+
+        :param: messaging_event: dict
+        :return: bool
+        """
+        key = get_event_key(messaging_event)
+        if key is None:
+            return False
+
+        with self._lock:
+            duplicate = key in self.seen
+            if not duplicate:
+                self.seen.set(key, True)
+
+        if not duplicate and self.storage is not None:
+            try:
+                duplicate = not self.storage.mark_event_seen(key, self.ttl)
+            except Exception as exc:
+                # it's better to answer twice than not to answer
+                log(exc, level=ERROR)
+
+        if duplicate:
+            DUPLICATE_EVENTS.inc()
+            log("skipping duplicate event %s", key, level=DEBUG)
+        return duplicate
@@ -8,3 +8,7 @@ class MessageHandlerNotSettedException(Exception):
 
 class PostbackHandlerUndefinedException(Exception):
     pass
+
+
+class ModelRejectedException(Exception):
+    pass
@@ -0,0 +1,317 @@
+import threading
+from datetime import datetime, timedelta
+from lxml import etree
+
+import requests
+
+from .cache import LRUCache, SingleFlight
+from .storage import MongoStorage
+from .utils import log, ERROR
+
+
+EXCHANGE_RATES_URL = 'http://www.cbr.ru/scripts/XML_daily_eng.asp'
+EXCHANGE_RATES_DYNAMIC_URL = 'http://www.cbr.ru/scripts/XML_dynamic.asp'
+BASE_CURRENCY = 'RUB'  # cbr.ru gives rates to rouble
+CBR_DATE_FORMAT = '%d/%m/%Y'
+
+# cbr.ru sets no rates for weekends and holidays,
+# so shorter gaps between saved rates are not missing data
+MAX_RATES_GAP = timedelta(days=4)
+# seconds gaps of requested period aren't loaded again,
+# cbr.ru may have no rates for them, e.g. for long holidays
+BACKFILL_TTL = 3600
+
+# cbr.ru internal currency codes, used in dynamic rates requests
+CURRENCY_IDS = {
+    'USD': 'R01235',
+    'EUR': 'R01239',
+}
+
+
+def parse_exchange_rates(xml_text):
+    """
+    Get rates of all currencies from cbr.ru daily rates document
+
+    :param: xml_text: str
+    :return: dict: currency char code -> float rate of one unit
+    """
+    xml = bytes(xml_text, encoding='utf-8')
+    root = etree.XML(xml)
+
+    rates = dict()
+    for valute in root.iter('Valute'):
+        char_code = valute.findtext('CharCode')
+        value = valute.findtext('Value')
+        if char_code and value:
+            rates[char_code] = unit_rate(value, valute.findtext('Nominal'))
+    return rates
+
+
+def parse_dynamic_exchange_rates(xml_text):
+    """
+    Get rates by dates from cbr.ru dynamic rates document
+
+    :param: xml_text: str
+    :return: dict: datetime.date -> float rate of one unit
+    """
+    xml = bytes(xml_text, encoding='utf-8')
+    root = etree.XML(xml)
+
+    rates = dict()
+    for record in root.iter('Record'):
+        date = datetime.strptime(record.get('Date'), '%d.%m.%Y').date()
+        value = record.findtext('Value')
+        if value:
+            rates[date] = unit_rate(value, record.findtext('Nominal'))
+    return rates
+
+
+def find_missing_periods(dates, date_from, date_to, max_gap=MAX_RATES_GAP):
+    """
+    Find periods without rates longer than max_gap
+
+    :param: dates: list: sorted dates with rates
+    :param: date_from: datetime.date
+    :param: date_to: datetime.date
+    :param: max_gap: datetime.timedelta
+    :return: list: (date_from, date_to) periods without rates
+    """
+    day = timedelta(days=1)
+    missing = []
+    previous = date_from - day
+    for date in list(dates) + [date_to + day]:
+        if date - previous > max_gap:
+            missing.append((previous + day, date - day))
+        previous = date
+    return missing
+
+
+def rate_to_float(rate):
+    """
+    :param: rate: str: rate in cbr.ru format, like '57,0020'
+    :return: float
+    """
+    return float(str(rate).replace(',', '.'))
+
+
+def unit_rate(value, nominal):
+    """
+    cbr.ru gives rates of some currencies for 10 or 100 units, like JPY
+
+    :param: value: str: rate of nominal units in cbr.ru format
+    :param: nominal: str: number of units, 1 if None
+    :return: float: rate of one unit
+    """
+    return rate_to_float(value) / int(nominal or 1)
+
+
+class ExchangeRateService:
+    """
+    Exchange rates kept in memory in front of storage.
+    On a miss the whole cbr.ru document is loaded and rates of all
+    its currencies are saved at once, concurrent misses for the same
+    date share one download
+    """
+
+    def __init__(self, url=EXCHANGE_RATES_URL,
+                 dynamic_url=EXCHANGE_RATES_DYNAMIC_URL, cache_size=10000,
+                 storage=None):
+        """
+        :param: url: str: cbr.ru daily rates url
+        :param: dynamic_url: str: cbr.ru rates dynamic url
+        :param: cache_size: int: max number of rates kept in memory
+        :param: storage: base.storage.Storage: MongoStorage by default
+        """
+        self.storage = storage or MongoStorage()
+        self.url = url
+        self.dynamic_url = dynamic_url
+        self.cache = LRUCache(max_size=cache_size)
+        self.singleflight = SingleFlight()
+        self.session = requests.Session()
+        # requested periods with gaps already loaded from cbr.ru
+        self.backfilled = LRUCache(max_size=1000, ttl=BACKFILL_TTL)
+
+        self._prefetch_timer = None
+
+    def get_rate(self, currency_from, currency_to, date):
+        """
+        Get exchange rate, loading it from cbr.ru if it's not known
+
+        :param: currency_from: str
+        :param: currency_to: str
+        :param: date: datetime.date
+        :return: float: rate or None if cbr.ru has no such rate
+        """
+        rate = self.get_known_rate(currency_from, currency_to, date)
+        if rate is not None:
+            return rate
+
+        rates = self.singleflight.do(date, self.fetch_rates, date)
+        return rates.get(currency_from) if currency_to == BASE_CURRENCY \
+            else None
+
+    def get_known_rate(self, currency_from, currency_to, date):
+        """
+        Get exchange rate from memory or storage
+
+        :return: float: rate or None if it's not loaded yet
+        """
+        key = (currency_from, currency_to, date)
+        rate = self.cache.get(key)
+        if rate is not None:
+            return rate
+
+        rate = self.storage.get_exchange_rate(currency_from, currency_to, date)
+        if rate is None:
+            return None
+
+        self.cache.set(key, rate)
+        return rate
+
+    def get_rates_range(self, currency_from, currency_to, date_from,
+                        date_to):
+        """
+        Get rates for dates of period, loading rates dynamic from cbr.ru
+        for parts of period without rates in storage
+
+        :param: currency_from: str
+        :param: currency_to: str
+        :param: date_from: datetime.date
+        :param: date_to: datetime.date
+        :return: list: (date, rate) pairs ordered by date
+        """
+        rates = self.storage.get_exchange_rates_range(
+            currency_from, currency_to, date_from, date_to
+        )
+        if currency_to != BASE_CURRENCY:
+            return rates
+
+        if rates:
+            missing = find_missing_periods([date for date, _ in rates],
+                                           date_from, date_to)
+        else:
+            missing = [(date_from, date_to)]
+        key = (currency_from, date_from, date_to)
+        if not missing or key in self.backfilled:
+            return rates
+
+        for period_from, period_to in missing:
+            self.backfill(currency_from, period_from, period_to)
+        self.backfilled.set(key, True)
+        return self.storage.get_exchange_rates_range(
+            currency_from, currency_to, date_from, date_to
+        )
+
+    def get_period_stats(self, currency_from, currency_to, date_from,
+                         date_to):
+        """
+        Get min, max and average rate for period
+
+        :return: dict: min, max, avg and number of days with rates,
+                 None if there are no rates for period
+        """
+        rates = self.get_rates_range(currency_from, currency_to,
+                                     date_from, date_to)
+        if not rates:
+            return None
+
+        values = [rate for _, rate in rates]
+        return {
+            'min': min(values),
+            'max': max(values),
+            'avg': sum(values) / len(values),
+            'days': len(values),
+        }
+
+    def fetch_rates(self, date):
+        """
+        Load rates document for date from cbr.ru and save all its rates
+
+        :param: date: datetime.date
+        :return: dict: currency char code -> rate
+        """
+        response = self.session.get(
+            self.url, params={'date_req': date.strftime(CBR_DATE_FORMAT)}
+        )
+        return self.ingest(date, response.text)
+
+    def ingest(self, date, xml_text):
+        """
+        Save all rates from cbr.ru daily document in one bulk write
+
+        :param: date: datetime.date
+        :param: xml_text: str
+        :return: dict: currency char code -> rate
+        """
+        rates = parse_exchange_rates(xml_text)
+        self.save_rates([(currency, date, rate)
+                         for currency, rate in rates.items()])
+        return rates
+
+    def backfill(self, currency, date_from, date_to):
+        """
+        Load rates of currency for period from cbr.ru
+        and save them in one bulk write
+
+        :param: currency: str: currency char code
+        :param: date_from: datetime.date
+        :param: date_to: datetime.date
+        :return: int: number of loaded rates
+        """
+        currency_id = CURRENCY_IDS.get(currency)
+        if currency_id is None:
+            raise ValueError("Unknown cbr.ru code of currency '%s'" % currency)
+
+        response = self.session.get(self.dynamic_url, params={
+            'date_req1': date_from.strftime(CBR_DATE_FORMAT),
+            'date_req2': date_to.strftime(CBR_DATE_FORMAT),
+            'VAL_NM_RQ': currency_id,
+        })
+        rates = parse_dynamic_exchange_rates(response.text)
+        self.save_rates([(currency, date, rate)
+                         for date, rate in rates.items()])
+        return len(rates)
+
+    def save_rates(self, rates):
+        """
+        Upsert rates to rouble in one bulk write and put them in memory
+
+        :param: rates: list: (currency, date, rate) triples
+        """
+        self.storage.save_exchange_rates([
+            (currency, BASE_CURRENCY, date, rate)
+            for currency, date, rate in rates
+        ])
+
+        for currency, date, rate in rates:
+            self.cache.set((currency, BASE_CURRENCY, date), rate)
+
+    def prefetch(self):
+        """
+        Load today's rates unless they are already known
+        """
+        today = datetime.now().date()
+        if self.cache.get(('USD', BASE_CURRENCY, today)) is None:
+            self.singleflight.do(today, self.fetch_rates, today)
+
+    def start_prefetch(self, interval=3600):
+        """
+        Load today's rates now and then every `interval` seconds
+        in background, so users don't wait for cbr.ru
+
+        :param: interval: float
+        """
+        try:
+            self.prefetch()
+        except Exception as exc:
+            log(exc, level=ERROR)
+
+        self._prefetch_timer = threading.Timer(interval, self.start_prefetch,
+                                               args=(interval,))
+        self._prefetch_timer.daemon = True
+        self._prefetch_timer.start()
+
+    def stop_prefetch(self):
+        if self._prefetch_timer is not None:
+            self._prefetch_timer.cancel()
+            self._prefetch_timer = None
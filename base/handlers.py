@@ -1,62 +1,262 @@
 import os
-from datetime import datetime, timedelta
-from lxml import etree
-
-import requests
-import pymorphy2
-import dateparser
-from sklearn.externals import joblib
-
-from classifiers.preprocessors import normalizing_preprocessor
-from .models import ExchangeRate, Weather
-from .utils import log
+import csv
+import copy
+from datetime import datetime
+
+from classifiers.preprocessors import (normalizing_preprocessor,
+                                       identity_preprocessor, load_morph)
+from classifiers.analysis import analyze_text
+from classifiers.compact import CompactForestModel, META_FILE
+from classifiers.batching import BatchPredictor
+from classifiers.registry import ModelRegistry, is_holdout
+from classifiers.phrase_index import PhraseIndex
+from .dates import DateResolver, parse_period
+from .exchange_rates import ExchangeRateService, EXCHANGE_RATES_URL
+from .weather import (WeatherService, CITIES, WEATHER_URL,
+                      UPDATE_WEATHER_TIME_GAP, parse_weather)
+from .response_cache import ResponseCache
+from .utils import log, DEBUG
 
 
 GLOSSARY_PATH = './data/data_science_glossary'
 GLOSSARY = None
+GLOSSARY_INDEX = None
+# incremented on every glossary load, cached responses depend on it
+GLOSSARY_VERSION = 0
 
 CLASSIFIER_PATH = './data/forest.pkl'
 VECTORIZER_PATH = './data/vectorizer.pkl'
-classifier = joblib.load(CLASSIFIER_PATH)
-vectorizer = joblib.load(VECTORIZER_PATH)
+COMPACT_MODEL_PATH = './data/compact_model'
+# new model versions are validated on part of dataset
+# train_classifier.py and retrain_classifier.py don't train on
+HOLDOUT_PATH = './data/dataset.csv'
+HOLDOUT_SIZE = 200
+
+
+EXCHANGE_RATE_MESSAGE = "Курс {cfrom} к {cto} на {date}: {rate:.4f}{cto}"
+NO_EXCHANGE_RATE_DATE_MESSAGE = "Нет данных о курсе {cfrom} к {cto} на {date}"
+EXCHANGE_RATE_PERIOD_MESSAGE = "Курс {cfrom} к {cto} с {date_from} " +\
+                               "по {date_to}: минимальный {min:.4f}{cto}, " +\
+                               "максимальный {max:.4f}{cto}, " +\
+                               "средний {avg:.4f}{cto}"
+NO_EXCHANGE_RATE_MESSAGE = "Нет данных о курсе {cfrom} к {cto} " +\
+                           "с {date_from} по {date_to}"
+WEATHER_MESSAGE = "{city}. Температура {temp:g}C. Скорость ветра {ws:g}м/c."
+
+
+def load_classifier():
+    """
+    Load compact model exported by train_classifier.py,
+    or pickled vectorizer and classifier if there is none
+
+    :return: function(list) -> list: predicts classes of normalized texts
+    """
+    if os.path.exists(os.path.join(COMPACT_MODEL_PATH, META_FILE)):
+        return CompactForestModel(COMPACT_MODEL_PATH).predict
+
+    from sklearn.externals import joblib
+    classifier = joblib.load(CLASSIFIER_PATH)
+    vectorizer = joblib.load(VECTORIZER_PATH)
+
+    # vectorizer for already normalized text
+    normalized_vectorizer = copy.copy(vectorizer)
+    normalized_vectorizer.set_params(preprocessor=identity_preprocessor)
+
+    return lambda texts: classifier.predict(
+        normalized_vectorizer.transform(texts)
+    )
+
+
+def load_holdout():
+    """
+    Load evenly spaced sample of held out rows of dataset
+    for validation of new models
+
+    :return: (list, list): normalized texts and labels
+    """
+    with open(HOLDOUT_PATH, 'r') as csvfile:
+        rows = [row for row in csv.DictReader(csvfile)
+                if is_holdout(row['sentence'])]
+    step = max(len(rows) // HOLDOUT_SIZE, 1)
+    sample = rows[::step][:HOLDOUT_SIZE]
+    return ([normalizing_preprocessor(row['sentence']) for row in sample],
+            [row['category'] for row in sample])
+
+
+# classifier is loaded on first use or by preload, published versions
+# of data/models replace it, or model of load_classifier if there are none
+model_registry = ModelRegistry(fallback=load_classifier,
+                               holdout=load_holdout)
+batch_predictor = None
+response_cache = None
+
+
+def get_classifier():
+    """
+    :return: function(list) -> list: predicts classes of normalized texts
+             by active model
+    """
+    return model_registry.get().predict
+
+
+def predict_with_version(items):
+    """
+    :param: items: list: (model, normalized text) pairs, model is
+            classifiers.registry.ActiveModel text is classified by
+    :return: list: (class, model version) pairs
+    """
+    # texts of batch are classified by different models
+    # only if new version is activated meanwhile
+    groups = dict()
+    for index, (model, _) in enumerate(items):
+        groups.setdefault(model.version, (model, []))[1].append(index)
+
+    results = [None] * len(items)
+    for model, indexes in groups.values():
+        version, classes = model_registry.predict(
+            [items[index][1] for index in indexes], model
+        )
+        for index, predicted in zip(indexes, classes):
+            results[index] = (predicted, version)
+    return results
+
+
+def enable_batch_inference(max_batch_size=32, max_latency=0.005):
+    """
+    Classify messages handled concurrently in batches
 
-UPDATE_WEATHER_TIME_GAP = 30  # minutes
+    :param: max_batch_size: int
+    :param: max_latency: float: seconds message waits for batch to fill
+    """
+    global batch_predictor
+    batch_predictor = BatchPredictor(predict_with_version,
+                                     max_batch_size=max_batch_size,
+                                     max_latency=max_latency)
+
+
+def enable_response_cache(max_size=10000, ttl=None):
+    """
+    Cache responses of classifying and glossary handlers
+    to repeated messages
+
+    :param: max_size: int: max number of cached responses
+    :param: ttl: float: response lifetime in seconds, None for no expiration
+    """
+    global response_cache
+    response_cache = ResponseCache(max_size=max_size, ttl=ttl)
+
+
+def get_cached_response(handler_code, request, respond, model=None):
+    """
+    Get response to message with same normalized text computed
+    by same classifier and glossary versions, or compute it
+
+    :param: handler_code: str
+    :param: request: dict
+    :param: respond: function(request, analysis, model) -> (str, str)
+    :param: model: classifiers.registry.ActiveModel: model response
+            is computed by, active one by default. It's got once,
+            so model activated meanwhile doesn't mix with cache key
+    :return: (str, str): Pair of message and next handler code
+    """
+    model = model or model_registry.get()
+    analysis = get_text_analysis(request)
+    if response_cache is None:
+        return respond(request, analysis, model)
+
+    versions = (model.version, GLOSSARY_VERSION)
+    return response_cache.get_or_compute(
+        handler_code, analysis.normalized_text, versions,
+        lambda: respond(request, analysis, model)
+    )
+
+
+def classify(analysis, model=None):
+    """
+    Classify text, in batch with concurrent messages if enabled
+
+    :param: analysis: classifiers.analysis.TextAnalysis
+    :param: model: classifiers.registry.ActiveModel: active by default
+    :return: (str, str): class and version of model
+    """
+    item = (model or model_registry.get(), analysis.normalized_text)
+    if batch_predictor is not None:
+        return batch_predictor.predict(item)
 
-EXCHANGE_RATES_URL = 'http://www.cbr.ru/scripts/XML_daily_eng.asp'
-WEATHER_URL = 'http://api.openweathermap.org/data/2.5/weather'
+    return predict_with_version([item])[0]
 
 
 def load_data_science_glossary():
     """
     Load and process data science glossary from file
+    and build index of normalized glossary phrases
     """
-    global GLOSSARY
+    global GLOSSARY, GLOSSARY_INDEX, GLOSSARY_VERSION
     with open(GLOSSARY_PATH, 'r') as f_glossary:
-        GLOSSARY = dict()
+        glossary = dict()
         for line in f_glossary.readlines():
             line = line.strip()
             processed_line = normalizing_preprocessor(line)
-            GLOSSARY[line] = processed_line
-    log(GLOSSARY)
+            glossary[line] = processed_line
+
+    GLOSSARY_INDEX = PhraseIndex.from_phrases(
+        (norm_phrase.split(), phrase)
+        for phrase, norm_phrase in glossary.items()
+    )
+    GLOSSARY = glossary
+    GLOSSARY_VERSION += 1
+    log("Glossary of %d phrases is loaded", len(glossary))
 
 
-def search_for_key_noun_phrases(text):
+def preload():
     """
-    Searching if phrases from glossary found in text
+    Load classifier, glossary, morphological dictionaries and dateparser
+    data, so first requests don't wait for them.
+    Opens no connections and starts no threads, so it can be called
+    before fork, e.g. in gunicorn master
+    """
+    load_morph()
+    get_classifier()
+    if GLOSSARY is None:
+        load_data_science_glossary()
+    date_resolver.preload()
 
-    :param: text: str
+
+def get_text_analysis(request):
+    """
+    Get analysis of request text, it's computed once per request
+
+    :param: request: dict
+    :return: classifiers.analysis.TextAnalysis
+    """
+    analysis = request.get('_analysis')
+    if analysis is None:
+        analysis = analyze_text(request.get('text'))
+        request['_analysis'] = analysis
+    return analysis
+
+
+def find_key_noun_phrases(analysis):
+    """
+    Searching if phrases from glossary found in analyzed text
+
+    :param: analysis: classifiers.analysis.TextAnalysis
     :return: list: list of found phrases
     """
     if GLOSSARY is None:
         load_data_science_glossary()
-    phrases = []
-    normalized_text = normalizing_preprocessor(text)
 
-    for phrase, norm_phrase in GLOSSARY.items():
-        if norm_phrase in normalized_text:
-            phrases.append(phrase)
+    return GLOSSARY_INDEX.search(analysis.normalized_tokens)
+
+
+def search_for_key_noun_phrases(text):
+    """
+    Searching if phrases from glossary found in text
 
-    return phrases
+    :param: text: str
+    :return: list: list of found phrases
+    """
+    return find_key_noun_phrases(analyze_text(text))
 
 
 def create_message_about_data_science(phrases):
@@ -67,7 +267,7 @@ def create_message_about_data_science(phrases):
     :return: (str, str): Pair of message and next handler code
     """
     next_handler = None
-    log(phrases)
+    log("found phrases: %s", phrases, level=DEBUG)
 
     if len(phrases) == 0:
         message = "Вас интересует Data Science? " +\
@@ -102,13 +302,31 @@ def data_science_message_handler(request):
 
     :param: request: dict
     """
+    model = model_registry.get()
+    message, next_handler = get_cached_response(
+        'DEFAULT_HANDLER', request, respond_about_data_science, model
+    )
+    # saved with request and response by server, cached response
+    # was computed by the same model
+    request['_model_version'] = model.version
+    return message, next_handler
+
+
+def respond_about_data_science(request, analysis, model):
+    """
+    Response of data_science_message_handler
+
+    :param: request: dict
+    :param: analysis: classifiers.analysis.TextAnalysis
+    :param: model: classifiers.registry.ActiveModel
+    :return: (str, str): Pair of message and next handler code
+    """
     next_handler = None
-    text = request.get('text')
-    text_features = vectorizer.transform([text])
-    result = classifier.predict(text_features)[0]
+    result, version = classify(analysis, model)
+    log("classified as %s by model %s", result, version, level=DEBUG)
 
     if result == '1':
-        phrases = search_for_key_noun_phrases(text)
+        phrases = find_key_noun_phrases(analysis)
         message, next_handler = create_message_about_data_science(phrases)
 
     else:
@@ -123,11 +341,29 @@ def choose_phrase_message_handler(request):
 
     :prama: request: dict
     """
-    text = request.get('text')
-    phrases = search_for_key_noun_phrases(text)
-    message, handler = create_message_about_data_science(phrases)
+    return get_cached_response(
+        'CHOOSE_PHRASE_HANDLER', request,
+        lambda request, analysis, model: create_message_about_data_science(
+            find_key_noun_phrases(analysis)
+        )
+    )
+
+
+date_resolver = DateResolver()
+
 
-    return message, handler
+def get_message_date(text):
+    """
+    Get date mentioned in message, today if there is none
+
+    :param: text: str
+    :return: datetime.date
+    """
+    today = datetime.now().date()
+    return date_resolver.resolve(text, today) or today
+
+
+exchange_rate_service = ExchangeRateService(EXCHANGE_RATES_URL)
 
 
 def exchange_rate_date_message_handler(currency_from, currency_to, request):
@@ -139,41 +375,49 @@ def exchange_rate_date_message_handler(currency_from, currency_to, request):
     :param: request: dict
     """
     text = request.get('text')
-    parsed_date = dateparser.parse(text, languages=['ru'])
-    message = "Курс {cfrom} к {cto} на {date}: {rate}{cto}"
+    period = parse_period(text)
+    if period:
+        stats = exchange_rate_service.get_period_stats(
+            currency_from, currency_to, *period
+        )
+        return format_exchange_rate_period_message(
+            currency_from, currency_to, period, stats
+        ), None
 
-    if parsed_date:
-        date = parsed_date.date()
+    date = get_message_date(text)
+    rate = exchange_rate_service.get_rate(currency_from, currency_to, date)
+    return format_exchange_rate_message(currency_from, currency_to, date,
+                                        rate), None
 
-    else:
-        date = datetime.now().date()
-
-    # check if exchange rate already in DB
-    exchange_rate = ExchangeRate.objects(
-        currency_from=currency_from, currency_to=currency_to, date=date
-    ).first()
-    if exchange_rate:
-        message = message.format(cfrom=currency_from, cto=currency_to,
-                                 date=date, rate=exchange_rate.rate)
-        return message, None
-
-    # if not, load data from cbr.ru
-    response = requests.get(EXCHANGE_RATES_URL)
-    xml = bytes(response.text, encoding='utf-8')
-    root = etree.XML(xml)
-
-    xpath = '//Valute[CharCode="{}"]/Value/text()'.format(currency_from)
-    rate = root.xpath(xpath)[0]
-
-    exchange_rate = ExchangeRate(
-        currency_from=currency_from, currency_to=currency_to, date=date,
-        rate=rate
-    )
-    exchange_rate.save()
 
-    message = message.format(cfrom=currency_from, cto=currency_to,
-                             date=date, rate=rate)
-    return message, None
+def format_exchange_rate_message(currency_from, currency_to, date, rate):
+    """
+    :param: currency_from: str
+    :param: currency_to: str
+    :param: date: datetime.date
+    :param: rate: float or None
+    :return: str
+    """
+    message = EXCHANGE_RATE_MESSAGE if rate is not None \
+        else NO_EXCHANGE_RATE_DATE_MESSAGE
+    return message.format(cfrom=currency_from, cto=currency_to, date=date,
+                          rate=rate)
+
+
+def format_exchange_rate_period_message(currency_from, currency_to, period,
+                                        stats):
+    """
+    :param: currency_from: str
+    :param: currency_to: str
+    :param: period: (datetime.date, datetime.date)
+    :param: stats: dict: min, max and avg rate or None
+    :return: str
+    """
+    message = EXCHANGE_RATE_PERIOD_MESSAGE if stats \
+        else NO_EXCHANGE_RATE_MESSAGE
+    return message.format(cfrom=currency_from, cto=currency_to,
+                          date_from=period[0], date_to=period[1],
+                          **(stats or {}))
 
 
 usd_rub_exchange_rate_date_message_handler = \
@@ -209,36 +453,41 @@ euro_rub_rate_postback_handler = \
     lambda request: exchange_rate_postback_handler('EUR', 'RUB')
 
 
-def current_weather_message_handler(request):
+weather_service = WeatherService(WEATHER_URL)
+
+
+def format_weather_message(weather):
+    """
+    :param: weather: base.weather.CityWeather
+    :return: str
+    """
+    return WEATHER_MESSAGE.format(city=CITIES.get(weather.city, weather.city),
+                                  temp=weather.temp, ws=weather.wind_speed)
+
+
+def weather_postback_handler(city):
     """
     Get weather data from openweathermap.org
 
-    :param: request: dict
+    :param: city: str: openweathermap.org city name
+    """
+    weather = weather_service.get_weather(city)
+    return format_weather_message(weather), None
+
+
+current_weather_message_handler = \
+    lambda request: weather_postback_handler('Moscow')
+
+
+spb_weather_postback_handler = \
+    lambda request: weather_postback_handler('Saint Petersburg')
+
+
+def set_storage(storage):
+    """
+    Keep exchange rates and weather in storage
+
+    :param: storage: base.storage.Storage
     """
-    now = datetime.now()
-    time_mark = now - timedelta(minutes=UPDATE_WEATHER_TIME_GAP)
-    message = "Москва, Россия. Температура {temp}C. Скорость ветра {ws}м/c."
-
-    # check if there recent weather data in DB
-    weather = Weather.objects(city='Moscow', time__gte=time_mark).first()
-    if weather:
-        message = message.format(temp=weather.temp, ws=weather.wind_speed)
-        return message, None
-
-    # if not, load data from
-    payload = {'q': 'Moscow', 'units': 'metric',
-               'appid': os.environ.get('OWM_APPID')}
-    response = requests.get(WEATHER_URL, params=payload)
-
-    if response.status_code != 200:
-        log(response.status_code)
-        log(os.environ.get('OWM_APPID'))
-    data = response.json()
-
-    temp = str(data['main'].get('temp'))
-    wind_speed = str(data['wind'].get('speed'))
-    weather = Weather(city='Moscow', temp=temp, wind_speed=wind_speed, time=now)
-    weather.save()
-
-    message = message.format(temp=temp, ws=wind_speed)
-    return message, None
+    exchange_rate_service.storage = storage
+    weather_service.storage = storage
@@ -0,0 +1,211 @@
+import time
+import bisect
+import threading
+from contextlib import contextmanager
+
+
+# seconds, from fast cache hits to slow external APIs
+DEFAULT_BUCKETS = (0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1,
+                   0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+
+
+def format_labels(names, values, extra=()):
+    """
+    :param: names: tuple: label names
+    :param: values: tuple: label values
+    :param: extra: tuple: additional (name, value) pairs
+    :return: str: like '{stage="send",le="0.5"}' or '' without labels
+    """
+    pairs = list(zip(names, values)) + list(extra)
+    if not pairs:
+        return ''
+    return '{' + ','.join(
+        '{}="{}"'.format(name, str(value).replace('\\', '\\\\')
+                         .replace('"', '\\"').replace('\n', '\\n'))
+        for name, value in pairs
+    ) + '}'
+
+
+def format_value(value):
+    if value == float('inf'):
+        return '+Inf'
+    return repr(float(value))
+
+
+class Metric:
+    """
+    Base class of metrics with labels
+    """
+
+    type = None
+
+    def __init__(self, name, description, labels=()):
+        """
+        :param: name: str
+        :param: description: str
+        :param: labels: tuple: label names
+        """
+        self.name = name
+        self.description = description
+        self.labels = tuple(labels)
+        self._values = dict()
+        self._lock = threading.Lock()
+
+    def _key(self, labels):
+        if set(labels) != set(self.labels):
+            raise ValueError("Metric {} has labels {}, got {}".format(
+                self.name, self.labels, tuple(labels)))
+        return tuple(str(labels[name]) for name in self.labels)
+
+    def render(self):
+        """
+        :return: list: lines of Prometheus text format
+        """
+        lines = ['# HELP {} {}'.format(self.name, self.description),
+                 '# TYPE {} {}'.format(self.name, self.type)]
+        with self._lock:
+            items = sorted(self._values.items())
+        for key, value in items:
+            lines.extend(self._render_value(key, value))
+        return lines
+
+    def _render_value(self, key, value):
+        raise NotImplementedError
+
+
+class Counter(Metric):
+    """
+    Monotonically increasing value, like number of handled events
+    """
+
+    type = 'counter'
+
+    def inc(self, value=1, **labels):
+        key = self._key(labels)
+        with self._lock:
+            self._values[key] = self._values.get(key, 0) + value
+
+    def get(self, **labels):
+        return self._values.get(self._key(labels), 0)
+
+    def _render_value(self, key, value):
+        return ['{}{} {}'.format(self.name, format_labels(self.labels, key),
+                                 format_value(value))]
+
+
+class Histogram(Metric):
+    """
+    Distribution of observed values in cumulative buckets,
+    like latencies of requests
+    """
+
+    type = 'histogram'
+
+    def __init__(self, name, description, labels=(), buckets=DEFAULT_BUCKETS):
+        """
+        :param: buckets: tuple: sorted upper bounds of buckets
+        """
+        super().__init__(name, description, labels)
+        self.buckets = tuple(sorted(buckets)) + (float('inf'),)
+
+    def observe(self, value, **labels):
+        key = self._key(labels)
+        index = bisect.bisect_left(self.buckets, value)
+        with self._lock:
+            counts, total = self._values.get(key) or \
+                ([0] * len(self.buckets), 0.0)
+            counts[index] += 1
+            self._values[key] = (counts, total + value)
+
+    @contextmanager
+    def time(self, **labels):
+        """
+        Observe time of `with` block, also when it raises
+        """
+        start = time.monotonic()
+        try:
+            yield
+        finally:
+            self.observe(time.monotonic() - start, **labels)
+
+    def get(self, **labels):
+        """
+        :return: (int, float): number and sum of observed values
+        """
+        counts, total = self._values.get(self._key(labels)) or \
+            ([0], 0.0)
+        return sum(counts), total
+
+    def _render_value(self, key, value):
+        counts, total = value
+        lines = []
+        cumulative = 0
+        for bound, count in zip(self.buckets, counts):
+            cumulative += count
+            lines.append('{}_bucket{} {}'.format(
+                self.name,
+                format_labels(self.labels, key, [('le', format_value(bound))]),
+                cumulative
+            ))
+        labels = format_labels(self.labels, key)
+        lines.append('{}_sum{} {}'.format(self.name, labels,
+                                          format_value(total)))
+        lines.append('{}_count{} {}'.format(self.name, labels, cumulative))
+        return lines
+
+
+class Registry:
+    """
+    Collection of metrics rendered together on metrics page
+    """
+
+    def __init__(self):
+        self.metrics = dict()
+        self._lock = threading.Lock()
+
+    def counter(self, name, description, labels=()):
+        """
+        Get counter, creating it on first call
+
+        :return: Counter
+        """
+        return self._get_or_create(Counter, name, description, labels)
+
+    def histogram(self, name, description, labels=(),
+                  buckets=DEFAULT_BUCKETS):
+        """
+        Get histogram, creating it on first call
+
+        :return: Histogram
+        """
+        return self._get_or_create(Histogram, name, description, labels,
+                                   buckets=buckets)
+
+    def render(self):
+        """
+        :return: str: all metrics in Prometheus text format
+        """
+        with self._lock:
+            metrics = [self.metrics[name] for name in sorted(self.metrics)]
+        lines = []
+        for metric in metrics:
+            lines.extend(metric.render())
+        return '\n'.join(lines) + '\n'
+
+    def _get_or_create(self, metric_class, name, description, labels,
+                       **kwargs):
+        with self._lock:
+            metric = self.metrics.get(name)
+            if metric is None:
+                metric = metric_class(name, description, labels, **kwargs)
+                self.metrics[name] = metric
+            elif not isinstance(metric, metric_class) or \
+                    metric.labels != tuple(labels):
+                raise ValueError("Metric %s is already registered "
+                                 "with other type or labels" % name)
+            return metric
+
+
+registry = Registry()
+
+CONTENT_TYPE = 'text/plain; version=0.0.4; charset=utf-8'
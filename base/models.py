@@ -3,6 +3,9 @@ import datetime
 from mongoengine import *
 
 
+WEATHER_RETENTION = 24 * 60 * 60  # seconds
+
+
 # Fields
 class DateField(DateTimeField):
     """
@@ -20,6 +23,12 @@ class User(Document):
     user_id = StringField(required=True)
     next_handler = StringField(required=True)
 
+    meta = {
+        'indexes': [
+            {'fields': ['user_id'], 'unique': True},
+        ]
+    }
+
 
 class RequestResponse(Document):
     user_id = StringField(required=True)
@@ -27,17 +36,60 @@ class RequestResponse(Document):
     request_message = StringField(null=True)
     postback_type = StringField(null=True)
     response_text = StringField(required=True)
+    # class of request message, set when message is labeled
+    # for retraining of classifier. Not null, so unset values
+    # aren't saved and unlabeled records stay out of the index
+    label = StringField()
+    # version of classifier that answered request
+    model_version = StringField()
+
+    # mostly write only log, the only partial index has just labeled
+    # records, so unlabeled inserts stay cheap
+    meta = {
+        'indexes': [
+            {'fields': ['_id', 'label'],
+             'partialFilterExpression': {'label': {'$type': 'string'}}},
+        ]
+    }
 
 
 class ExchangeRate(Document):
     currency_from = StringField(required=True)
     currency_to = StringField(required=True)
-    rate = StringField(required=True)
+    rate = FloatField(required=True)
     date = DateField(required=True)
 
+    meta = {
+        'indexes': [
+            {'fields': ['currency_from', 'currency_to', 'date'],
+             'unique': True},
+        ]
+    }
+
 
 class Weather(Document):
     city = StringField(required=True)
-    temp = StringField(required=True)
-    wind_speed = StringField(required=True)
+    temp = FloatField(required=True)
+    wind_speed = FloatField(required=True)
     time = DateTimeField(required=True)
+
+    meta = {
+        'indexes': [
+            ('city', '-time'),
+            # only recent weather is used, old documents are removed
+            {'fields': ['time'], 'expireAfterSeconds': WEATHER_RETENTION},
+        ]
+    }
+
+
+class SeenEvent(Document):
+    # message id or other key of webhook event
+    key = StringField(required=True, unique=True)
+    expires = DateTimeField(required=True)
+
+    meta = {
+        'indexes': [
+            # removed by MongoDB when they expire
+            {'fields': ['expires'], 'expireAfterSeconds': 0},
+        ]
+    }
@@ -0,0 +1,81 @@
+import threading
+
+from .cache import LRUCache
+from .metrics import registry
+
+
+RESPONSE_CACHE_REQUESTS = registry.counter(
+    'response_cache_requests_total', 'Lookups of cached handler responses',
+    labels=('handler', 'result')
+)
+RESPONSE_CACHE_EVICTIONS = registry.counter(
+    'response_cache_evictions_total',
+    'Responses evicted from cache because it is full'
+)
+
+
+class ResponseCache:
+    """
+    Bounded LRU cache of handlers' (message, next handler) responses
+    to normalized texts. Responses depend on classifier and glossary,
+    so their versions are part of key and cache is cleared
+    when any of them changes
+    """
+
+    def __init__(self, max_size=10000, ttl=None):
+        """
+        :param: max_size: int: max number of responses
+        :param: ttl: float: response lifetime in seconds,
+                None for no expiration
+        """
+        self.cache = LRUCache(max_size=max_size, ttl=ttl)
+        self.versions = None
+        self._lock = threading.Lock()
+
+    def get_or_compute(self, handler_name, normalized_text, versions,
+                       compute):
+        """
+        Get cached response or compute and cache it
+
+        :param: handler_name: str
+        :param: normalized_text: str
+        :param: versions: tuple: versions of data response depends on,
+                like model and glossary versions
+        :param: compute: function() -> (str, str): handler response
+        :return: (str, str): message and next handler code
+        """
+        if versions != self.versions:
+            self.invalidate(versions)
+
+        key = (handler_name, normalized_text, versions)
+        response = self.cache.get(key)
+        if response is not None:
+            RESPONSE_CACHE_REQUESTS.inc(handler=handler_name, result='hit')
+            return response
+
+        RESPONSE_CACHE_REQUESTS.inc(handler=handler_name, result='miss')
+        response = compute()
+
+        with self._lock:
+            evictions = self.cache.evictions
+            self.cache.set(key, response)
+            evicted = self.cache.evictions - evictions
+        if evicted:
+            RESPONSE_CACHE_EVICTIONS.inc(evicted)
+        return response
+
+    def invalidate(self, versions=None):
+        """
+        Remove all responses
+
+        :param: versions: tuple: versions of data new responses depend on
+        """
+        with self._lock:
+            self.cache.clear()
+            self.versions = versions
+
+    def stats(self):
+        """
+        :return: dict: hits, misses, hit rate, evictions and size of cache
+        """
+        return self.cache.stats()
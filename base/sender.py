@@ -0,0 +1,326 @@
+import os
+import json
+import time
+import asyncio
+import threading
+from concurrent.futures import Future, ThreadPoolExecutor
+from urllib.parse import urlencode
+
+import requests
+from requests.adapters import HTTPAdapter
+
+from .utils import log, WARNING
+
+
+# Constants
+GRAPH_API_URL = "https://graph.facebook.com"
+GRAPH_API_VERSION = "v2.6"
+MESSAGES_POST_LINK = "{}/{}/me/messages".format(GRAPH_API_URL,
+                                               GRAPH_API_VERSION)
+
+RETRY_STATUS_CODES = (429, 500, 502, 503, 504)
+USAGE_HEADERS = ('X-App-Usage', 'X-Page-Usage', 'X-Business-Use-Case-Usage')
+MAX_BATCH_SIZE = 50  # Graph API limit
+JSON_HEADERS = {"Content-Type": "application/json"}
+
+
+class MessageSender:
+    """
+    Sends messages to Graph API through persistent connection pool.
+    Retries requests failed with 429/5xx, slows down when Facebook
+    reports that rate limit is close, optionally coalesces messages
+    into Graph API batch requests. Coroutine methods send messages
+    from event loop with the same retry and rate limit policy
+    """
+
+    def __init__(self, access_token=None, url=MESSAGES_POST_LINK,
+                 batch_url=GRAPH_API_URL, pool_size=10, concurrency=4,
+                 max_retries=3, backoff_factor=0.5, max_backoff=60,
+                 usage_threshold=90, batch_window=0):
+        """
+        :param: access_token: str: page access token,
+                PAGE_ACCESS_TOKEN environment variable by default
+        :param: url: str: send API url
+        :param: batch_url: str: batch requests url
+        :param: pool_size: int: max number of kept-alive connections
+        :param: concurrency: int: number of threads for async sending
+        :param: max_retries: int
+        :param: backoff_factor: float: retry delay is
+                backoff_factor * 2 ** attempt seconds
+        :param: max_backoff: float: max retry delay in seconds
+        :param: usage_threshold: int: usage percent reported in
+                rate limit headers, after which sending is paused
+        :param: batch_window: float: if greater than 0, messages sent
+                within this number of seconds are sent in one batch request
+        """
+        self.url = url
+        self.batch_url = batch_url
+        self.max_retries = max_retries
+        self.backoff_factor = backoff_factor
+        self.max_backoff = max_backoff
+        self.usage_threshold = usage_threshold
+        self.batch_window = batch_window
+        self.relative_url = url[len(batch_url):].lstrip('/')
+
+        self._access_token = access_token
+        self._params = None
+
+        self.session = requests.Session()
+        adapter = HTTPAdapter(pool_connections=1, pool_maxsize=pool_size)
+        self.session.mount('https://', adapter)
+        self.session.mount('http://', adapter)
+        self.session.headers.update(JSON_HEADERS)
+
+        self.executor = ThreadPoolExecutor(max_workers=concurrency)
+
+        self._paused_until = 0
+        self._pending = []
+        self._pending_lock = threading.Lock()
+        self._flush_timer = None
+
+    @property
+    def params(self):
+        if self._params is None:
+            access_token = self._access_token or \
+                os.environ["PAGE_ACCESS_TOKEN"]
+            self._params = {"access_token": access_token}
+        return self._params
+
+    @staticmethod
+    def build_message(recipient_id, message_text):
+        """
+        :param: recipient_id: int
+        :param: message_text: str
+        :return: dict: send API request body
+        """
+        return {
+            "recipient": {
+                "id": recipient_id
+            },
+            "message": {
+                "text": message_text
+            }
+        }
+
+    def send(self, recipient_id, message_text):
+        """
+        Send message to recipient.
+        If batch window is set, message is only queued for batch request
+
+        :param: recipient_id: int
+        :param: message_text: str
+        :return: requests.Response or Future if message is queued
+        """
+        if self.batch_window > 0:
+            return self._enqueue(recipient_id, message_text)
+
+        data = json.dumps(self.build_message(recipient_id, message_text))
+        return self.request(self.url, data=data)
+
+    def send_async(self, recipient_id, message_text):
+        """
+        Send message to recipient in thread pool
+
+        :return: Future
+        """
+        return self.executor.submit(self.send, recipient_id, message_text)
+
+    async def send_aio(self, recipient_id, message_text):
+        """
+        Send message to recipient from event loop.
+        If batch window is set, message is sent in batch request
+
+        :param: recipient_id: int
+        :param: message_text: str
+        :return: int: response status code
+        """
+        if self.batch_window > 0:
+            return await asyncio.wrap_future(
+                self._enqueue(recipient_id, message_text)
+            )
+
+        data = json.dumps(self.build_message(recipient_id, message_text))
+        return await self.request_aio(self.url, data=data)
+
+    def send_batch(self, messages):
+        """
+        Send messages in Graph API batch requests
+
+        :param: messages: list: list of (recipient_id, message_text) pairs
+        :return: list: status codes of messages, None if batch failed
+        """
+        statuses = []
+        for start in range(0, len(messages), MAX_BATCH_SIZE):
+            chunk = messages[start:start + MAX_BATCH_SIZE]
+            batch = [{
+                "method": "POST",
+                "relative_url": self.relative_url,
+                "body": urlencode({
+                    key: json.dumps(value) for key, value in
+                    self.build_message(recipient_id, text).items()
+                })
+            } for recipient_id, text in chunk]
+
+            r = self.request(self.batch_url, data=json.dumps({
+                "batch": batch
+            }))
+            if r.status_code != 200:
+                statuses.extend([None] * len(chunk))
+                continue
+
+            for result in r.json():
+                statuses.append(result and result.get("code"))
+
+        return statuses
+
+    def request(self, url, data):
+        """
+        POST data to Graph API, retrying on 429 and 5xx responses
+
+        :param: url: str
+        :param: data: str
+        :return: requests.Response
+        """
+        attempt = 0
+        while True:
+            self._wait_for_rate_limit()
+            r = self.session.post(url, params=self.params, data=data)
+            self._update_rate_limit(r)
+
+            if r.status_code not in RETRY_STATUS_CODES or \
+                    attempt >= self.max_retries:
+                if r.status_code != 200:
+                    log("Graph API responded %s: %s", r.status_code, r.text,
+                        level=WARNING)
+                return r
+
+            time.sleep(self._retry_delay(r, attempt))
+            attempt += 1
+
+    async def request_aio(self, url, data):
+        """
+        POST data to Graph API through aiohttp session of event loop,
+        retrying on 429 and 5xx responses
+
+        :param: url: str
+        :param: data: str
+        :return: int: response status code
+        """
+        # imported here, so threaded server doesn't need aiohttp
+        from .aio import get_session
+
+        attempt = 0
+        while True:
+            delay = self._paused_until - time.time()
+            if delay > 0:
+                await asyncio.sleep(delay)
+
+            async with get_session().post(url, params=self.params,
+                                          headers=JSON_HEADERS,
+                                          data=data) as r:
+                self._update_rate_limit(r)
+                if r.status not in RETRY_STATUS_CODES or \
+                        attempt >= self.max_retries:
+                    if r.status != 200:
+                        log("Graph API responded %s: %s", r.status,
+                            await r.text(), level=WARNING)
+                    return r.status
+                delay = self._retry_delay(r, attempt)
+
+            await asyncio.sleep(delay)
+            attempt += 1
+
+    def flush(self):
+        """
+        Send queued messages in batch requests
+        """
+        with self._pending_lock:
+            pending, self._pending = self._pending, []
+            self._flush_timer = None
+        if not pending:
+            return
+
+        try:
+            statuses = self.send_batch([message for message, _ in pending])
+        except Exception as exc:
+            for _, future in pending:
+                future.set_exception(exc)
+            return
+
+        for (_, future), status in zip(pending, statuses):
+            future.set_result(status)
+
+    def close(self):
+        """
+        Send queued messages and close connections
+        """
+        if self._flush_timer is not None:
+            self._flush_timer.cancel()
+        self.flush()
+        self.executor.shutdown()
+        self.session.close()
+
+    def _enqueue(self, recipient_id, message_text):
+        future = Future()
+        with self._pending_lock:
+            self._pending.append(((recipient_id, message_text), future))
+            full = len(self._pending) >= MAX_BATCH_SIZE
+            if not full and self._flush_timer is None:
+                self._flush_timer = threading.Timer(self.batch_window,
+                                                    self.flush)
+                self._flush_timer.daemon = True
+                self._flush_timer.start()
+
+        if full:
+            self.executor.submit(self.flush)
+        return future
+
+    def _retry_delay(self, response, attempt):
+        retry_after = response.headers.get('Retry-After')
+        if retry_after is not None:
+            try:
+                return min(float(retry_after), self.max_backoff)
+            except ValueError:
+                pass
+        return min(self.backoff_factor * 2 ** attempt, self.max_backoff)
+
+    def _wait_for_rate_limit(self):
+        delay = self._paused_until - time.time()
+        if delay > 0:
+            time.sleep(delay)
+
+    def _update_rate_limit(self, response):
+        """
+        Pause sending if usage from rate limit headers is above threshold
+        """
+        usages = []
+        for header in USAGE_HEADERS:
+            value = response.headers.get(header)
+            if not value:
+                continue
+            try:
+                usage = json.loads(value)
+            except ValueError:
+                continue
+
+            # business use case header maps ids to lists of usages
+            if header == 'X-Business-Use-Case-Usage':
+                for items in usage.values():
+                    usages.extend(items)
+            else:
+                usages.append(usage)
+
+        pause = 0
+        for usage in usages:
+            percent = max(usage.get('call_count', 0),
+                          usage.get('total_cputime', 0),
+                          usage.get('total_time', 0))
+            if percent < self.usage_threshold:
+                continue
+            regain_minutes = usage.get('estimated_time_to_regain_access', 0)
+            pause = max(pause, regain_minutes * 60 or self.backoff_factor)
+
+        if pause:
+            log("Graph API rate limit is close, pausing for %ss", pause,
+                level=WARNING)
+            self._paused_until = time.time() + min(pause, self.max_backoff)
@@ -1,17 +1,49 @@
-import os
-import json
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor, wait
 
-import requests
-
-from .utils import log
+from .utils import log, DEBUG, ERROR
 from .exceptions import (DuplicateHandlerCodeException,
                          MessageHandlerNotSettedException,
                          PostbackHandlerUndefinedException)
-from .models import User, RequestResponse
-
+from .storage import MongoStorage
+from .sender import MessageSender, MESSAGES_POST_LINK
+from .state import ConversationStateStore
+from .workers import PartitionedWorkerPool
+from .metrics import registry
+
+
+REQUEST_SECONDS = registry.histogram(
+    'webhook_request_seconds', 'Time of handling webhook request'
+)
+STAGE_SECONDS = registry.histogram(
+    'webhook_stage_seconds', 'Time of messaging event handling stages',
+    labels=('stage',)
+)
+HANDLER_SECONDS = registry.histogram(
+    'webhook_handler_seconds', 'Time of message and postback handlers',
+    labels=('handler',)
+)
+EVENTS = registry.counter(
+    'webhook_events_total', 'Handled messaging events', labels=('type',)
+)
+EVENT_ERRORS = registry.counter(
+    'webhook_event_errors_total', 'Messaging events failed with exception',
+    labels=('exception',)
+)
+
+
+def group_events_by_sender(messaging_events):
+    """
+    Group messaging events by sender
 
-# Constants
-MESSAGES_POST_LINK = "https://graph.facebook.com/v2.6/me/messages"
+    :param: messaging_events: list
+    :return: list: lists of events of each sender in order they came
+    """
+    groups = OrderedDict()
+    for messaging_event in messaging_events:
+        sender_id = messaging_event.get("sender", {}).get("id")
+        groups.setdefault(sender_id, []).append(messaging_event)
+    return list(groups.values())
 
 
 class WebhookServer:
@@ -19,12 +51,72 @@ class WebhookServer:
     Webhook server that listens to requests from Facebook messenger
     """
 
-    def __init__(self):
+    def __init__(self, workers=0, queue_size=0, sender=None,
+                 state_store=None, audit_log=None, storage=None,
+                 batch_concurrency=0, deduplicator=None):
+        """
+        :param: workers: int: if greater than 0, messaging events are
+                handled in background by this number of worker threads
+                and requests are acknowledged immediately
+        :param: queue_size: int: max number of queued events per worker,
+                0 means unbounded
+        :param: sender: MessageSender: sender of Graph API requests
+        :param: state_store: ConversationStateStore: store of users'
+                next message handlers
+        :param: audit_log: AuditLog: if set, requests and responses
+                are saved in background in bulk
+        :param: storage: base.storage.Storage: storage of users' state
+                and requests, MongoStorage by default
+        :param: batch_concurrency: int: if greater than 1 and there are
+                no workers, events of different senders in one request
+                are handled by this number of threads in parallel
+        :param: deduplicator: base.dedup.EventDeduplicator: if set,
+                redelivered events are skipped
+        """
         self.message_handlers = dict()
         self.postback_handlers = dict()
 
         self.default_message_handler = None
 
+        self.storage = storage or MongoStorage()
+        self.sender = sender or MessageSender()
+        self.state_store = state_store or \
+            ConversationStateStore(storage=self.storage)
+        self.audit_log = audit_log
+        self.deduplicator = deduplicator
+
+        self.worker_pool = None
+        if workers > 0:
+            self.worker_pool = PartitionedWorkerPool(workers, queue_size)
+            self.worker_pool.start()
+
+        self.batch_concurrency = max(batch_concurrency, 1)
+        self.batch_executor = self.create_batch_executor()
+
+    def create_batch_executor(self):
+        """
+        :return: ThreadPoolExecutor: executor of senders' events,
+                 None if they are handled serially
+        """
+        if self.worker_pool is not None or self.batch_concurrency < 2:
+            return None
+        return ThreadPoolExecutor(self.batch_concurrency)
+
+    def close(self):
+        """
+        Handle events left in worker queues, then send queued messages
+        and write buffered requests and state updates
+        """
+        if self.worker_pool is not None:
+            self.worker_pool.stop()
+        if self.batch_executor is not None:
+            self.batch_executor.shutdown()
+
+        if self.audit_log is not None:
+            self.audit_log.close()
+        self.state_store.close()
+        self.sender.close()
+
     def set_message_handler(self, handler, handler_code, default=False):
         """
         Set message handler
@@ -71,12 +163,7 @@ class WebhookServer:
         if message_handler is None:
             raise MessageHandlerNotSettedException
 
-        user = User.objects(user_id=str(user_id)).first()
-        if user:
-            user.next_handler = message_handler_code
-        else:
-            user = User(user_id=str(user_id), next_handler=message_handler_code)
-        user.save()
+        self.state_store.set_next_handler(user_id, message_handler_code)
 
     def send_message(self, recipient_id, message_text):
         """
@@ -85,29 +172,35 @@ class WebhookServer:
         :param: recipient_id: int
         :param: message_text: str
         """
-        log("sending message to {recipient}: {text}".format(
-            recipient=recipient_id, text=message_text))
-
-        params = {
-            "access_token": os.environ["PAGE_ACCESS_TOKEN"]
-        }
-        headers = {
-            "Content-Type": "application/json"
-        }
-        data = json.dumps({
-            "recipient": {
-                "id": recipient_id
-            },
-            "message": {
-                "text": message_text
-            }
-        })
-
-        r = requests.post(MESSAGES_POST_LINK,
-                          params=params, headers=headers, data=data)
-        if r.status_code != 200:
-            log(r.status_code)
-            log(r.text)
+        log("sending message to %s: %s", recipient_id, message_text,
+            level=DEBUG)
+
+        self.sender.send(recipient_id, message_text)
+
+    def get_user_message_handler_code(self, user_id):
+        """
+        Get code of message handler that should handle user's next message
+
+        :param: user_id: int
+        :return: str
+        """
+        next_handler = self.state_store.get_next_handler(user_id)
+        if next_handler:
+            return next_handler
+
+        return self.default_message_handler
+
+    def save_request_response(self, **kwargs):
+        """
+        Save request and response
+
+        :param: kwargs: RequestResponse fields
+        """
+        if self.audit_log is not None:
+            self.audit_log.append(**kwargs)
+            return
+
+        self.storage.save_request_responses([kwargs])
 
     def handle_message(self, message, sender_id):
         """
@@ -116,27 +209,28 @@ class WebhookServer:
         :param: message: dict
         :param: sender_id: int
         """
-        user = User.objects(user_id=str(sender_id)).first()
-        if user:
-            message_handler_code = user.next_handler
-        else:
-            message_handler_code = self.default_message_handler
-
+        with STAGE_SECONDS.time(stage='user_state'):
+            message_handler_code = \
+                self.get_user_message_handler_code(sender_id)
         message_handler = self.message_handlers.get(message_handler_code)
         if not message_handler:
             raise MessageHandlerNotSettedException
 
-        reponse_message, next_handler = message_handler(message)
+        with HANDLER_SECONDS.time(handler=message_handler_code):
+            reponse_message, next_handler = message_handler(message)
 
-        # Save request and response
-        response_request = RequestResponse(
-            user_id=str(sender_id), request_type='message',
-            request_message=message.get('text'), response_text=reponse_message
-        )
-        response_request.save()
+        with STAGE_SECONDS.time(stage='audit'):
+            self.save_request_response(
+                user_id=str(sender_id), request_type='message',
+                request_message=message.get('text'),
+                response_text=reponse_message,
+                model_version=message.get('_model_version')
+            )
 
-        self.switch_user_message_handler(sender_id, next_handler)
-        self.send_message(sender_id, reponse_message)
+        with STAGE_SECONDS.time(stage='state_switch'):
+            self.switch_user_message_handler(sender_id, next_handler)
+        with STAGE_SECONDS.time(stage='send'):
+            self.send_message(sender_id, reponse_message)
 
     def handle_postback(self, postback, sender_id):
         """
@@ -150,42 +244,119 @@ class WebhookServer:
         if not postback_handler:
             raise PostbackHandlerUndefinedException
 
-        message, next_message_handler = postback_handler(postback)
+        with HANDLER_SECONDS.time(handler=postback_code):
+            message, next_message_handler = postback_handler(postback)
+
+        with STAGE_SECONDS.time(stage='audit'):
+            self.save_request_response(
+                user_id=str(sender_id), request_type='postback',
+                postback_type=postback_code, response_text=message
+            )
+
+        with STAGE_SECONDS.time(stage='state_switch'):
+            self.switch_user_message_handler(sender_id, next_message_handler)
+        with STAGE_SECONDS.time(stage='send'):
+            self.send_message(sender_id, message)
 
-        # Save request and response
-        response_request = RequestResponse(
-            user_id=str(sender_id), request_type='postback',
-            postback_type=postback_code, response_text=message
-        )
-        response_request.save()
+    def handle_messaging_event(self, messaging_event):
+        """
+        Dispatch single messaging event to message or postback handler
 
-        self.switch_user_message_handler(sender_id, next_message_handler)
-        self.send_message(sender_id, message)
+        :param: messaging_event: dict
+        """
+        try:
+            sender_id = messaging_event["sender"]["id"]
+
+            # handling a message
+            message = messaging_event.get("message", None)
+            if message is not None:
+                EVENTS.inc(type='message')
+                self.handle_message(message, sender_id)
+
+            # handling a postback
+            postback = messaging_event.get("postback", None)
+            if postback is not None:
+                EVENTS.inc(type='postback')
+                self.handle_postback(postback, sender_id)
+        except Exception as exc:
+            EVENT_ERRORS.inc(exception=type(exc).__name__)
+            log(exc, level=ERROR)
 
     def handle_request(self, request):
         """
         Dispatch request to right handler
-        and set message handler to handle next message request
+        and set message handler to handle next message request.
+        If worker pool is set, events are only queued, otherwise
+        with batch executor senders are handled in parallel.
+        Events of the same sender are handled in order they came
         """
-        data = request.get_json()
-        log(data)
+        with REQUEST_SECONDS.time():
+            with STAGE_SECONDS.time(stage='parse'):
+                data = request.get_json()
+            log("webhook request: %s", data, level=DEBUG)
+
+            if data["object"] == "page":
+                messaging_events = self.get_new_events(data)
+                if self.batch_executor is not None:
+                    self.handle_batch(
+                        group_events_by_sender(messaging_events)
+                    )
+                else:
+                    for messaging_event in messaging_events:
+                        self.dispatch_messaging_event(messaging_event)
 
-        if data["object"] == "page":
-            for entry in data["entry"]:
-                for messaging_event in entry["messaging"]:
-                    try:
-                        sender_id = messaging_event["sender"]["id"]
+        return "ok", 200
 
-                        # handling a message
-                        message = messaging_event.get("message", None)
-                        if message is not None:
-                            self.handle_message(message, sender_id)
+    def get_new_events(self, data):
+        """
+        Get messaging events of all entries of request,
+        skipping events redelivered by facebook
 
-                        # handling a postback
-                        postback = messaging_event.get("postback", None)
-                        if postback is not None:
-                            self.handle_postback(postback, sender_id)
-                    except Exception as exc:
-                        log(exc)
+        :param: data: dict: decoded request body
+        :return: list
+        """
+        messaging_events = [messaging_event for entry in data["entry"]
+                            for messaging_event in entry["messaging"]]
+        if self.deduplicator is None:
+            return messaging_events
 
-        return "ok", 200
+        with STAGE_SECONDS.time(stage='dedup'):
+            return [messaging_event for messaging_event in messaging_events
+                    if not self.deduplicator.is_duplicate(messaging_event)]
+
+    def handle_events(self, messaging_events):
+        """
+        Handle events one by one, failed event doesn't stop others
+
+        :param: messaging_events: list: events of one sender
+        """
+        for messaging_event in messaging_events:
+            self.handle_messaging_event(messaging_event)
+
+    def handle_batch(self, groups):
+        """
+        Handle groups of events in parallel on batch executor
+        and wait for all of them
+
+        :param: groups: list: lists of events of each sender
+        """
+        if len(groups) == 1:
+            self.handle_events(groups[0])
+            return
+
+        wait([self.batch_executor.submit(self.handle_events, events)
+              for events in groups])
+
+    def dispatch_messaging_event(self, messaging_event):
+        """
+        Handle messaging event now or queue it to worker pool
+
+        :param: messaging_event: dict
+        """
+        if self.worker_pool is None:
+            self.handle_messaging_event(messaging_event)
+            return
+
+        sender_id = messaging_event.get("sender", {}).get("id")
+        self.worker_pool.submit(sender_id, self.handle_messaging_event,
+                                messaging_event)
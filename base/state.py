@@ -0,0 +1,150 @@
+import atexit
+import threading
+
+from .cache import LRUCache
+from .storage import MongoStorage
+from .utils import log, ERROR
+
+
+WRITE_THROUGH = 'write-through'
+WRITE_BEHIND = 'write-behind'
+
+
+class ConversationStateStore:
+    """
+    Store of users' next message handler codes,
+    cached in memory in front of storage.
+
+    In write-through mode every update is written to storage
+    immediately, in write-behind mode updates are collected and
+    written in bulk every `flush_interval` seconds.
+    Cache is per process, so when users' messages can be handled by
+    several processes, `ttl` bounds how long stale state can be read
+    """
+
+    def __init__(self, max_size=10000, ttl=300, mode=WRITE_THROUGH,
+                 flush_interval=1.0, storage=None):
+        """
+        :param: max_size: int: max number of cached users
+        :param: ttl: float: seconds cached state is valid
+        :param: mode: str: WRITE_THROUGH or WRITE_BEHIND
+        :param: flush_interval: float: seconds between write-behind flushes
+        :param: storage: base.storage.Storage: MongoStorage by default
+        """
+        if mode not in (WRITE_THROUGH, WRITE_BEHIND):
+            raise ValueError("Unknown state store mode '%s'" % mode)
+
+        self.storage = storage or MongoStorage()
+        self.cache = LRUCache(max_size=max_size, ttl=ttl)
+        self.mode = mode
+        self.flush_interval = flush_interval
+
+        self._dirty = dict()
+        # updates being written by flush
+        self._flushing = dict()
+        self._dirty_lock = threading.Lock()
+        self._flusher = None
+        self._stopped = threading.Event()
+
+    def get_next_handler(self, user_id):
+        """
+        Get code of user's next message handler
+
+        :param: user_id: int
+        :return: str: handler code or None if user has no state
+        """
+        user_id = str(user_id)
+        missing = object()
+        next_handler = self.cache.get(user_id, missing)
+        if next_handler is not missing:
+            return next_handler
+
+        # pending update evicted from cache is newer than storage
+        with self._dirty_lock:
+            next_handler = self._dirty.get(
+                user_id, self._flushing.get(user_id, missing)
+            )
+        if next_handler is not missing:
+            self.cache.set(user_id, next_handler)
+            return next_handler
+
+        next_handler = self.storage.get_next_handler(user_id)
+        self.cache.set(user_id, next_handler)
+        return next_handler
+
+    def set_next_handler(self, user_id, next_handler):
+        """
+        Set code of user's next message handler
+
+        :param: user_id: int
+        :param: next_handler: str
+        """
+        user_id = str(user_id)
+        self.cache.set(user_id, next_handler)
+
+        if self.mode == WRITE_THROUGH:
+            self.storage.set_next_handler(user_id, next_handler)
+            return
+
+        with self._dirty_lock:
+            self._dirty[user_id] = next_handler
+        self._start_flusher()
+
+    def flush(self):
+        """
+        Write pending write-behind updates to storage in one bulk request
+        """
+        with self._dirty_lock:
+            dirty, self._dirty = self._dirty, dict()
+            self._flushing = dirty
+        if not dirty:
+            return
+
+        try:
+            self.storage.set_next_handlers(dirty)
+        except Exception:
+            # keep updates for next flush unless newer ones are pending
+            with self._dirty_lock:
+                for user_id, next_handler in dirty.items():
+                    self._dirty.setdefault(user_id, next_handler)
+            raise
+        finally:
+            with self._dirty_lock:
+                self._flushing = dict()
+
+    def close(self):
+        """
+        Stop background flushing and write pending updates
+        """
+        self._stopped.set()
+        if self._flusher is not None:
+            self._flusher.join()
+            self._flusher = None
+        self.flush()
+
+    def stats(self):
+        """
+        :return: dict: cache statistics and number of pending updates
+        """
+        stats = self.cache.stats()
+        stats['pending_writes'] = len(self._dirty)
+        return stats
+
+    def _start_flusher(self):
+        if self._flusher is not None:
+            return
+
+        with self._dirty_lock:
+            if self._flusher is not None:
+                return
+            self._flusher = threading.Thread(target=self._flush_loop,
+                                             daemon=True)
+            self._flusher.start()
+        atexit.register(self.close)
+
+    def _flush_loop(self):
+        while not self._stopped.wait(self.flush_interval):
+            try:
+                self.flush()
+            except Exception as exc:
+                log(exc, level=ERROR)
@@ -0,0 +1,24 @@
+from .base import Storage, CityWeather
+from .memory import MemoryStorage
+from .mongo import MongoStorage
+from .sqlite import SQLiteStorage
+
+
+def create_storage(url):
+    """
+    Create storage by url:
+    mongodb://... for MongoDB, sqlite:///relative/path.db,
+    sqlite:////absolute/path.db or sqlite:// for SQLite file or
+    in memory database, memory:// for process memory
+
+    :param: url: str
+    :return: Storage
+    """
+    if url.startswith('mongodb://') or url.startswith('mongodb+srv://'):
+        return MongoStorage(host=url)
+    if url.startswith('sqlite://'):
+        path = url[len('sqlite:///'):]
+        return SQLiteStorage(path or ':memory:')
+    if url == 'memory://':
+        return MemoryStorage()
+    raise ValueError("Unknown storage url '%s'" % url)
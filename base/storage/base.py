@@ -0,0 +1,115 @@
+from collections import namedtuple
+
+
+CityWeather = namedtuple('CityWeather', ['city', 'temp', 'wind_speed', 'time'])
+
+
+class Storage:
+    """
+    Storage of bot's data: users' next message handlers,
+    requests and responses, exchange rates and weather.
+    Implementations must be safe to use from several threads
+    """
+
+    # Users
+    def get_next_handler(self, user_id):
+        """
+        :param: user_id: str
+        :return: str: code of user's next message handler
+                 or None if user has no state
+        """
+        raise NotImplementedError
+
+    def set_next_handlers(self, next_handlers):
+        """
+        Save next message handlers of users in one write
+
+        :param: next_handlers: dict: user id -> handler code
+        """
+        raise NotImplementedError
+
+    def set_next_handler(self, user_id, next_handler):
+        """
+        :param: user_id: str
+        :param: next_handler: str
+        """
+        self.set_next_handlers({user_id: next_handler})
+
+    # Requests and responses
+    def save_request_responses(self, records):
+        """
+        Save requests and responses in one write
+
+        :param: records: list: dicts of RequestResponse fields
+        """
+        raise NotImplementedError
+
+    def get_labeled_requests(self, after=None, limit=1000):
+        """
+        Labeled request messages in order they were saved
+
+        :param: after: id of last already read record or None
+        :param: limit: int: max number of records
+        :return: list: (record id, request message, label) tuples
+        """
+        raise NotImplementedError
+
+    # Webhook events
+    def mark_event_seen(self, key, ttl):
+        """
+        Remember event for `ttl` seconds, atomically for all processes
+        sharing storage
+
+        :param: key: str: key of webhook event
+        :param: ttl: float: seconds
+        :return: bool: True if event is not seen yet or expired
+        """
+        raise NotImplementedError
+
+    # Exchange rates
+    def get_exchange_rate(self, currency_from, currency_to, date):
+        """
+        :param: currency_from: str
+        :param: currency_to: str
+        :param: date: datetime.date
+        :return: float: rate or None if it's not saved
+        """
+        raise NotImplementedError
+
+    def get_exchange_rates_range(self, currency_from, currency_to, date_from,
+                                 date_to):
+        """
+        :param: currency_from: str
+        :param: currency_to: str
+        :param: date_from: datetime.date
+        :param: date_to: datetime.date
+        :return: list: (date, rate) pairs ordered by date
+        """
+        raise NotImplementedError
+
+    def save_exchange_rates(self, rates):
+        """
+        Save rates in one write, replacing saved rates for same dates
+
+        :param: rates: list: (currency_from, currency_to, date, rate) tuples
+        """
+        raise NotImplementedError
+
+    # Weather
+    def get_latest_weather(self, city, since):
+        """
+        :param: city: str
+        :param: since: datetime.datetime
+        :return: CityWeather: latest weather of city not older than `since`
+                 or None
+        """
+        raise NotImplementedError
+
+    def save_weather(self, weather):
+        """
+        :param: weather: CityWeather
+        """
+        raise NotImplementedError
+
+    def close(self):
+        pass
@@ -0,0 +1,101 @@
+import time
+import threading
+from collections import deque
+
+from .base import Storage
+
+
+class MemoryStorage(Storage):
+    """
+    Storage in process memory, for tests and single process
+    deployments that can lose data on restart.
+    Only latest weather of each city and last `max_request_responses`
+    requests are kept
+    """
+
+    def __init__(self, max_request_responses=10000):
+        """
+        :param: max_request_responses: int
+        """
+        self.next_handlers = dict()
+        self.request_responses = deque(maxlen=max_request_responses)
+        self._last_request_response_id = 0
+        self.exchange_rates = dict()
+        self.weather = dict()
+        # event key -> expiration time
+        self.seen_events = dict()
+
+        self._seen_events_size = 1000
+        self._lock = threading.Lock()
+
+    def get_next_handler(self, user_id):
+        return self.next_handlers.get(user_id)
+
+    def set_next_handlers(self, next_handlers):
+        with self._lock:
+            self.next_handlers.update(next_handlers)
+
+    def save_request_responses(self, records):
+        with self._lock:
+            for fields in records:
+                self._last_request_response_id += 1
+                self.request_responses.append(
+                    dict(fields, id=self._last_request_response_id)
+                )
+
+    def get_labeled_requests(self, after=None, limit=1000):
+        with self._lock:
+            records = list(self.request_responses)
+        labeled = [(record['id'], record.get('request_message'),
+                    record['label'])
+                   for record in records if record.get('label') is not None
+                   and (after is None or record['id'] > after)]
+        return labeled[:limit]
+
+    def mark_event_seen(self, key, ttl):
+        now = time.monotonic()
+        with self._lock:
+            expires = self.seen_events.get(key)
+            if expires is not None and expires > now:
+                return False
+
+            # expired events are removed when number of events doubles
+            if len(self.seen_events) >= 2 * self._seen_events_size:
+                self.seen_events = {seen_key: expires for seen_key, expires
+                                    in self.seen_events.items()
+                                    if expires > now}
+                self._seen_events_size = max(len(self.seen_events), 1000)
+
+            self.seen_events[key] = now + ttl
+            return True
+
+    def get_exchange_rate(self, currency_from, currency_to, date):
+        return self.exchange_rates.get((currency_from, currency_to), {}) \
+            .get(date)
+
+    def get_exchange_rates_range(self, currency_from, currency_to, date_from,
+                                 date_to):
+        with self._lock:
+            rates = list(self.exchange_rates.get((currency_from, currency_to),
+                                                 {}).items())
+        return sorted((date, rate) for date, rate in rates
+                      if date_from <= date <= date_to)
+
+    def save_exchange_rates(self, rates):
+        with self._lock:
+            for currency_from, currency_to, date, rate in rates:
+                self.exchange_rates.setdefault(
+                    (currency_from, currency_to), dict()
+                )[date] = rate
+
+    def get_latest_weather(self, city, since):
+        weather = self.weather.get(city)
+        if weather is None or weather.time < since:
+            return None
+        return weather
+
+    def save_weather(self, weather):
+        with self._lock:
+            latest = self.weather.get(weather.city)
+            if latest is None or latest.time <= weather.time:
+                self.weather[weather.city] = weather
@@ -0,0 +1,118 @@
+from datetime import datetime, timedelta
+
+from bson import ObjectId
+from pymongo import UpdateOne
+from pymongo.errors import DuplicateKeyError
+from mongoengine import connect
+
+from ..models import (User, RequestResponse, ExchangeRate, Weather,
+                      SeenEvent)
+from .base import Storage, CityWeather
+
+
+class MongoStorage(Storage):
+    """
+    Storage in MongoDB through mongoengine models
+    """
+
+    def __init__(self, host=None):
+        """
+        :param: host: str: MongoDB uri, if not set
+                connection must be registered with mongoengine.connect
+        """
+        if host is not None:
+            connect(host=host)
+
+    def get_next_handler(self, user_id):
+        user = User.objects(user_id=user_id).only('next_handler').first()
+        return user.next_handler if user else None
+
+    def set_next_handlers(self, next_handlers):
+        if not next_handlers:
+            return
+
+        operations = [
+            UpdateOne({'user_id': user_id},
+                      {'$set': {'next_handler': next_handler}}, upsert=True)
+            for user_id, next_handler in next_handlers.items()
+        ]
+        User._get_collection().bulk_write(operations, ordered=False)
+
+    def save_request_responses(self, records):
+        if not records:
+            return
+
+        documents = [RequestResponse(**fields).to_mongo()
+                     for fields in records]
+        RequestResponse._get_collection().insert_many(documents,
+                                                      ordered=False)
+
+    def get_labeled_requests(self, after=None, limit=1000):
+        # matches filter of partial index of labeled records
+        query = {'label': {'$type': 'string'}}
+        if after is not None:
+            query['_id'] = {'$gt': ObjectId(after)}
+
+        documents = RequestResponse._get_collection().find(
+            query, {'request_message': True, 'label': True}
+        ).sort('_id', 1).limit(limit)
+        return [(str(document['_id']), document.get('request_message'),
+                 document['label']) for document in documents]
+
+    def mark_event_seen(self, key, ttl):
+        now = datetime.utcnow()
+        expires = now + timedelta(seconds=ttl)
+        collection = SeenEvent._get_collection()
+        try:
+            collection.insert_one({'key': key, 'expires': expires})
+            return True
+        except DuplicateKeyError:
+            # expired event, TTL monitor removes documents once a minute
+            return collection.update_one(
+                {'key': key, 'expires': {'$lte': now}},
+                {'$set': {'expires': expires}}
+            ).modified_count == 1
+
+    def get_exchange_rate(self, currency_from, currency_to, date):
+        exchange_rate = ExchangeRate.objects(
+            currency_from=currency_from, currency_to=currency_to, date=date
+        ).only('rate').first()
+        return exchange_rate.rate if exchange_rate else None
+
+    def get_exchange_rates_range(self, currency_from, currency_to, date_from,
+                                 date_to):
+        exchange_rates = ExchangeRate.objects(
+            currency_from=currency_from, currency_to=currency_to,
+            date__gte=date_from, date__lte=date_to
+        ).only('date', 'rate').order_by('date')
+        return [(exchange_rate.date.date(), exchange_rate.rate)
+                for exchange_rate in exchange_rates]
+
+    def save_exchange_rates(self, rates):
+        if not rates:
+            return
+
+        operations = []
+        for currency_from, currency_to, date, rate in rates:
+            document = ExchangeRate(
+                currency_from=currency_from, currency_to=currency_to,
+                date=date, rate=rate
+            ).to_mongo().to_dict()
+            key = {field: document[field] for field in
+                   ('currency_from', 'currency_to', 'date')}
+            operations.append(UpdateOne(key, {'$set': document},
+                                        upsert=True))
+        ExchangeRate._get_collection().bulk_write(operations, ordered=False)
+
+    def get_latest_weather(self, city, since):
+        document = Weather.objects(
+            city=city, time__gte=since
+        ).order_by('-time').first()
+        if document is None:
+            return None
+        return CityWeather(city, document.temp, document.wind_speed,
+                           document.time)
+
+    def save_weather(self, weather):
+        Weather(city=weather.city, temp=weather.temp,
+                wind_speed=weather.wind_speed, time=weather.time).save()
@@ -0,0 +1,209 @@
+import time
+import sqlite3
+import threading
+from datetime import datetime, timedelta
+
+from ..models import WEATHER_RETENTION
+from .base import Storage, CityWeather
+
+
+DATE_FORMAT = '%Y-%m-%d'
+TIME_FORMAT = '%Y-%m-%d %H:%M:%S.%f'
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS users (
+    user_id TEXT PRIMARY KEY,
+    next_handler TEXT NOT NULL
+);
+CREATE TABLE IF NOT EXISTS request_responses (
+    id INTEGER PRIMARY KEY,
+    user_id TEXT NOT NULL,
+    request_type TEXT NOT NULL,
+    request_message TEXT,
+    postback_type TEXT,
+    response_text TEXT NOT NULL,
+    label TEXT,
+    model_version TEXT
+);
+CREATE TABLE IF NOT EXISTS exchange_rates (
+    currency_from TEXT NOT NULL,
+    currency_to TEXT NOT NULL,
+    date TEXT NOT NULL,
+    rate REAL NOT NULL,
+    PRIMARY KEY (currency_from, currency_to, date)
+) WITHOUT ROWID;
+CREATE TABLE IF NOT EXISTS weather (
+    id INTEGER PRIMARY KEY,
+    city TEXT NOT NULL,
+    temp REAL NOT NULL,
+    wind_speed REAL NOT NULL,
+    time TEXT NOT NULL
+);
+CREATE INDEX IF NOT EXISTS weather_city_time ON weather (city, time);
+CREATE TABLE IF NOT EXISTS seen_events (
+    key TEXT PRIMARY KEY,
+    expires REAL NOT NULL
+) WITHOUT ROWID;
+CREATE INDEX IF NOT EXISTS seen_events_expires ON seen_events (expires);
+"""
+
+REQUEST_RESPONSE_FIELDS = ('user_id', 'request_type', 'request_message',
+                           'postback_type', 'response_text', 'label',
+                           'model_version')
+
+# columns added to request_responses after first version
+ADDED_COLUMNS = ('label', 'model_version')
+
+# created after migration of label column of old databases
+LABEL_INDEX = """
+CREATE INDEX IF NOT EXISTS request_responses_labeled
+ON request_responses (id) WHERE label IS NOT NULL
+"""
+
+
+class SQLiteStorage(Storage):
+    """
+    Storage in embedded SQLite database, for small deployments
+    without MongoDB and for tests.
+    One connection is shared by threads, writes are serialized
+    """
+
+    def __init__(self, path=':memory:'):
+        """
+        :param: path: str: database file, in memory database by default
+        """
+        self.path = path
+        self._lock = threading.Lock()
+        self._connection = sqlite3.connect(path, check_same_thread=False)
+        if path != ':memory:':
+            self._connection.execute('PRAGMA journal_mode=WAL')
+            self._connection.execute('PRAGMA synchronous=NORMAL')
+        self._connection.executescript(SCHEMA)
+        self._migrate()
+
+    def _migrate(self):
+        """
+        Add columns missing in databases created by previous versions
+        """
+        columns = [row[1] for row in self._connection.execute(
+            'PRAGMA table_info(request_responses)'
+        )]
+        with self._connection:
+            for column in ADDED_COLUMNS:
+                if column not in columns:
+                    self._connection.execute(
+                        'ALTER TABLE request_responses '
+                        'ADD COLUMN {} TEXT'.format(column)
+                    )
+            self._connection.execute(LABEL_INDEX)
+
+    def get_next_handler(self, user_id):
+        row = self._fetchone(
+            'SELECT next_handler FROM users WHERE user_id = ?', (user_id,)
+        )
+        return row[0] if row else None
+
+    def set_next_handlers(self, next_handlers):
+        self._executemany(
+            'INSERT OR REPLACE INTO users (user_id, next_handler) '
+            'VALUES (?, ?)', list(next_handlers.items())
+        )
+
+    def save_request_responses(self, records):
+        self._executemany(
+            'INSERT INTO request_responses ({}) VALUES ({})'.format(
+                ', '.join(REQUEST_RESPONSE_FIELDS),
+                ', '.join('?' * len(REQUEST_RESPONSE_FIELDS))
+            ),
+            [tuple(fields.get(field) for field in REQUEST_RESPONSE_FIELDS)
+             for fields in records]
+        )
+
+    def get_labeled_requests(self, after=None, limit=1000):
+        with self._lock:
+            return [tuple(row) for row in self._connection.execute(
+                'SELECT id, request_message, label FROM request_responses '
+                'WHERE label IS NOT NULL AND id > ? ORDER BY id LIMIT ?',
+                (after or 0, limit)
+            )]
+
+    def mark_event_seen(self, key, ttl):
+        now = time.time()
+        with self._lock, self._connection:
+            self._connection.execute(
+                'DELETE FROM seen_events WHERE expires <= ?', (now,)
+            )
+            cursor = self._connection.execute(
+                'INSERT OR IGNORE INTO seen_events (key, expires) '
+                'VALUES (?, ?)', (key, now + ttl)
+            )
+            return cursor.rowcount == 1
+
+    def get_exchange_rate(self, currency_from, currency_to, date):
+        row = self._fetchone(
+            'SELECT rate FROM exchange_rates WHERE currency_from = ? '
+            'AND currency_to = ? AND date = ?',
+            (currency_from, currency_to, date.strftime(DATE_FORMAT))
+        )
+        return row[0] if row else None
+
+    def get_exchange_rates_range(self, currency_from, currency_to, date_from,
+                                 date_to):
+        with self._lock:
+            rows = self._connection.execute(
+                'SELECT date, rate FROM exchange_rates WHERE '
+                'currency_from = ? AND currency_to = ? '
+                'AND date BETWEEN ? AND ? '
+                'ORDER BY date',
+                (currency_from, currency_to, date_from.strftime(DATE_FORMAT),
+                 date_to.strftime(DATE_FORMAT))
+            ).fetchall()
+        return [(datetime.strptime(date, DATE_FORMAT).date(), rate)
+                for date, rate in rows]
+
+    def save_exchange_rates(self, rates):
+        self._executemany(
+            'INSERT OR REPLACE INTO exchange_rates '
+            '(currency_from, currency_to, date, rate) VALUES (?, ?, ?, ?)',
+            [(currency_from, currency_to, date.strftime(DATE_FORMAT), rate)
+             for currency_from, currency_to, date, rate in rates]
+        )
+
+    def get_latest_weather(self, city, since):
+        row = self._fetchone(
+            'SELECT temp, wind_speed, time FROM weather '
+            'WHERE city = ? AND time >= ? ORDER BY time DESC LIMIT 1',
+            (city, since.strftime(TIME_FORMAT))
+        )
+        if row is None:
+            return None
+        temp, wind_speed, time = row
+        return CityWeather(city, temp, wind_speed,
+                           datetime.strptime(time, TIME_FORMAT))
+
+    def save_weather(self, weather):
+        expired = weather.time - timedelta(seconds=WEATHER_RETENTION)
+        with self._lock, self._connection:
+            self._connection.execute(
+                'INSERT INTO weather (city, temp, wind_speed, time) '
+                'VALUES (?, ?, ?, ?)',
+                (weather.city, weather.temp, weather.wind_speed,
+                 weather.time.strftime(TIME_FORMAT))
+            )
+            # only recent weather is used, like TTL index in MongoDB
+            self._connection.execute('DELETE FROM weather WHERE time < ?',
+                                     (expired.strftime(TIME_FORMAT),))
+
+    def close(self):
+        with self._lock:
+            self._connection.close()
+
+    def _fetchone(self, query, parameters):
+        with self._lock:
+            return self._connection.execute(query, parameters).fetchone()
+
+    def _executemany(self, query, rows):
+        if not rows:
+            return
+        with self._lock, self._connection:
+            self._connection.executemany(query, rows)
@@ -1,11 +1,127 @@
+import os
 import sys
+import queue
+import atexit
+import random
+import logging
+import resource
+import threading
+from logging import DEBUG, INFO, WARNING, ERROR
+from logging.handlers import QueueHandler, QueueListener
 
 
-def log(message):
+SMAPS_ROLLUP_PATH = '/proc/self/smaps_rollup'
+LOG_FORMAT = '%(asctime)s %(process)d %(levelname)s %(message)s'
+
+logger = logging.getLogger('bot')
+# part of debug records that are written, e.g. of per message logs
+debug_sample_rate = 1.0
+
+_listener = None
+_listener_pid = None
+_logging_lock = threading.Lock()
+
+
+def setup_logging(level=None, sample_rate=None, stream=None):
+    """
+    Write log records to stream in background thread, so logging
+    doesn't wait for stdout. Called on first log call in process,
+    again after fork, since listener thread isn't forked
+
+    :param: level: int or str: LOG_LEVEL environment variable, INFO by default
+    :param: sample_rate: float: part of written debug records,
+            LOG_SAMPLE_RATE environment variable, 1 by default
+    :param: stream: file: stdout by default
+    """
+    global _listener, _listener_pid, debug_sample_rate
+    with _logging_lock:
+        if _listener is not None and _listener_pid == os.getpid():
+            _listener.stop()
+        _listener = None
+        for handler in list(logger.handlers):
+            logger.removeHandler(handler)
+
+        level = level or os.environ.get('LOG_LEVEL', 'INFO')
+        logger.setLevel(level)
+        logger.propagate = False
+        debug_sample_rate = float(
+            sample_rate if sample_rate is not None
+            else os.environ.get('LOG_SAMPLE_RATE', 1)
+        )
+
+        handler = logging.StreamHandler(stream or sys.stdout)
+        handler.setFormatter(logging.Formatter(LOG_FORMAT))
+        records = queue.Queue()
+        logger.addHandler(QueueHandler(records))
+
+        _listener = QueueListener(records, handler)
+        _listener.start()
+        _listener_pid = os.getpid()
+
+
+@atexit.register
+def stop_logging():
+    """
+    Write queued log records and stop listener thread
     """
-    Simple wrapper for logging to stdout on heroku
+    global _listener
+    with _logging_lock:
+        if _listener is not None and _listener_pid == os.getpid():
+            _listener.stop()
+        _listener = None
 
-    :param: message: str
+
+def log(message, *args, level=INFO):
+    """
+    Log message asynchronously, debug messages are sampled.
+    Message is formatted with args only if it's written
+
+    :param: message: str or object
+    :param: args: arguments of %-formatting
+    :param: level: int: DEBUG, INFO, WARNING or ERROR
+    """
+    if _listener_pid != os.getpid():
+        setup_logging()
+    if not logger.isEnabledFor(level):
+        return
+    if level <= DEBUG and debug_sample_rate < 1 and \
+            random.random() >= debug_sample_rate:
+        return
+    logger.log(level, message, *args)
+
+
+def memory_usage():
+    """
+    Memory used by current process, in megabytes.
+    On linux pss and private memory show how much of rss is shared
+    with other processes, e.g. with gunicorn master after fork
+
+    :return: dict: rss and, if available, pss and private memory
+    """
+    usage = dict()
+    try:
+        with open(SMAPS_ROLLUP_PATH, 'r') as f_smaps:
+            for line in f_smaps:
+                name, _, value = line.partition(':')
+                if name in ('Rss', 'Pss', 'Private_Clean', 'Private_Dirty'):
+                    usage[name] = int(value.split()[0]) / 1024
+    except (OSError, ValueError):
+        # max rss, it's in kilobytes on linux
+        max_rss = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+        return {'rss': max_rss / 1024}
+
+    return {
+        'rss': usage.get('Rss', 0),
+        'pss': usage.get('Pss', 0),
+        'private': usage.get('Private_Clean', 0) +
+                   usage.get('Private_Dirty', 0),
+    }
+
+
+def format_memory_usage():
+    """
+    :return: str: like 'rss 120.1MB, pss 60.2MB, private 20.3MB'
     """
-    print(str(message))
-    sys.stdout.flush()
+    usage = memory_usage()
+    return ', '.join('{} {:.1f}MB'.format(name, usage[name])
+                     for name in ('rss', 'pss', 'private') if name in usage)
@@ -0,0 +1,177 @@
+import os
+import threading
+from datetime import datetime, timedelta
+
+import requests
+
+from .cache import SingleFlight
+from .storage import MongoStorage, CityWeather
+from .utils import log, WARNING, ERROR
+
+
+WEATHER_URL = 'http://api.openweathermap.org/data/2.5/weather'
+UPDATE_WEATHER_TIME_GAP = 30  # minutes
+MAX_STALE_TIME = 180  # minutes
+
+# openweathermap.org city name -> name in messages
+CITIES = {
+    'Moscow': 'Москва, Россия',
+    'Saint Petersburg': 'Санкт-Петербург, Россия',
+}
+
+
+def parse_weather(data):
+    """
+    Get temperature and wind speed from openweathermap.org response
+
+    :param: data: dict
+    :return: (float, float)
+    """
+    temp = float(data['main']['temp'])
+    wind_speed = float(data['wind']['speed'])
+    return temp, wind_speed
+
+
+class WeatherService:
+    """
+    Weather of cities kept in memory.
+    Weather older than `update_gap` is returned as is while it's
+    refreshed in background, only weather older than `max_stale`
+    makes caller wait for openweathermap.org.
+    Concurrent loads for the same city share one request
+    """
+
+    def __init__(self, url=WEATHER_URL, update_gap=UPDATE_WEATHER_TIME_GAP,
+                 max_stale=MAX_STALE_TIME, storage=None):
+        """
+        :param: url: str: openweathermap.org current weather url
+        :param: update_gap: int: minutes weather is fresh
+        :param: max_stale: int: minutes stale weather can be returned
+        :param: storage: base.storage.Storage: MongoStorage by default
+        """
+        self.storage = storage or MongoStorage()
+        self.url = url
+        self.update_gap = timedelta(minutes=update_gap)
+        self.max_stale = timedelta(minutes=max_stale)
+        self.singleflight = SingleFlight()
+        self.session = requests.Session()
+
+        self._weather = dict()
+        self._lock = threading.Lock()
+        self._refresh_timer = None
+
+    def get_weather(self, city):
+        """
+        Get weather of city
+
+        :param: city: str: openweathermap.org city name
+        :return: CityWeather
+        """
+        weather, fresh = self.get_cached(city)
+        if weather is not None:
+            if not fresh:
+                self.refresh_in_background(city)
+            return weather
+
+        return self.singleflight.do(city, self.refresh, city)
+
+    def get_cached(self, city):
+        """
+        Get weather of city from memory or storage
+
+        :param: city: str
+        :return: (CityWeather, bool): weather and if it's fresh,
+                 weather is None if there is no weather younger than max stale
+        """
+        now = datetime.now()
+        with self._lock:
+            weather = self._weather.get(city)
+
+        if weather is None:
+            weather = self.storage.get_latest_weather(city,
+                                                      now - self.max_stale)
+            if weather is None:
+                return None, False
+
+            with self._lock:
+                self._weather.setdefault(city, weather)
+
+        if weather.time < now - self.max_stale:
+            return None, False
+        return weather, weather.time >= now - self.update_gap
+
+    def refresh(self, city):
+        """
+        Load weather of city from openweathermap.org
+
+        :param: city: str
+        :return: CityWeather
+        """
+        payload = {'q': city, 'units': 'metric',
+                   'appid': os.environ.get('OWM_APPID')}
+        response = self.session.get(self.url, params=payload)
+
+        if response.status_code != 200:
+            log("openweathermap.org responded %s", response.status_code,
+                level=WARNING)
+        return self.store(city, response.json())
+
+    def refresh_in_background(self, city):
+        """
+        Start refreshing weather of city, unless it's already refreshing
+
+        :param: city: str
+        """
+        if self.singleflight.in_flight(city):
+            return
+
+        def refresh():
+            try:
+                self.singleflight.do(city, self.refresh, city)
+            except Exception as exc:
+                log(exc, level=ERROR)
+
+        threading.Thread(target=refresh, daemon=True).start()
+
+    def store(self, city, data):
+        """
+        Save weather from openweathermap.org response
+
+        :param: city: str
+        :param: data: dict
+        :return: CityWeather
+        """
+        temp, wind_speed = parse_weather(data)
+        weather = CityWeather(city, temp, wind_speed, datetime.now())
+        self.storage.save_weather(weather)
+
+        with self._lock:
+            self._weather[city] = weather
+        return weather
+
+    def clear(self):
+        with self._lock:
+            self._weather.clear()
+
+    def start_refresh(self, cities, interval):
+        """
+        Refresh weather of cities now and then every `interval` seconds
+
+        :param: cities: list
+        :param: interval: float
+        """
+        for city in cities:
+            try:
+                self.singleflight.do(city, self.refresh, city)
+            except Exception as exc:
+                log(exc, level=ERROR)
+
+        self._refresh_timer = threading.Timer(interval, self.start_refresh,
+                                              args=(cities, interval))
+        self._refresh_timer.daemon = True
+        self._refresh_timer.start()
+
+    def stop_refresh(self):
+        if self._refresh_timer is not None:
+            self._refresh_timer.cancel()
+            self._refresh_timer = None
@@ -0,0 +1,85 @@
+import queue
+import atexit
+import threading
+
+from .utils import log, ERROR
+
+
+class PartitionedWorkerPool:
+    """
+    Pool of worker threads, each draining its own queue.
+    Tasks submitted with the same key always go to the same worker,
+    so they are executed in the order they were submitted
+    """
+
+    def __init__(self, workers=4, queue_size=0):
+        """
+        :param: workers: int: number of worker threads
+        :param: queue_size: int: max size of each worker's queue,
+                0 means unbounded
+        """
+        if workers < 1:
+            raise ValueError("Worker pool needs at least one worker")
+
+        self.queues = [queue.Queue(maxsize=queue_size)
+                       for _ in range(workers)]
+        self.threads = []
+
+    def start(self):
+        """
+        Start worker threads, they are stopped at exit
+        after processing queued tasks
+        """
+        if self.threads:
+            return
+
+        for task_queue in self.queues:
+            thread = threading.Thread(target=self._worker, args=(task_queue,),
+                                      daemon=True)
+            thread.start()
+            self.threads.append(thread)
+        atexit.register(self.stop)
+
+    def submit(self, key, func, *args):
+        """
+        Put task to the queue of the worker responsible for key
+
+        :param: key: hashable: tasks with equal keys are run in order
+        :param: func: callable
+        """
+        task_queue = self.queues[hash(str(key)) % len(self.queues)]
+        task_queue.put((func, args))
+
+    def join(self):
+        """
+        Block until all submitted tasks are processed
+        """
+        for task_queue in self.queues:
+            task_queue.join()
+
+    def stop(self):
+        """
+        Process tasks left in queues and stop worker threads
+        """
+        if not self.threads:
+            return
+
+        atexit.unregister(self.stop)
+        for task_queue in self.queues:
+            task_queue.put(None)
+        for thread in self.threads:
+            thread.join()
+        self.threads = []
+
+    def _worker(self, task_queue):
+        while True:
+            task = task_queue.get()
+            try:
+                if task is None:
+                    return
+                func, args = task
+                func(*args)
+            except Exception as exc:
+                log(exc, level=ERROR)
+            finally:
+                task_queue.task_done()
@@ -0,0 +1,83 @@
+"""
+Throughput and latency of classifying messages from concurrent
+threads one by one and with BatchPredictor.
+
+    python -m benchmarks.batch_inference_bench
+"""
+import time
+import random
+import threading
+
+from sklearn.ensemble import RandomForestClassifier
+from sklearn.feature_extraction.text import CountVectorizer
+
+from classifiers.batching import BatchPredictor
+
+
+THREADS = 16
+MESSAGES_PER_THREAD = 200
+SETTINGS = ((1, 0), (8, 0.001), (32, 0.002), (32, 0.005), (64, 0.01))
+
+
+def make_model(rnd):
+    words = ['слово%d' % i for i in range(500)]
+    texts = [' '.join(rnd.choice(words) for _ in range(rnd.randint(3, 15)))
+             for _ in range(1000)]
+    labels = [str(rnd.randint(0, 1)) for _ in texts]
+
+    vectorizer = CountVectorizer(analyzer='word')
+    forest = RandomForestClassifier(n_estimators=10, random_state=0)
+    forest.fit(vectorizer.fit_transform(texts), labels)
+
+    return (lambda batch: forest.predict(vectorizer.transform(batch))), texts
+
+
+def run(predict, texts):
+    latencies = []
+    lock = threading.Lock()
+
+    def worker():
+        for text in texts[:MESSAGES_PER_THREAD]:
+            start = time.monotonic()
+            predict(text)
+            with lock:
+                latencies.append(time.monotonic() - start)
+
+    threads = [threading.Thread(target=worker) for _ in range(THREADS)]
+    start = time.monotonic()
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    elapsed = time.monotonic() - start
+
+    latencies.sort()
+    return (len(latencies) / elapsed,
+            latencies[len(latencies) // 2],
+            latencies[int(len(latencies) * 0.99)])
+
+
+def main():
+    predict_batch, texts = make_model(random.Random(0))
+
+    print("{:>10} {:>12} {:>12} {:>10} {:>10}".format(
+        'batch', 'latency, ms', 'msg/s', 'p50, ms', 'p99, ms'))
+    for max_batch_size, max_latency in SETTINGS:
+        if max_batch_size == 1:
+            predict = lambda text: predict_batch([text])[0]
+        else:
+            predictor = BatchPredictor(predict_batch,
+                                       max_batch_size=max_batch_size,
+                                       max_latency=max_latency)
+            predict = predictor.predict
+
+        throughput, p50, p99 = run(predict, texts)
+        print("{:>10} {:>12} {:>12.0f} {:>10.2f} {:>10.2f}".format(
+            max_batch_size, max_latency * 1e3, throughput, p50 * 1e3, p99 * 1e3))
+
+        if max_batch_size != 1:
+            predictor.close()
+
+
+if __name__ == '__main__':
+    main()
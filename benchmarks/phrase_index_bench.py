@@ -0,0 +1,69 @@
+"""
+Compares glossary search with PhraseIndex against
+substring search over every glossary phrase.
+
+    python -m benchmarks.phrase_index_bench
+"""
+import random
+import string
+import timeit
+
+from classifiers.phrase_index import PhraseIndex
+
+
+GLOSSARY_SIZES = (100, 1000, 10000, 50000)
+VOCABULARY_SIZE = 20000
+MESSAGE_LENGTH = 30
+REPEATS = 20
+
+
+def random_word(rnd):
+    return ''.join(rnd.choice(string.ascii_lowercase)
+                   for _ in range(rnd.randint(3, 10)))
+
+
+def make_glossary(rnd, vocabulary, size):
+    glossary = dict()
+    while len(glossary) < size:
+        phrase = ' '.join(rnd.choice(vocabulary)
+                          for _ in range(rnd.randint(1, 3)))
+        glossary[phrase] = phrase
+    return glossary
+
+
+def substring_search(glossary, normalized_text):
+    return [phrase for phrase, norm_phrase in glossary.items()
+            if norm_phrase in normalized_text]
+
+
+def main():
+    rnd = random.Random(0)
+    vocabulary = [random_word(rnd) for _ in range(VOCABULARY_SIZE)]
+    message = ' '.join(rnd.choice(vocabulary) for _ in range(MESSAGE_LENGTH))
+    tokens = message.split()
+
+    print("{:>10} {:>12} {:>14} {:>14}".format(
+        'glossary', 'build, ms', 'substring, us', 'index, us'))
+    for size in GLOSSARY_SIZES:
+        glossary = make_glossary(rnd, vocabulary, size)
+
+        start = timeit.default_timer()
+        index = PhraseIndex.from_phrases(
+            (norm_phrase.split(), phrase)
+            for phrase, norm_phrase in glossary.items()
+        )
+        build_time = timeit.default_timer() - start
+
+        substring_time = timeit.timeit(
+            lambda: substring_search(glossary, message), number=REPEATS
+        ) / REPEATS
+        index_time = timeit.timeit(
+            lambda: index.search(tokens), number=REPEATS
+        ) / REPEATS
+
+        print("{:>10} {:>12.1f} {:>14.1f} {:>14.1f}".format(
+            size, build_time * 1e3, substring_time * 1e6, index_time * 1e6))
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,178 @@
+"""
+Latency and query plans of handlers' MongoDB queries on large collections.
+Seeds local mongod with millions of documents (once, reused by next runs)
+and reports p50/p99 of every query with and without models' indexes.
+
+    python -m benchmarks.query_plans_bench [--uri mongodb://localhost/bench]
+"""
+import time
+import random
+import argparse
+from datetime import datetime, timedelta
+
+from mongoengine import connect
+
+from base.models import User, RequestResponse, ExchangeRate, Weather
+
+
+USERS = 1000000
+REQUEST_RESPONSES = 2000000
+CURRENCIES = 35
+RATE_DAYS = 30 * 365
+CITIES = 100
+WEATHER_DOCUMENTS = 1000000
+CHUNK_SIZE = 10000
+QUERIES = 1000
+
+
+def seed(collection, count, make_document):
+    """
+    Insert documents to collection unless it already has enough of them
+
+    :param: collection: pymongo.collection.Collection
+    :param: count: int
+    :param: make_document: callable: number -> dict
+    """
+    existing = collection.estimated_document_count()
+    if existing >= count:
+        return
+
+    start = time.monotonic()
+    for chunk_start in range(existing, count, CHUNK_SIZE):
+        collection.insert_many(
+            [make_document(i) for i in
+             range(chunk_start, min(chunk_start + CHUNK_SIZE, count))],
+            ordered=False
+        )
+    print("seeded {} {} in {:.0f}s".format(count - existing, collection.name,
+                                           time.monotonic() - start))
+
+
+def seed_all(today):
+    now = datetime.now()
+
+    seed(User._get_collection(), USERS, lambda i: {
+        'user_id': str(i), 'next_handler': 'DEFAULT_HANDLER',
+    })
+    seed(RequestResponse._get_collection(), REQUEST_RESPONSES, lambda i: {
+        'user_id': str(i % USERS), 'request_type': 'message',
+        'request_message': 'курс доллара', 'response_text': 'Курс',
+    })
+    seed(ExchangeRate._get_collection(), CURRENCIES * RATE_DAYS, lambda i: {
+        'currency_from': 'C%02d' % (i % CURRENCIES), 'currency_to': 'RUB',
+        'rate': 50.0 + i % 100,
+        'date': datetime.combine(today - timedelta(days=i // CURRENCIES),
+                                 datetime.min.time()),
+    })
+    # weather is kept less than day by TTL index
+    seed(Weather._get_collection(), WEATHER_DOCUMENTS, lambda i: {
+        'city': 'city%d' % (i % CITIES), 'temp': 20.0, 'wind_speed': 5.0,
+        'time': now - timedelta(seconds=i % (23 * 60 * 60)),
+    })
+
+
+def make_queries(today, rnd):
+    """
+    :return: list: (name, queryset factory) pairs, querysets are
+             the ones used by handlers, first() is limit(1)
+    """
+    def user_next_handler():
+        return User.objects(user_id=str(rnd.randrange(USERS))) \
+            .only('next_handler').limit(1)
+
+    def exchange_rate():
+        date = today - timedelta(days=rnd.randrange(RATE_DAYS))
+        return ExchangeRate.objects(
+            currency_from='C%02d' % rnd.randrange(CURRENCIES),
+            currency_to='RUB', date=date
+        ).only('rate').limit(1)
+
+    def exchange_rates_range():
+        date_to = today - timedelta(days=rnd.randrange(30, RATE_DAYS))
+        return ExchangeRate.objects(
+            currency_from='C%02d' % rnd.randrange(CURRENCIES),
+            currency_to='RUB', date__gte=date_to - timedelta(days=30),
+            date__lte=date_to
+        ).only('date', 'rate').order_by('date')
+
+    def recent_weather():
+        return Weather.objects(
+            city='city%d' % rnd.randrange(CITIES),
+            time__gte=datetime.now() - timedelta(hours=3)
+        ).order_by('-time').limit(1)
+
+    return [('user next handler', user_next_handler),
+            ('exchange rate', exchange_rate),
+            ('exchange rates for month', exchange_rates_range),
+            ('recent weather', recent_weather)]
+
+
+def plan_stages(plan):
+    """
+    :param: plan: dict: explain() winning plan
+    :return: str: stages of plan, like 'LIMIT<-FETCH<-IXSCAN'
+    """
+    stages = []
+    while plan:
+        stages.append(plan['stage'])
+        plan = plan.get('inputStage') or \
+            (plan.get('inputStages') or [None])[0]
+    return '<-'.join(stages)
+
+
+def measure(make_queryset, queries):
+    latencies = []
+    for _ in range(queries):
+        start = time.monotonic()
+        list(make_queryset())
+        latencies.append(time.monotonic() - start)
+
+    latencies.sort()
+    return (latencies[len(latencies) // 2],
+            latencies[int(len(latencies) * 0.99)])
+
+
+def run(queries, count):
+    print("{:>26} {:>10} {:>10}  {}".format('query', 'p50, ms', 'p99, ms',
+                                            'plan'))
+    for name, make_queryset in queries:
+        plan = make_queryset().explain()['queryPlanner']
+        p50, p99 = measure(make_queryset, count)
+        print("{:>26} {:>10.2f} {:>10.2f}  {}".format(
+            name, p50 * 1e3, p99 * 1e3, plan_stages(plan['winningPlan'])))
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument('--uri', default='mongodb://localhost/query_plans_bench')
+    parser.add_argument('--queries', type=int, default=QUERIES,
+                        help='number of measured queries of each kind')
+    parser.add_argument('--scans', type=int, default=20,
+                        help='number of measured queries without indexes')
+    args = parser.parse_args()
+
+    connect(host=args.uri)
+    today = datetime.now().date()
+    models = (User, RequestResponse, ExchangeRate, Weather)
+
+    # indexes are built before seeding, like in production
+    for model in models:
+        model.ensure_indexes()
+    seed_all(today)
+
+    rnd = random.Random(0)
+    print("with indexes")
+    run(make_queries(today, rnd), args.queries)
+
+    for model in models:
+        model._get_collection().drop_indexes()
+    try:
+        print("\nwithout indexes")
+        run(make_queries(today, rnd), args.scans)
+    finally:
+        for model in models:
+            model.ensure_indexes()
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,82 @@
+"""
+Storage cost of one handled message with every storage backend:
+reading user's state, saving request and response, saving next handler.
+
+    python -m benchmarks.storage_bench [--mongo-uri mongodb://localhost/bench]
+"""
+import os
+import time
+import shutil
+import random
+import argparse
+import tempfile
+
+from base.storage import MemoryStorage, SQLiteStorage, MongoStorage
+
+
+MESSAGES = 20000
+USERS = 1000
+
+
+def handle_message(storage, user_id):
+    storage.get_next_handler(user_id)
+    storage.save_request_responses([{
+        'user_id': user_id, 'request_type': 'message',
+        'request_message': 'курс доллара', 'response_text': 'Курс',
+    }])
+    storage.set_next_handler(user_id, 'DEFAULT_HANDLER')
+
+
+def run(storage, messages):
+    rnd = random.Random(0)
+    latencies = []
+    start = time.monotonic()
+    for _ in range(messages):
+        user_id = str(rnd.randrange(USERS))
+        message_start = time.monotonic()
+        handle_message(storage, user_id)
+        latencies.append(time.monotonic() - message_start)
+    elapsed = time.monotonic() - start
+
+    latencies.sort()
+    return (messages / elapsed,
+            latencies[len(latencies) // 2],
+            latencies[int(len(latencies) * 0.99)])
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument('--messages', type=int, default=MESSAGES)
+    parser.add_argument('--mongo-uri', help='also measure MongoStorage, '
+                        'database is dropped after run')
+    args = parser.parse_args()
+
+    directory = tempfile.mkdtemp()
+    backends = [
+        ('memory', MemoryStorage),
+        ('sqlite in memory', SQLiteStorage),
+        ('sqlite file', lambda: SQLiteStorage(
+            os.path.join(directory, 'bench.db')
+        )),
+    ]
+    if args.mongo_uri:
+        backends.append(('mongodb', lambda: MongoStorage(host=args.mongo_uri)))
+
+    print("{:>18} {:>10} {:>10} {:>10}".format('storage', 'msg/s',
+                                                'p50, us', 'p99, us'))
+    for name, create in backends:
+        storage = create()
+        throughput, p50, p99 = run(storage, args.messages)
+        print("{:>18} {:>10.0f} {:>10.1f} {:>10.1f}".format(
+            name, throughput, p50 * 1e6, p99 * 1e6))
+        storage.close()
+    shutil.rmtree(directory)
+
+    if args.mongo_uri:
+        from mongoengine.connection import get_db
+        db = get_db()
+        db.client.drop_database(db.name)
+
+
+if __name__ == '__main__':
+    main()
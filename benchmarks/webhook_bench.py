@@ -0,0 +1,364 @@
+"""
+Load test of webhook endpoint: replays generated Messenger webhook
+payloads, batches of entries with messages and postbacks of many
+users, through app.listen with local stubs of Graph API, cbr.ru and
+openweathermap.org. Reports throughput and p50/p95/p99 latency of
+requests and of every handler code.
+
+    python -m benchmarks.webhook_bench --save-baseline baseline.json
+    python -m benchmarks.webhook_bench --baseline baseline.json
+
+With --baseline run fails if latency or throughput is worse than
+baseline by more than --tolerance.
+Storage is in memory unless STORAGE_URL is set.
+"""
+import os
+import sys
+import json
+import time
+import random
+import argparse
+import threading
+from datetime import datetime, timedelta
+from http.server import HTTPServer, BaseHTTPRequestHandler
+from socketserver import ThreadingMixIn
+from urllib.parse import urlparse, parse_qs
+
+os.environ.setdefault('STORAGE_URL', 'memory://')
+os.environ.setdefault('PAGE_ACCESS_TOKEN', 'bench')
+os.environ.setdefault('LOG_LEVEL', 'WARNING')
+# module level app must not preload, main preloads unless --lazy
+os.environ['LAZY_LOADING'] = '1'
+
+import app
+import settings
+from base import handlers
+from base.sender import MessageSender, GRAPH_API_VERSION
+
+
+REQUESTS = 2000
+CONCURRENCY = 8
+USERS = 1000
+TOLERANCE = 0.2
+# milliseconds, latencies closer to baseline are noise
+MIN_DELTA = 1.0
+PERCENTILES = (50, 95, 99)
+
+PAGE_ID = '191383118059500'
+POSTBACKS = ('USDRUB_PAYLOAD', 'EURRUB_PAYLOAD', 'WEATHER_PAYLOAD',
+             'WEATHER_SPB_PAYLOAD')
+TEXTS = (
+    'Что такое машинное обучение?', 'расскажи про нейронные сети',
+    'как работает линейная регрессия', 'привет', 'что нового?',
+    'big data и data mining', 'кластеризация или классификация',
+    'сегодня', 'вчера', 'позавчера', '3 дня назад', '1 марта',
+    '15.02.2017', 'за неделю', 'за март', 'за последние 10 дней',
+)
+
+
+class ThreadingHTTPServer(ThreadingMixIn, HTTPServer):
+    daemon_threads = True
+
+
+class StubHandler(BaseHTTPRequestHandler):
+    """
+    Answers like Graph API, cbr.ru and openweathermap.org
+    after `latency` seconds
+    """
+
+    latency = 0
+
+    def log_message(self, format, *args):
+        pass
+
+    def do_GET(self):
+        url = urlparse(self.path)
+        params = {key: values[0] for key, values in
+                  parse_qs(url.query).items()}
+        time.sleep(self.latency)
+
+        if url.path.endswith('XML_daily_eng.asp'):
+            self.respond(cbr_daily_document(), 'application/xml')
+        elif url.path.endswith('XML_dynamic.asp'):
+            self.respond(cbr_dynamic_document(params['date_req1'],
+                                              params['date_req2']),
+                         'application/xml')
+        elif url.path.endswith('/weather'):
+            self.respond(json.dumps({'main': {'temp': 20.6},
+                                     'wind': {'speed': 6}}))
+        else:
+            self.respond('{}', status=404)
+
+    def do_POST(self):
+        length = int(self.headers.get('Content-Length', 0))
+        body = json.loads(self.rfile.read(length).decode('utf-8') or '{}')
+        time.sleep(self.latency)
+
+        if 'batch' in body:
+            self.respond(json.dumps([{'code': 200, 'body': '{}'}
+                                     for _ in body['batch']]))
+        else:
+            self.respond(json.dumps({
+                'recipient_id': body.get('recipient', {}).get('id'),
+                'message_id': 'mid.bench',
+            }))
+
+    def respond(self, body, content_type='application/json', status=200):
+        body = body.encode('utf-8')
+        self.send_response(status)
+        self.send_header('Content-Type', content_type)
+        self.send_header('Content-Length', str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+
+def cbr_daily_document():
+    return ('<ValCurs>' +
+            '<Valute><CharCode>USD</CharCode><Value>57,0020</Value></Valute>' +
+            '<Valute><CharCode>EUR</CharCode><Value>67,5010</Value></Valute>' +
+            '</ValCurs>')
+
+
+def cbr_dynamic_document(date_from, date_to):
+    date = datetime.strptime(date_from, '%d/%m/%Y')
+    date_to = datetime.strptime(date_to, '%d/%m/%Y')
+    records = []
+    while date <= date_to:
+        records.append('<Record Date="{}"><Value>57,{:04d}</Value></Record>'
+                       .format(date.strftime('%d.%m.%Y'), date.day * 100))
+        date += timedelta(days=1)
+    return '<ValCurs>' + ''.join(records) + '</ValCurs>'
+
+
+def start_stub(latency):
+    """
+    :param: latency: float: seconds stub waits before answering
+    :return: (HTTPServer, str): server and its url
+    """
+    handler = type('Handler', (StubHandler,), {'latency': latency})
+    server = ThreadingHTTPServer(('127.0.0.1', 0), handler)
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    return server, 'http://127.0.0.1:%d' % server.server_port
+
+
+def make_event(rnd, sequence):
+    """
+    :return: dict: messaging event with message or postback
+    """
+    event = {
+        'sender': {'id': str(rnd.randrange(USERS))},
+        'recipient': {'id': PAGE_ID},
+        'timestamp': 1500000000000 + sequence,
+    }
+    if rnd.random() < 0.3:
+        payload = rnd.choice(POSTBACKS)
+        event['postback'] = {'payload': payload, 'title': payload}
+    else:
+        event['message'] = {'mid': 'mid.%d' % sequence, 'seq': sequence,
+                            'text': rnd.choice(TEXTS)}
+    return event
+
+
+def make_payloads(count, seed=0):
+    """
+    Webhook request bodies with 1-3 entries of 1-4 events
+
+    :return: list: json strings
+    """
+    rnd = random.Random(seed)
+    sequence = 0
+    payloads = []
+    for _ in range(count):
+        entries = []
+        for _ in range(rnd.randint(1, 3)):
+            events = []
+            for _ in range(rnd.randint(1, 4)):
+                sequence += 1
+                events.append(make_event(rnd, sequence))
+            entries.append({'id': PAGE_ID, 'time': 1500000000000 + sequence,
+                            'messaging': events})
+        payloads.append(json.dumps({'object': 'page', 'entry': entries}))
+    return payloads
+
+
+class HandlerTimer:
+    """
+    Collects latencies and errors of server's handlers by handler code
+    """
+
+    def __init__(self, server):
+        self.latencies = dict()
+        self.errors = dict()
+        self._lock = threading.Lock()
+
+        for handlers_by_code in (server.message_handlers,
+                                 server.postback_handlers):
+            for code, handler in list(handlers_by_code.items()):
+                handlers_by_code[code] = self.wrap(code, handler)
+
+    def wrap(self, code, handler):
+        def timed_handler(request):
+            start = time.monotonic()
+            try:
+                return handler(request)
+            except Exception:
+                with self._lock:
+                    self.errors[code] = self.errors.get(code, 0) + 1
+                raise
+            finally:
+                with self._lock:
+                    self.latencies.setdefault(code, []).append(
+                        time.monotonic() - start
+                    )
+        return timed_handler
+
+
+def percentiles(latencies):
+    """
+    :param: latencies: list: seconds
+    :return: dict: p50, p95, p99 in milliseconds
+    """
+    latencies = sorted(latencies)
+    return {'p%d' % p: latencies[min(len(latencies) - 1,
+                                     len(latencies) * p // 100)] * 1e3
+            for p in PERCENTILES}
+
+
+def run(flask_app, payloads, concurrency):
+    """
+    POST payloads to app from `concurrency` threads
+
+    :return: (float, list): elapsed seconds and request latencies
+    """
+    latencies = []
+    lock = threading.Lock()
+    chunks = [payloads[i::concurrency] for i in range(concurrency)]
+
+    def client(chunk):
+        test_client = flask_app.test_client()
+        for payload in chunk:
+            start = time.monotonic()
+            response = test_client.post('/', data=payload,
+                                        content_type='application/json')
+            elapsed = time.monotonic() - start
+            if response.status_code != 200:
+                raise RuntimeError("Webhook responded %s" %
+                                   response.status_code)
+            with lock:
+                latencies.append(elapsed)
+
+    threads = [threading.Thread(target=client, args=(chunk,))
+               for chunk in chunks]
+    start = time.monotonic()
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+
+    # events queued to worker threads are handled after responses
+    server = settings.get_server()
+    if server.worker_pool is not None:
+        server.worker_pool.join()
+    if server.audit_log is not None:
+        server.audit_log.flush()
+    return time.monotonic() - start, latencies
+
+
+def compare(results, baseline, tolerance, min_delta=MIN_DELTA):
+    """
+    :param: tolerance: float: allowed relative regression
+    :param: min_delta: float: allowed absolute regression of latency, ms
+    :return: list: descriptions of regressions
+    """
+    regressions = []
+    if results['throughput'] < baseline['throughput'] * (1 - tolerance):
+        regressions.append("throughput {:.0f} < baseline {:.0f}".format(
+            results['throughput'], baseline['throughput']))
+
+    for name, stats in baseline['latency'].items():
+        current = results['latency'].get(name)
+        if current is None:
+            continue
+        for percentile, value in stats.items():
+            if current[percentile] > max(value * (1 + tolerance),
+                                         value + min_delta):
+                regressions.append("{} {} {:.2f}ms > baseline {:.2f}ms".format(
+                    name, percentile, current[percentile], value))
+    return regressions
+
+
+def main():
+    parser = argparse.ArgumentParser(
+        description=__doc__, formatter_class=argparse.RawTextHelpFormatter
+    )
+    parser.add_argument('--requests', type=int, default=REQUESTS)
+    parser.add_argument('--concurrency', type=int, default=CONCURRENCY,
+                        help='number of concurrent clients')
+    parser.add_argument('--stub-latency', type=float, default=0.0,
+                        help='seconds stubbed APIs wait before answering')
+    parser.add_argument('--lazy', action='store_true',
+                        help='load classifier on first request, '
+                             'like LAZY_LOADING=1')
+    parser.add_argument('--baseline', help='compare with baseline json')
+    parser.add_argument('--save-baseline', help='save results as baseline')
+    parser.add_argument('--tolerance', type=float, default=TOLERANCE)
+    parser.add_argument('--min-delta', type=float, default=MIN_DELTA,
+                        help='ignored latency regression, ms')
+    args = parser.parse_args()
+
+    stub, stub_url = start_stub(args.stub_latency)
+
+    flask_app = app.create_app(preload=not args.lazy)
+    server = settings.get_server()
+    server.sender = MessageSender(
+        access_token='bench', batch_url=stub_url,
+        url='{}/{}/me/messages'.format(stub_url, GRAPH_API_VERSION)
+    )
+    handlers.exchange_rate_service.url = stub_url + '/scripts/XML_daily_eng.asp'
+    handlers.exchange_rate_service.dynamic_url = \
+        stub_url + '/scripts/XML_dynamic.asp'
+    handlers.weather_service.url = stub_url + '/data/2.5/weather'
+    timer = HandlerTimer(server)
+
+    payloads = make_payloads(args.requests)
+    events = sum(len(entry['messaging']) for payload in payloads
+                 for entry in json.loads(payload)['entry'])
+
+    elapsed, latencies = run(flask_app, payloads, args.concurrency)
+    stub.shutdown()
+
+    results = {
+        'throughput': events / elapsed,
+        'latency': {'request': percentiles(latencies)},
+    }
+    for code, handler_latencies in timer.latencies.items():
+        results['latency'][code] = percentiles(handler_latencies)
+
+    print("{} requests, {} events in {:.2f}s: {:.0f} events/s".format(
+        len(payloads), events, elapsed, results['throughput']))
+    print("{:>28} {:>8} {:>10} {:>10} {:>10} {:>8}".format(
+        'handler', 'calls', 'p50, ms', 'p95, ms', 'p99, ms', 'errors'))
+    for name in sorted(results['latency'], key=lambda name: name != 'request'):
+        stats = results['latency'][name]
+        calls = len(latencies) if name == 'request' \
+            else len(timer.latencies[name])
+        print("{:>28} {:>8} {:>10.2f} {:>10.2f} {:>10.2f} {:>8}".format(
+            name, calls, stats['p50'], stats['p95'], stats['p99'],
+            timer.errors.get(name, 0)))
+
+    if args.save_baseline:
+        with open(args.save_baseline, 'w') as f_baseline:
+            json.dump(results, f_baseline, indent=2, sort_keys=True)
+
+    if args.baseline:
+        with open(args.baseline, 'r') as f_baseline:
+            regressions = compare(results, json.load(f_baseline),
+                                  args.tolerance, args.min_delta)
+        for regression in regressions:
+            print("REGRESSION: " + regression)
+        if regressions:
+            sys.exit(1)
+
+
+if __name__ == '__main__':
+    main()
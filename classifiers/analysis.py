@@ -0,0 +1,25 @@
+from collections import namedtuple
+
+from .preprocessors import tokenize, normalize_word
+
+
+TextAnalysis = namedtuple('TextAnalysis', ['text', 'tokens',
+                                           'normalized_tokens',
+                                           'normalized_text'])
+
+
+def analyze_text(text):
+    """
+    Tokenize and normalize text once, so result can be shared
+    by classifier, glossary search and other consumers
+
+    :param: text: str
+    :return: TextAnalysis
+    """
+    text = text or ''
+    tokens = tokenize(text)
+    normalized_tokens = [normalize_word(token) for token in tokens]
+
+    return TextAnalysis(text=text, tokens=tokens,
+                        normalized_tokens=normalized_tokens,
+                        normalized_text=' '.join(normalized_tokens))
@@ -0,0 +1,132 @@
+import time
+import threading
+from collections import deque
+from concurrent.futures import Future
+
+
+class BatchPredictor:
+    """
+    Collects items submitted from concurrent threads within a small
+    time window and predicts them in one call of batch predict function
+    """
+
+    def __init__(self, predict, max_batch_size=32, max_latency=0.005,
+                 latency_window=1000):
+        """
+        :param: predict: function(list) -> list: batch predict function
+        :param: max_batch_size: int: max number of items in one batch
+        :param: max_latency: float: max seconds first item of batch
+                waits for other items
+        :param: latency_window: int: number of last latencies kept for stats
+        """
+        self.predict_batch = predict
+        self.max_batch_size = max_batch_size
+        self.max_latency = max_latency
+
+        self.batches = 0
+        self.items = 0
+        self.latencies = deque(maxlen=latency_window)
+        self.started = time.monotonic()
+
+        self._queue = deque()
+        self._condition = threading.Condition()
+        self._stopped = False
+        self._worker = None
+
+    def submit(self, item):
+        """
+        Add item to next batch
+
+        :param: item: object
+        :return: Future: result of prediction
+        """
+        future = Future()
+        with self._condition:
+            if self._stopped:
+                raise RuntimeError("Batch predictor is closed")
+            if self._worker is None:
+                self._worker = threading.Thread(target=self._run, daemon=True)
+                self._worker.start()
+
+            self._queue.append((item, future, time.monotonic()))
+            self._condition.notify()
+        return future
+
+    def predict(self, item):
+        """
+        Predict single item, blocks until its batch is processed
+
+        :param: item: object
+        :return: object
+        """
+        return self.submit(item).result()
+
+    def close(self):
+        """
+        Process queued items and stop worker
+        """
+        with self._condition:
+            self._stopped = True
+            self._condition.notify()
+        if self._worker is not None:
+            self._worker.join()
+            self._worker = None
+
+    def stats(self):
+        """
+        :return: dict: throughput, average batch size and latency percentiles
+        """
+        latencies = sorted(self.latencies)
+        elapsed = time.monotonic() - self.started
+
+        def percentile(p):
+            if not latencies:
+                return 0.0
+            return latencies[min(int(len(latencies) * p), len(latencies) - 1)]
+
+        return {
+            'batches': self.batches,
+            'items': self.items,
+            'avg_batch_size': self.items / self.batches if self.batches else 0,
+            'throughput': self.items / elapsed if elapsed else 0,
+            'latency_p50': percentile(0.5),
+            'latency_p99': percentile(0.99),
+        }
+
+    def _next_batch(self):
+        with self._condition:
+            while not self._queue and not self._stopped:
+                self._condition.wait()
+            if not self._queue:
+                return None
+
+            deadline = self._queue[0][2] + self.max_latency
+            while len(self._queue) < self.max_batch_size and \
+                    not self._stopped:
+                timeout = deadline - time.monotonic()
+                if timeout <= 0:
+                    break
+                self._condition.wait(timeout)
+
+            size = min(self.max_batch_size, len(self._queue))
+            return [self._queue.popleft() for _ in range(size)]
+
+    def _run(self):
+        while True:
+            batch = self._next_batch()
+            if batch is None:
+                return
+
+            try:
+                results = self.predict_batch([item for item, _, _ in batch])
+            except Exception as exc:
+                for _, future, _ in batch:
+                    future.set_exception(exc)
+                continue
+
+            now = time.monotonic()
+            for (_, future, submitted), result in zip(batch, results):
+                future.set_result(result)
+                self.latencies.append(now - submitted)
+            self.batches += 1
+            self.items += len(batch)
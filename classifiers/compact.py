@@ -0,0 +1,222 @@
+import os
+import re
+import json
+from collections import Counter
+
+import numpy as np
+
+
+FORMAT_VERSION = 1
+META_FILE = 'meta.json'
+ARRAYS = ('vocab_slots', 'vocab_terms', 'vocab_offsets', 'vocab_columns',
+          'tree_roots', 'children_left', 'children_right', 'feature',
+          'threshold', 'proba')
+
+FNV_OFFSET = 0x811c9dc5
+FNV_PRIME = 0x01000193
+
+
+def fnv1a(data):
+    """
+    32 bit FNV-1a hash, stable across processes unlike hash()
+
+    :param: data: bytes
+    :return: int
+    """
+    h = FNV_OFFSET
+    for byte in data:
+        h = ((h ^ byte) * FNV_PRIME) & 0xffffffff
+    return h
+
+
+def build_vocabulary_table(vocabulary):
+    """
+    Build open addressing hash table of vocabulary terms in flat arrays
+
+    :param: vocabulary: dict: term -> feature column
+    :return: dict: arrays of table
+    """
+    terms = sorted(vocabulary)
+    encoded = [term.encode('utf-8') for term in terms]
+
+    offsets = np.zeros(len(terms) + 1, dtype=np.int64)
+    offsets[1:] = np.cumsum([len(term) for term in encoded])
+    blob = np.frombuffer(b''.join(encoded), dtype=np.uint8)
+    columns = np.array([vocabulary[term] for term in terms], dtype=np.int32)
+
+    size = 1
+    while size < 2 * max(len(terms), 1):
+        size *= 2
+    slots = np.full(size, -1, dtype=np.int32)
+    for term_index, term in enumerate(encoded):
+        slot = fnv1a(term) & (size - 1)
+        while slots[slot] != -1:
+            slot = (slot + 1) & (size - 1)
+        slots[slot] = term_index
+
+    return {'vocab_slots': slots, 'vocab_terms': blob,
+            'vocab_offsets': offsets, 'vocab_columns': columns}
+
+
+def build_tree_arrays(forest):
+    """
+    Flatten trees of forest into concatenated node arrays.
+    Leaves keep class probabilities normalized as in tree's predict_proba
+
+    :param: forest: sklearn.ensemble.RandomForestClassifier
+    :return: dict: arrays of trees
+    """
+    roots, left, right, features, thresholds, probas = [], [], [], [], [], []
+    offset = 0
+    for estimator in forest.estimators_:
+        tree = estimator.tree_
+        is_leaf = tree.children_left == -1
+
+        roots.append(offset)
+        left.append(np.where(is_leaf, -1, tree.children_left + offset))
+        right.append(np.where(is_leaf, -1, tree.children_right + offset))
+        features.append(tree.feature)
+        thresholds.append(tree.threshold)
+
+        proba = tree.value[:, 0, :forest.n_classes_]
+        normalizer = proba.sum(axis=1)[:, np.newaxis]
+        normalizer[normalizer == 0.0] = 1.0
+        probas.append(proba / normalizer)
+
+        offset += tree.node_count
+
+    return {
+        'tree_roots': np.array(roots, dtype=np.int64),
+        'children_left': np.concatenate(left).astype(np.int64),
+        'children_right': np.concatenate(right).astype(np.int64),
+        'feature': np.concatenate(features).astype(np.int32),
+        'threshold': np.concatenate(thresholds).astype(np.float64),
+        'proba': np.concatenate(probas).astype(np.float64),
+    }
+
+
+def export_compact_model(vectorizer, forest, path):
+    """
+    Save fitted CountVectorizer and RandomForestClassifier
+    in format loadable by CompactForestModel
+
+    :param: vectorizer: sklearn.feature_extraction.text.CountVectorizer
+    :param: forest: sklearn.ensemble.RandomForestClassifier
+    :param: path: str: directory of model
+    """
+    if vectorizer.ngram_range != (1, 1) or vectorizer.analyzer != 'word':
+        raise ValueError("Only word unigram vectorizers are supported")
+
+    vocabulary = getattr(vectorizer, 'vocabulary_', None) or \
+        vectorizer.vocabulary
+    arrays = build_vocabulary_table(vocabulary)
+    arrays.update(build_tree_arrays(forest))
+
+    os.makedirs(path, exist_ok=True)
+    for name in ARRAYS:
+        np.save(os.path.join(path, name + '.npy'), arrays[name])
+
+    meta = {
+        'format_version': FORMAT_VERSION,
+        'token_pattern': vectorizer.token_pattern,
+        'n_features': len(vocabulary),
+        'classes': [str(cls) for cls in forest.classes_],
+    }
+    with open(os.path.join(path, META_FILE), 'w') as f_meta:
+        json.dump(meta, f_meta)
+
+
+class CompactForestModel:
+    """
+    Random forest text classifier loaded from arrays saved by
+    export_compact_model. Needs only numpy, arrays are memory mapped,
+    so forked workers share their pages.
+    Predicts from normalized text, like vectorizer with
+    identity preprocessor
+    """
+
+    def __init__(self, path, mmap_mode='r'):
+        """
+        :param: path: str: directory of model
+        :param: mmap_mode: str: numpy.load mmap mode, None to read in memory
+        """
+        with open(os.path.join(path, META_FILE), 'r') as f_meta:
+            meta = json.load(f_meta)
+        if meta['format_version'] != FORMAT_VERSION:
+            raise ValueError("Unsupported compact model format version %s" %
+                             meta['format_version'])
+
+        self.path = path
+        self.classes = meta['classes']
+        self.token_regex = re.compile(meta['token_pattern'])
+
+        for name in ARRAYS:
+            setattr(self, name, np.load(os.path.join(path, name + '.npy'),
+                                        mmap_mode=mmap_mode))
+        self._mask = len(self.vocab_slots) - 1
+        self._terms = memoryview(self.vocab_terms)
+
+    def lookup(self, term):
+        """
+        Get feature column of term
+
+        :param: term: str
+        :return: int or None if term is not in vocabulary
+        """
+        encoded = term.encode('utf-8')
+        slot = fnv1a(encoded) & self._mask
+        while True:
+            term_index = self.vocab_slots[slot]
+            if term_index == -1:
+                return None
+            start = self.vocab_offsets[term_index]
+            end = self.vocab_offsets[term_index + 1]
+            if self._terms[start:end] == encoded:
+                return int(self.vocab_columns[term_index])
+            slot = (slot + 1) & self._mask
+
+    def features(self, normalized_text):
+        """
+        Count vocabulary terms in text
+
+        :param: normalized_text: str
+        :return: dict: feature column -> count
+        """
+        counts = Counter()
+        for token in self.token_regex.findall(normalized_text):
+            column = self.lookup(token)
+            if column is not None:
+                counts[column] += 1
+        return counts
+
+    def predict_proba_one(self, normalized_text):
+        """
+        :param: normalized_text: str
+        :return: numpy.array: class probabilities
+        """
+        features = self.features(normalized_text)
+        proba = None
+        for root in self.tree_roots:
+            node = int(root)
+            while self.children_left[node] != -1:
+                value = np.float32(features.get(int(self.feature[node]), 0))
+                if value <= self.threshold[node]:
+                    node = int(self.children_left[node])
+                else:
+                    node = int(self.children_right[node])
+
+            if proba is None:
+                proba = np.array(self.proba[node])
+            else:
+                proba += self.proba[node]
+
+        proba /= len(self.tree_roots)
+        return proba
+
+    def predict(self, normalized_texts):
+        """
+        :param: normalized_texts: list
+        :return: list: predicted classes
+        """
+        return [self.classes[int(np.argmax(self.predict_proba_one(text)))]
+                for text in normalized_texts]
@@ -0,0 +1,202 @@
+import os
+import json
+import pickle
+from datetime import datetime
+
+from base.utils import log, WARNING
+from .preprocessors import identity_preprocessor, normalize_texts
+
+
+# fixed size of hashed feature space, new words need no refit
+N_FEATURES = 2 ** 18
+FORMAT_VERSION = 1
+MODELS_PATH = './data/models'
+MODEL_FILE = 'model.pkl'
+META_FILE = 'meta.json'
+LATEST_FILE = 'LATEST'
+VERSION_FORMAT = '{:06d}'
+
+
+class OnlineModel:
+    """
+    Classifier of normalized texts updated incrementally:
+    stateless hashing vectorizer and linear model trained by partial_fit
+    """
+
+    def __init__(self, classes, n_features=N_FEATURES):
+        """
+        :param: classes: iterable: all labels model can predict
+        :param: n_features: int: size of hashed feature space
+        """
+        # imported here, so published versions are listed and read
+        # without loading scikit-learn
+        from sklearn.linear_model import SGDClassifier
+        from sklearn.feature_extraction.text import HashingVectorizer
+
+        self.classes = sorted(set(classes))
+        self.n_features = n_features
+        self.vectorizer = HashingVectorizer(analyzer='word',
+                                            preprocessor=identity_preprocessor,
+                                            n_features=n_features)
+        self.classifier = SGDClassifier(random_state=0)
+        self.trained_records = 0
+        # id of last record of storage model is trained on
+        self.last_record_id = None
+
+    def partial_fit(self, normalized_texts, labels):
+        """
+        Update model with one batch
+
+        :param: normalized_texts: list
+        :param: labels: list
+        """
+        features = self.vectorizer.transform(normalized_texts)
+        self.classifier.partial_fit(features, labels, classes=self.classes)
+        self.trained_records += len(labels)
+
+    def predict(self, normalized_texts):
+        """
+        :param: normalized_texts: list
+        :return: list: predicted classes
+        """
+        return list(self.classifier.predict(
+            self.vectorizer.transform(normalized_texts)
+        ))
+
+
+def train_from_storage(model, storage, batch_size=1000, max_batches=None):
+    """
+    Update model with labeled requests saved after ones it's trained on.
+    Requests with labels unknown to model are skipped
+
+    :param: model: OnlineModel
+    :param: storage: base.storage.Storage
+    :param: batch_size: int: records in one partial_fit
+    :param: max_batches: int: stop after this number of batches,
+            None to read all new records
+    :return: int: number of records model is trained on
+    """
+    trained = 0
+    batches = 0
+    while max_batches is None or batches < max_batches:
+        records = storage.get_labeled_requests(after=model.last_record_id,
+                                               limit=batch_size)
+        if not records:
+            break
+
+        texts = []
+        labels = []
+        for _, request_message, label in records:
+            if label not in model.classes:
+                log("Skipping request with unknown label %s", label,
+                    level=WARNING)
+            elif request_message:
+                texts.append(request_message)
+                labels.append(label)
+
+        if labels:
+            model.partial_fit(normalize_texts(texts), labels)
+            trained += len(labels)
+        model.last_record_id = records[-1][0]
+        batches += 1
+
+    return trained
+
+
+def list_versions(path=MODELS_PATH):
+    """
+    :param: path: str: directory of model versions
+    :return: list: published versions from oldest to newest
+    """
+    if not os.path.isdir(path):
+        return []
+    return sorted(name for name in os.listdir(path)
+                  if name.isdigit() and
+                  os.path.exists(os.path.join(path, name, META_FILE)))
+
+
+def publish_model(model, path=MODELS_PATH):
+    """
+    Save model as new version and mark it latest.
+    Version directory is renamed into place when it's complete,
+    so readers never see partially written model
+
+    :param: model: OnlineModel
+    :param: path: str: directory of model versions
+    :return: str: version
+    """
+    versions = list_versions(path)
+    version = VERSION_FORMAT.format(int(versions[-1]) + 1 if versions else 1)
+    version_path = os.path.join(path, version)
+    temp_path = os.path.join(path, '.' + version)
+    os.makedirs(temp_path)
+
+    with open(os.path.join(temp_path, MODEL_FILE), 'wb') as f_model:
+        pickle.dump(model, f_model, protocol=pickle.HIGHEST_PROTOCOL)
+
+    meta = {
+        'format_version': FORMAT_VERSION,
+        'version': version,
+        'created': datetime.utcnow().isoformat(),
+        'classes': model.classes,
+        'n_features': model.n_features,
+        'trained_records': model.trained_records,
+        'last_record_id': model.last_record_id,
+    }
+    with open(os.path.join(temp_path, META_FILE), 'w') as f_meta:
+        json.dump(meta, f_meta, indent=2)
+
+    os.rename(temp_path, version_path)
+    set_latest_version(version, path)
+    return version
+
+
+def set_latest_version(version, path=MODELS_PATH):
+    """
+    Mark version latest, e.g. to roll back to previous version.
+    Servers watching models directory switch to it
+
+    :param: version: str
+    :param: path: str: directory of model versions
+    """
+    if not os.path.exists(os.path.join(path, version, META_FILE)):
+        raise ValueError("Model version %s is not published" % version)
+
+    latest_path = os.path.join(path, LATEST_FILE)
+    with open(latest_path + '.tmp', 'w') as f_latest:
+        f_latest.write(version)
+    os.replace(latest_path + '.tmp', latest_path)
+
+
+def get_latest_version(path=MODELS_PATH):
+    """
+    :param: path: str: directory of model versions
+    :return: str: latest published version or None
+    """
+    try:
+        with open(os.path.join(path, LATEST_FILE), 'r') as f_latest:
+            return f_latest.read().strip() or None
+    except FileNotFoundError:
+        return None
+
+
+def read_meta(version, path=MODELS_PATH):
+    """
+    :return: dict: metadata of model version
+    """
+    with open(os.path.join(path, version, META_FILE), 'r') as f_meta:
+        return json.load(f_meta)
+
+
+def load_model(version=None, path=MODELS_PATH):
+    """
+    :param: version: str: version to load, latest by default
+    :param: path: str: directory of model versions
+    :return: OnlineModel: or None if no model is published
+    """
+    version = version or get_latest_version(path)
+    if version is None:
+        return None
+
+    with open(os.path.join(path, version, MODEL_FILE), 'rb') as f_model:
+        return pickle.load(f_model)
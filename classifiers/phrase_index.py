@@ -0,0 +1,105 @@
+from collections import deque
+
+
+class PhraseIndex:
+    """
+    Aho-Corasick automaton over word tokens.
+    Finds all indexed phrases in a token sequence in one pass,
+    phrases match only whole words
+    """
+
+    def __init__(self):
+        # node is index in these lists, 0 is root
+        self._transitions = [dict()]
+        self._fail = [0]
+        self._outputs = [[]]
+        self._built = True
+        self._size = 0
+
+    @classmethod
+    def from_phrases(cls, phrases):
+        """
+        Build index from (tokens, value) pairs
+
+        :param: phrases: iterable
+        :return: PhraseIndex
+        """
+        index = cls()
+        for tokens, value in phrases:
+            index.add(tokens, value)
+        index.build()
+        return index
+
+    def add(self, tokens, value):
+        """
+        Add phrase to index, phrases without tokens are ignored
+
+        :param: tokens: list: phrase tokens
+        :param: value: object: returned when phrase is found
+        """
+        if not tokens:
+            return
+
+        node = 0
+        for token in tokens:
+            next_node = self._transitions[node].get(token)
+            if next_node is None:
+                next_node = len(self._transitions)
+                self._transitions.append(dict())
+                self._fail.append(0)
+                self._outputs.append([])
+                self._transitions[node][token] = next_node
+            node = next_node
+
+        self._outputs[node].append(value)
+        self._size += 1
+        self._built = False
+
+    def build(self):
+        """
+        Compute failure links, must be called after phrases are added
+        """
+        queue = deque(self._transitions[0].values())
+        for node in queue:
+            self._fail[node] = 0
+
+        while queue:
+            node = queue.popleft()
+            for token, next_node in self._transitions[node].items():
+                fail = self._fail[node]
+                while fail and token not in self._transitions[fail]:
+                    fail = self._fail[fail]
+                fail = self._transitions[fail].get(token, 0)
+
+                self._fail[next_node] = fail
+                self._outputs[next_node] = \
+                    self._outputs[next_node] + self._outputs[fail]
+                queue.append(next_node)
+
+        self._built = True
+
+    def search(self, tokens):
+        """
+        Find indexed phrases in tokens
+
+        :param: tokens: list
+        :return: list: values of found phrases,
+                 in order of their first occurrence
+        """
+        if not self._built:
+            self.build()
+
+        found = dict()
+        node = 0
+        for token in tokens:
+            while node and token not in self._transitions[node]:
+                node = self._fail[node]
+            node = self._transitions[node].get(token, 0)
+
+            for value in self._outputs[node]:
+                found.setdefault(value, None)
+
+        return list(found)
+
+    def __len__(self):
+        return self._size
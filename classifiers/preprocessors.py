@@ -1,8 +1,65 @@
 import re
-import pymorphy2
+import threading
 
+from base.cache import LRUCache
 
-morph = pymorphy2.MorphAnalyzer()
+
+# morphological analyzer loads dictionaries for a while,
+# so it's created on first use or by load_morph
+morph = None
+_morph_lock = threading.Lock()
+
+CLEANING_REGEX = re.compile('[^а-яА-Яa-zA-Z]')
+
+# word -> normal form, chat vocabulary is small and repetitive
+LEMMA_CACHE_SIZE = 100000
+lemma_cache = LRUCache(max_size=LEMMA_CACHE_SIZE)
+
+
+def load_morph():
+    """
+    Get morphological analyzer, creating it if it's not loaded yet
+
+    :return: pymorphy2.MorphAnalyzer
+    """
+    global morph
+    if morph is None:
+        with _morph_lock:
+            if morph is None:
+                import pymorphy2
+                morph = pymorphy2.MorphAnalyzer()
+    return morph
+
+
+def tokenize(row_string):
+    """
+    Clears string from everything, except letters
+    used in russian or english languages, and splits it to words.
+    Words with len < 2 are missed
+
+    :param: row_string: str
+    :return: list
+    """
+    cleaned_string = CLEANING_REGEX.sub(' ', row_string)
+    return [word for word in cleaned_string.split() if len(word) > 1]
+
+
+def normalize_word(word):
+    """
+    Transforms word to normal form, using cache of already seen words
+
+    :param: word: str
+    :return: str
+    """
+    normal_form = lemma_cache.get(word)
+    if normal_form is None:
+        normal_form = load_morph().parse(word)[0].normal_form
+
+        if not normal_form:
+            normal_form = word
+        lemma_cache.set(word, normal_form)
+
+    return normal_form
 
 
 def normalizing_preprocessor(row_string):
@@ -11,21 +68,43 @@ def normalizing_preprocessor(row_string):
     used in russian or english languages.
     After that, transforms all words to normal form
     """
-    cleaned_string = re.sub('[^а-яА-Яa-zA-Z]', ' ', row_string)
-    words = cleaned_string.split(' ')
-    processed_words = []
+    processed_words = [normalize_word(word) for word in tokenize(row_string)]
+    processed_string = ' '.join(processed_words)
 
-    # transform word to normal form
-    for word in words:
-        word = word.strip()
-        # miss words with len < 2
-        if len(word) > 1:
-            normal_form = morph.parse(word)[0].normal_form
+    return processed_string
 
-            if not normal_form:
-                normal_form = word
-            processed_words.append(normal_form)
 
-    processed_string = ' '.join(processed_words)
+def identity_preprocessor(row_string):
+    """
+    Preprocessor for vectorizers fed with already normalized strings
+    """
+    return row_string
 
-    return processed_string
+
+def normalize_texts(texts):
+    """
+    Normalize list of strings
+
+    :param: texts: iterable
+    :return: list
+    """
+    return [normalizing_preprocessor(text) for text in texts]
+
+
+def warm_lemma_cache(texts):
+    """
+    Fill lemma cache with words from texts,
+    e.g. from training dataset
+
+    :param: texts: iterable
+    """
+    for text in texts:
+        for word in tokenize(text):
+            normalize_word(word)
+
+
+def lemma_cache_stats():
+    """
+    :return: dict: lemma cache statistics
+    """
+    return lemma_cache.stats()
@@ -0,0 +1,249 @@
+import hashlib
+import threading
+from collections import namedtuple
+
+from base.utils import log, WARNING, ERROR
+from base.exceptions import ModelRejectedException
+from base.metrics import registry as metrics_registry
+from .online import MODELS_PATH, get_latest_version, load_model
+
+
+# version of model loaded by fallback loader, when none is published
+BASELINE_VERSION = 'baseline'
+# share of dataset rows held out from training for validation
+HOLDOUT_FRACTION = 0.1
+
+PREDICTIONS = metrics_registry.counter(
+    'classifier_predictions_total', 'Texts classified by model version',
+    labels=('version',)
+)
+MODEL_SWAPS = metrics_registry.counter(
+    'classifier_model_swaps_total', 'Model versions loaded and rejected',
+    labels=('result',)
+)
+
+ActiveModel = namedtuple('ActiveModel', ['version', 'predict', 'accuracy'])
+
+
+def is_holdout(sentence, fraction=HOLDOUT_FRACTION):
+    """
+    Check if dataset row is held out from training to validate models on.
+    Rows are split by hash of sentence, so split doesn't depend on order
+    of rows and duplicates of sentence are on the same side
+
+    :param: sentence: str
+    :param: fraction: float: share of held out rows
+    :return: bool
+    """
+    digest = hashlib.md5(sentence.encode('utf-8')).digest()
+    return int.from_bytes(digest[:4], 'big') < fraction * 2 ** 32
+
+
+class ModelRegistry:
+    """
+    Holds active classifier and replaces it with new published versions
+    without restart: watcher loads new version in background, validates
+    it on holdout sample and swaps it in by one assignment, so requests
+    use either old or new model and never wait for loading
+    """
+
+    def __init__(self, path=MODELS_PATH, fallback=None, holdout=None,
+                 min_accuracy=0.0, max_accuracy_drop=0.05,
+                 loader=load_model):
+        """
+        :param: path: str: directory of model versions
+        :param: fallback: function() -> function(list) -> list: loads
+                predict function used when no version is published
+        :param: holdout: function() -> (list, list): loads normalized
+                texts and labels new versions are validated on
+        :param: min_accuracy: float: min holdout accuracy of new version
+        :param: max_accuracy_drop: float: max accuracy loss of new version
+                compared to active one
+        :param: loader: function(version, path) -> model with predict method
+        """
+        self.path = path
+        self.fallback = fallback
+        self.holdout = holdout
+        self.min_accuracy = min_accuracy
+        self.max_accuracy_drop = max_accuracy_drop
+        self.loader = loader
+
+        self.active = None
+        # previously active models, latest last
+        self.history = []
+        # versions failed validation or rolled back, they aren't loaded again
+        self.rejected = set()
+
+        self._holdout_data = None
+        self._lock = threading.Lock()
+        self._watch_timer = None
+
+    def get(self):
+        """
+        Get active model, loading latest version on first call
+
+        :return: ActiveModel
+        """
+        active = self.active
+        if active is None:
+            with self._lock:
+                if self.active is None:
+                    self.active = self._load_initial()
+                active = self.active
+        return active
+
+    def predict(self, normalized_texts, model=None):
+        """
+        :param: normalized_texts: list
+        :param: model: ActiveModel: model got earlier by `get`,
+                active one by default
+        :return: (str, list): version of model and predicted classes
+        """
+        active = model or self.get()
+        classes = active.predict(normalized_texts)
+        PREDICTIONS.inc(len(normalized_texts), version=active.version)
+        return active.version, classes
+
+    def check(self):
+        """
+        Load latest published version if it isn't active yet.
+        If latest version was active before, registry rolls back to it
+
+        :return: bool: True if other version is activated
+        """
+        version = get_latest_version(self.path)
+        active = self.active
+        # model that isn't loaded yet is loaded in latest version anyway
+        if active is None or version is None or \
+                version == active.version or version in self.rejected:
+            return False
+
+        if any(model.version == version for model in self.history):
+            self.rollback(version)
+            return True
+
+        try:
+            candidate = self._load_version(version)
+        except ModelRejectedException as exc:
+            self.rejected.add(version)
+            MODEL_SWAPS.inc(result='rejected')
+            log("Model %s is rejected: %s", version, exc, level=WARNING)
+            return False
+
+        with self._lock:
+            self.history.append(self.active)
+            self.active = candidate
+        MODEL_SWAPS.inc(result='activated')
+        log("Model %s is activated, holdout accuracy %s",
+            version, candidate.accuracy)
+        return True
+
+    def rollback(self, version=None):
+        """
+        Return to previously active model, versions active after it
+        aren't loaded by watcher again
+
+        :param: version: str: version to return to, previous by default
+        :return: str: version of active model after rollback
+        """
+        with self._lock:
+            versions = [model.version for model in self.history]
+            if not versions or (version is not None and
+                                version not in versions):
+                raise ValueError("There is no model to roll back to")
+
+            index = versions.index(version) if version is not None \
+                else len(versions) - 1
+            rolled_back = versions[index + 1:] + [self.active.version]
+            self.rejected.update(rolled_back)
+            log("Models %s are rolled back to %s", ', '.join(rolled_back),
+                versions[index], level=WARNING)
+
+            self.active = self.history[index]
+            del self.history[index:]
+            MODEL_SWAPS.inc(result='rolled_back')
+            return self.active.version
+
+    def start_watch(self, interval):
+        """
+        Check for new versions every `interval` seconds in background
+
+        :param: interval: float
+        """
+        self._watch_timer = threading.Timer(interval, self._watch,
+                                            args=(interval,))
+        self._watch_timer.daemon = True
+        self._watch_timer.start()
+
+    def stop_watch(self):
+        if self._watch_timer is not None:
+            self._watch_timer.cancel()
+            self._watch_timer = None
+
+    def _watch(self, interval):
+        try:
+            self.check()
+        except Exception as exc:
+            log(exc, level=ERROR)
+        self.start_watch(interval)
+
+    def _load_initial(self):
+        version = get_latest_version(self.path)
+        if version is not None:
+            try:
+                return self._load_version(version, validate=False)
+            except Exception as exc:
+                log("Model %s can't be loaded: %s", version, exc, level=ERROR)
+                self.rejected.add(version)
+
+        if self.fallback is None:
+            raise ValueError("No model is published in %s" % self.path)
+        return ActiveModel(BASELINE_VERSION, self.fallback(), None)
+
+    def _load_version(self, version, validate=True):
+        """
+        :return: ActiveModel
+        :raises: ModelRejectedException: if model can't be loaded
+                 or is less accurate than required
+        """
+        try:
+            model = self.loader(version, self.path)
+        except Exception as exc:
+            raise ModelRejectedException("loading failed: %s" % exc)
+
+        accuracy = self._accuracy(model.predict)
+        if validate and accuracy is not None:
+            if accuracy < self.min_accuracy:
+                raise ModelRejectedException(
+                    "accuracy {:.3f} < {:.3f}".format(accuracy,
+                                                       self.min_accuracy))
+
+            active_accuracy = self.active.accuracy if self.active else None
+            if active_accuracy is None and self.active is not None:
+                active_accuracy = self._accuracy(self.active.predict)
+            if active_accuracy is not None and \
+                    accuracy < active_accuracy - self.max_accuracy_drop:
+                raise ModelRejectedException(
+                    "accuracy {:.3f} < active model's {:.3f}".format(
+                        accuracy, active_accuracy))
+
+        return ActiveModel(version, model.predict, accuracy)
+
+    def _accuracy(self, predict):
+        """
+        :return: float: accuracy on holdout or None without holdout
+        """
+        if self.holdout is None:
+            return None
+        if self._holdout_data is None:
+            self._holdout_data = self.holdout()
+
+        texts, labels = self._holdout_data
+        if not labels:
+            return None
+        try:
+            predicted = predict(texts)
+        except Exception as exc:
+            raise ModelRejectedException("prediction failed: %s" % exc)
+        return sum(1 for expected, label in zip(predicted, labels)
+                   if expected == label) / len(labels)
@@ -0,0 +1,46 @@
+"""
+gunicorn settings, `gunicorn app:app -c gunicorn.conf.py`.
+App with classifier and dictionaries is loaded once in master and
+forked workers share its memory, connections and threads are created
+in each worker after fork
+"""
+import gc
+import os
+import time
+
+from base.utils import format_memory_usage, setup_logging
+
+
+STARTED = time.monotonic()
+
+bind = '0.0.0.0:' + os.environ.get('PORT', '8000')
+workers = int(os.environ.get('WEB_CONCURRENCY', 2))
+preload_app = True
+
+
+def when_ready(server):
+    # objects loaded in master are excluded from garbage collection,
+    # so collections in workers don't copy their pages
+    if hasattr(gc, 'freeze'):
+        gc.freeze()
+
+    server.log.info("Master started in %.2fs, %s",
+                    time.monotonic() - STARTED, format_memory_usage())
+
+
+def post_fork(server, worker):
+    import settings
+
+    # log listener thread of master isn't forked
+    setup_logging()
+    start = time.monotonic()
+    settings.get_server()
+    server.log.info("Worker %s started in %.2fs, %s", worker.pid,
+                    time.monotonic() - start, format_memory_usage())
+
+
+def worker_exit(server, worker):
+    import settings
+
+    # events acknowledged to facebook are handled before worker exits
+    settings.close()
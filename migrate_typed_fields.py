@@ -0,0 +1,126 @@
+import os
+
+from mongoengine import connect
+from mongoengine.connection import get_db
+from pymongo import UpdateOne
+
+from base.models import User, ExchangeRate, Weather
+
+
+BATCH_SIZE = 1000
+
+# model -> fields of unique index, previous versions could save
+# several documents with the same values
+UNIQUE_FIELDS = (
+    (User, ('user_id',)),
+    (ExchangeRate, ('currency_from', 'currency_to', 'date')),
+)
+
+# model -> fields that were strings before they became numbers
+TYPED_FIELDS = (
+    (ExchangeRate, ('rate',)),
+    (Weather, ('temp', 'wind_speed')),
+)
+
+
+def to_float(value):
+    """
+    :param: value: str: number saved as string, like '57,0020' or '20.6'
+    :return: float or None if value is not a number
+    """
+    try:
+        return float(value.replace(',', '.'))
+    except ValueError:
+        return None
+
+
+def get_collection(model):
+    """
+    Get collection without creating indexes of model,
+    unique ones can't be created before duplicates are removed
+
+    :param: model: mongoengine.Document subclass
+    :return: pymongo.collection.Collection
+    """
+    return get_db()[model._get_collection_name()]
+
+
+def remove_duplicates(model, fields):
+    """
+    Keep only newest document of ones with the same values of fields
+
+    :param: model: mongoengine.Document subclass
+    :param: fields: tuple
+    :return: int: number of removed documents
+    """
+    collection = get_collection(model)
+    duplicates = collection.aggregate([
+        {'$sort': {'_id': -1}},
+        {'$group': {'_id': {field: '$' + field for field in fields},
+                    'ids': {'$push': '$_id'}}},
+        {'$match': {'ids.1': {'$exists': True}}},
+    ], allowDiskUse=True)
+
+    removed = 0
+    for group in duplicates:
+        removed += collection.delete_many(
+            {'_id': {'$in': group['ids'][1:]}}
+        ).deleted_count
+    return removed
+
+
+def migrate(model, fields):
+    """
+    Convert string values of fields to floats, documents with string
+    values that are not numbers are removed. Missing fields are skipped
+
+    :param: model: mongoengine.Document subclass
+    :param: fields: tuple
+    :return: (int, int): numbers of converted and removed documents
+    """
+    collection = get_collection(model)
+    query = {'$or': [{field: {'$type': 'string'}} for field in fields]}
+    projection = {field: True for field in fields}
+
+    converted, removed = 0, 0
+    operations = []
+    for document in collection.find(query, projection):
+        values = {field: to_float(document[field]) for field in fields
+                  if isinstance(document.get(field), str)}
+
+        if None in values.values():
+            collection.delete_one({'_id': document['_id']})
+            removed += 1
+            continue
+
+        operations.append(UpdateOne({'_id': document['_id']},
+                                    {'$set': values}))
+        if len(operations) >= BATCH_SIZE:
+            converted += collection.bulk_write(operations).modified_count
+            operations = []
+
+    if operations:
+        converted += collection.bulk_write(operations).modified_count
+    return converted, removed
+
+
+def main():
+    """
+    Removing duplicates of users and exchange rates
+    and converting exchange rates and weather saved as strings to numbers.
+    Runs before the app, which creates unique indexes on start
+    """
+    connect(host=os.environ.get('MONGODB_URI'))
+
+    for model, fields in UNIQUE_FIELDS:
+        removed = remove_duplicates(model, fields)
+        print("{}: {} duplicates removed".format(model.__name__, removed))
+
+    for model, fields in TYPED_FIELDS:
+        converted, removed = migrate(model, fields)
+        print("{}: {} converted, {} removed".format(model.__name__,
+                                                    converted, removed))
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,79 @@
+import time
+import argparse
+
+import settings
+from base.utils import log
+from classifiers.online import (OnlineModel, MODELS_PATH, N_FEATURES,
+                                load_model, publish_model,
+                                set_latest_version, train_from_storage)
+from train_classifier import DATASET_PATH, CHUNK_SIZE, normalize_dataset
+
+
+BATCH_SIZE = 1000
+
+
+def bootstrap_model(dataset_path, n_features=N_FEATURES):
+    """
+    Create model trained on dataset, its classes are
+    all labels model can learn later
+
+    :param: dataset_path: str: csv file with sentence and category columns
+    :param: n_features: int: size of hashed feature space
+    :return: OnlineModel
+    """
+    normalized_data, labels = normalize_dataset(dataset_path)
+    model = OnlineModel(classes=labels, n_features=n_features)
+    for start in range(0, len(labels), CHUNK_SIZE):
+        model.partial_fit(normalized_data[start:start + CHUNK_SIZE],
+                          labels[start:start + CHUNK_SIZE])
+    return model
+
+
+def main():
+    """
+    Update latest published model with new labeled requests
+    and publish it as new version
+    """
+    parser = argparse.ArgumentParser(
+        description="Retrain classifier on labeled requests"
+    )
+    parser.add_argument('--models-path', default=MODELS_PATH)
+    parser.add_argument('--dataset', default=DATASET_PATH,
+                        help='dataset of first model')
+    parser.add_argument('--batch-size', type=int, default=BATCH_SIZE)
+    parser.add_argument('--interval', type=float, default=0,
+                        help='retrain every this number of seconds, '
+                             'once by default')
+    parser.add_argument('--activate', metavar='VERSION',
+                        help='only make published version latest, '
+                             'e.g. to roll back')
+    args = parser.parse_args()
+
+    if args.activate:
+        set_latest_version(args.activate, args.models_path)
+        log("Model %s is latest", args.activate)
+        return
+
+    storage = settings.create_storage_from_env()
+
+    model = load_model(path=args.models_path)
+    if model is None:
+        model = bootstrap_model(args.dataset)
+        version = publish_model(model, args.models_path)
+        log("Published model %s trained on dataset", version)
+
+    while True:
+        start = time.monotonic()
+        trained = train_from_storage(model, storage, args.batch_size)
+        if trained:
+            version = publish_model(model, args.models_path)
+            log("Published model %s trained on %s new requests in %.1fs",
+                version, trained, time.monotonic() - start)
+
+        if not args.interval:
+            break
+        time.sleep(args.interval)
+
+
+if __name__ == '__main__':
+    main()
@@ -1,40 +1,267 @@
 import os
+import csv
+import time
+import atexit
+import threading
 
-from flask import Flask
 from mongoengine import connect
 
+from base.storage import MongoStorage, create_storage
+from base.server import WebhookServer
+from base.sender import MessageSender
+from base.state import ConversationStateStore, WRITE_THROUGH
+from base.audit import AuditLog, DROP
+from base.dedup import EventDeduplicator, DEFAULT_TTL
+from base import handlers
+from base.weather import CITIES
+from base.utils import log, format_memory_usage
+from classifiers.preprocessors import warm_lemma_cache
 
-# setting app
-app = Flask(__name__)
 
+DATASET_PATH = './data/dataset.csv'
 
-# setting mongodb connection
-connect(host=os.environ.get('MONGODB_URI'))
+# objects that can't be shared by forked processes: connections,
+# threads and buffers, created once in each process
+_components = None
+_components_pid = None
+_server = None
+_async_server = None
+_lock = threading.RLock()
 
 
-# setting webhook server
-from base.server import WebhookServer
-from base.handlers import (
-    data_science_message_handler, usd_rub_rate_postback_handler,
-    euro_rub_rate_postback_handler, current_weather_message_handler,
-    choose_phrase_message_handler, usd_rub_exchange_rate_date_message_handler,
-    euro_rub_exchange_rate_date_message_handler
-)
-
-server = WebhookServer()
-
-# setting message handlers
-server.set_message_handler(data_science_message_handler, "DEFAULT_HANDLER",
-                           default=True)
-server.set_message_handler(choose_phrase_message_handler,
-                           "CHOOSE_PHRASE_HANDLER")
-server.set_message_handler(usd_rub_exchange_rate_date_message_handler,
-                           "USDRUB_MESSAGE_HANDLER")
-server.set_message_handler(euro_rub_exchange_rate_date_message_handler,
-                           "EURRUB_MESSAGE_HANDLER")
-
-
-# setting postback handlers
-server.set_postback_handler(usd_rub_rate_postback_handler, "USDRUB_PAYLOAD")
-server.set_postback_handler(euro_rub_rate_postback_handler, "EURRUB_PAYLOAD")
-server.set_postback_handler(current_weather_message_handler, "WEATHER_PAYLOAD")
+def preload():
+    """
+    Load classifier, glossary and dictionaries and warm lemma cache.
+    Opens no connections, so with gunicorn preload_app it runs once
+    in master and workers share loaded data. The only thread it starts
+    is log listener of base.utils, which isn't forked, so workers
+    start their own in post_fork
+    """
+    start = time.monotonic()
+    handlers.preload()
+
+    # warming lemma cache with training dataset vocabulary
+    if os.path.exists(DATASET_PATH):
+        with open(DATASET_PATH, 'r') as csvfile:
+            warm_lemma_cache(row['sentence']
+                             for row in csv.DictReader(csvfile))
+
+    log("Preloaded in {:.2f}s, {}".format(time.monotonic() - start,
+                                          format_memory_usage()))
+
+
+def set_handlers(server, handlers):
+    """
+    Set message and postback handlers of the bot
+
+    :param: server: WebhookServer
+    :param: handlers: module: module with handlers
+    """
+    # setting message handlers
+    server.set_message_handler(handlers.data_science_message_handler,
+                               "DEFAULT_HANDLER", default=True)
+    server.set_message_handler(handlers.choose_phrase_message_handler,
+                               "CHOOSE_PHRASE_HANDLER")
+    server.set_message_handler(
+        handlers.usd_rub_exchange_rate_date_message_handler,
+        "USDRUB_MESSAGE_HANDLER"
+    )
+    server.set_message_handler(
+        handlers.euro_rub_exchange_rate_date_message_handler,
+        "EURRUB_MESSAGE_HANDLER"
+    )
+
+    # setting postback handlers
+    server.set_postback_handler(handlers.usd_rub_rate_postback_handler,
+                                "USDRUB_PAYLOAD")
+    server.set_postback_handler(handlers.euro_rub_rate_postback_handler,
+                                "EURRUB_PAYLOAD")
+    server.set_postback_handler(handlers.current_weather_message_handler,
+                                "WEATHER_PAYLOAD")
+    server.set_postback_handler(handlers.spb_weather_postback_handler,
+                                "WEATHER_SPB_PAYLOAD")
+
+
+def create_storage_from_env():
+    """
+    Create storage from STORAGE_URL, like sqlite:///bot.db or memory://,
+    or MongoDB storage from MONGODB_URI
+
+    :return: base.storage.Storage
+    """
+    if os.environ.get('STORAGE_URL'):
+        return create_storage(os.environ.get('STORAGE_URL'))
+
+    # connection is opened on first query, so it's never
+    # shared by processes forked after this call
+    connect(host=os.environ.get('MONGODB_URI'), connect=False)
+    return MongoStorage()
+
+
+def create_components():
+    """
+    Create storage, sender, state store and audit log
+    and start background jobs of handlers
+
+    :return: dict: WebhookServer arguments
+    """
+    storage = create_storage_from_env()
+
+    sender = MessageSender(
+        pool_size=int(os.environ.get('GRAPH_POOL_SIZE', 10)),
+        concurrency=int(os.environ.get('GRAPH_CONCURRENCY', 4)),
+        batch_window=float(os.environ.get('GRAPH_BATCH_WINDOW', 0))
+    )
+
+    state_store = ConversationStateStore(
+        max_size=int(os.environ.get('STATE_CACHE_SIZE', 10000)),
+        ttl=float(os.environ.get('STATE_CACHE_TTL', 300)),
+        mode=os.environ.get('STATE_WRITE_MODE', WRITE_THROUGH),
+        storage=storage
+    )
+
+    audit_log = AuditLog(
+        max_buffer_size=int(os.environ.get('AUDIT_BUFFER_SIZE', 10000)),
+        batch_size=int(os.environ.get('AUDIT_BATCH_SIZE', 500)),
+        flush_interval=float(os.environ.get('AUDIT_FLUSH_INTERVAL', 1)),
+        policy=os.environ.get('AUDIT_POLICY', DROP),
+        storage=storage
+    )
+
+    # EVENT_DEDUP_TTL > 0 skips events redelivered by facebook,
+    # with EVENT_DEDUP_SHARED=1 also ones handled by other processes
+    deduplicator = None
+    if float(os.environ.get('EVENT_DEDUP_TTL', DEFAULT_TTL)) > 0:
+        deduplicator = EventDeduplicator(
+            ttl=float(os.environ.get('EVENT_DEDUP_TTL', DEFAULT_TTL)),
+            max_size=int(os.environ.get('EVENT_DEDUP_SIZE', 100000)),
+            storage=storage if os.environ.get('EVENT_DEDUP_SHARED') == '1'
+            else None
+        )
+
+    handlers.set_storage(storage)
+
+    # refreshing weather in background every WEATHER_REFRESH_INTERVAL seconds
+    if float(os.environ.get('WEATHER_REFRESH_INTERVAL', 0)) > 0:
+        handlers.weather_service.start_refresh(
+            list(CITIES), float(os.environ.get('WEATHER_REFRESH_INTERVAL'))
+        )
+
+    # checking for new published classifier versions
+    # every MODEL_WATCH_INTERVAL seconds
+    if float(os.environ.get('MODEL_WATCH_INTERVAL', 60)) > 0:
+        handlers.model_registry.start_watch(
+            float(os.environ.get('MODEL_WATCH_INTERVAL', 60))
+        )
+
+    # RESPONSE_CACHE_SIZE > 0 answers repeated messages from cache
+    if int(os.environ.get('RESPONSE_CACHE_SIZE', 10000)) > 0:
+        handlers.enable_response_cache(
+            max_size=int(os.environ.get('RESPONSE_CACHE_SIZE', 10000))
+        )
+
+    # INFERENCE_BATCH_SIZE > 0 classifies concurrently handled messages
+    # in batches, makes sense with WEBHOOK_WORKERS > 1
+    if int(os.environ.get('INFERENCE_BATCH_SIZE', 0)) > 0:
+        handlers.enable_batch_inference(
+            max_batch_size=int(os.environ.get('INFERENCE_BATCH_SIZE')),
+            max_latency=float(os.environ.get('INFERENCE_MAX_LATENCY', 0.005))
+        )
+
+    # loading today's exchange rates in background every
+    # EXCHANGE_RATES_PREFETCH_INTERVAL seconds
+    if float(os.environ.get('EXCHANGE_RATES_PREFETCH_INTERVAL', 0)) > 0:
+        handlers.exchange_rate_service.start_prefetch(
+            float(os.environ.get('EXCHANGE_RATES_PREFETCH_INTERVAL'))
+        )
+
+    return {'storage': storage, 'sender': sender, 'state_store': state_store,
+            'audit_log': audit_log, 'deduplicator': deduplicator}
+
+
+def get_components():
+    """
+    Get components of current process, creating them on first call
+    in process, e.g. after fork
+
+    :return: dict: WebhookServer arguments
+    """
+    global _components, _components_pid, _server, _async_server
+    with _lock:
+        if _components is None or _components_pid != os.getpid():
+            _components = create_components()
+            _components_pid = os.getpid()
+            _server = None
+            _async_server = None
+        return _components
+
+
+@atexit.register
+def close():
+    """
+    Close server of current process: handle events left in worker queues,
+    send queued messages and write buffered requests and state updates.
+    Runs at exit and in gunicorn worker_exit hook
+    """
+    global _components, _server, _async_server
+    with _lock:
+        # forked process doesn't own components of parent
+        if _components is None or _components_pid != os.getpid():
+            return
+
+        server = _server or _async_server
+        if server is not None:
+            server.close()
+        _components = None
+        _server = None
+        _async_server = None
+
+
+def get_batch_concurrency():
+    """
+    :return: int: number of senders of one webhook request
+             handled in parallel
+    """
+    return int(os.environ.get('WEBHOOK_BATCH_CONCURRENCY', 4))
+
+
+def get_server():
+    """
+    Get webhook server of current process
+
+    :return: WebhookServer
+    """
+    global _server
+    with _lock:
+        components = get_components()
+        if _server is None:
+            # WEBHOOK_WORKERS > 0 acknowledges webhooks immediately
+            # and handles events in background worker threads
+            _server = WebhookServer(
+                workers=int(os.environ.get('WEBHOOK_WORKERS', 0)),
+                queue_size=int(os.environ.get('WEBHOOK_QUEUE_SIZE', 0)),
+                batch_concurrency=get_batch_concurrency(),
+                **components
+            )
+            set_handlers(_server, handlers)
+        return _server
+
+
+def get_async_server():
+    """
+    Get webhook server for asgi app of current process
+
+    :return: base.async_server.AsyncWebhookServer
+    """
+    from base.async_server import AsyncWebhookServer
+    from base import async_handlers
+
+    global _async_server
+    with _lock:
+        components = get_components()
+        if _async_server is None:
+            _async_server = AsyncWebhookServer(
+                batch_concurrency=get_batch_concurrency(), **components
+            )
+            set_handlers(_async_server, async_handlers)
+        return _async_server
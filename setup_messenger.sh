@@ -47,8 +47,19 @@ curl -X POST -H "Content-Type: application/json" -d '{
         },
         {
           "title":"Weather",
-          "type":"postback",
-          "payload":"WEATHER_PAYLOAD"
+          "type":"nested",
+          "call_to_actions":[
+            {
+              "title":"Moscow",
+              "type":"postback",
+              "payload":"WEATHER_PAYLOAD"
+            },
+            {
+              "title":"Saint Petersburg",
+              "type":"postback",
+              "payload":"WEATHER_SPB_PAYLOAD"
+            }
+          ]
         },
       ]
     },
@@ -74,8 +85,19 @@ curl -X POST -H "Content-Type: application/json" -d '{
         },
         {
           "title":"Погода",
-          "type":"postback",
-          "payload":"WEATHER_PAYLOAD"
+          "type":"nested",
+          "call_to_actions":[
+            {
+              "title":"Москва",
+              "type":"postback",
+              "payload":"WEATHER_PAYLOAD"
+            },
+            {
+              "title":"Санкт-Петербург",
+              "type":"postback",
+              "payload":"WEATHER_SPB_PAYLOAD"
+            }
+          ]
         },
       ]
     }
@@ -0,0 +1,64 @@
+import os
+import asyncio
+import unittest
+
+from mongoengine import connect
+
+from base.async_server import AsyncWebhookServer
+from base.models import User, RequestResponse
+
+
+class AsyncWebhookServerTestCase(unittest.TestCase):
+
+    def setUp(self):
+        self.db = connect(host=os.environ.get('MONGODB_TEST_HOST') + \
+                          os.environ.get('MONGODB_TEST_NAME'))
+        self.loop = asyncio.new_event_loop()
+        asyncio.set_event_loop(self.loop)
+        self.sent_messages = []
+
+        self.server = AsyncWebhookServer()
+        self.server.send_message = self.send_message
+        self.server.set_message_handler(self.message_handler, "handler",
+                                        default=True)
+        self.server.set_message_handler(self.async_message_handler,
+                                        "async_handler")
+
+    def tearDown(self):
+        self.loop.close()
+        self.db.drop_database(os.environ.get('MONGODB_TEST_NAME'))
+
+    async def send_message(self, recipient_id, message_text):
+        self.sent_messages.append((recipient_id, message_text))
+
+    def message_handler(self, request):
+        return "received", "async_handler"
+
+    async def async_message_handler(self, request):
+        await asyncio.sleep(0)
+        return "received async", None
+
+    def test_handle_message(self):
+        sender_id = 1
+
+        # plain handler
+        self.loop.run_until_complete(
+            self.server.handle_message({'text': 'test'}, sender_id)
+        )
+        self.assertEqual(
+            User.objects(user_id=str(sender_id)).first().next_handler,
+            "async_handler"
+        )
+
+        # coroutine handler
+        self.loop.run_until_complete(
+            self.server.handle_message({'text': 'test'}, sender_id)
+        )
+        self.assertEqual(
+            User.objects(user_id=str(sender_id)).first().next_handler,
+            "handler"
+        )
+        self.assertEqual(RequestResponse.objects.count(), 2)
+        self.assertEqual(self.sent_messages,
+                         [(sender_id, "received"),
+                          (sender_id, "received async")])
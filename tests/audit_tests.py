@@ -0,0 +1,40 @@
+import os
+import unittest
+
+from mongoengine import connect
+
+from base.audit import AuditLog, DROP
+from base.models import RequestResponse
+
+
+class AuditLogTestCase(unittest.TestCase):
+
+    def setUp(self):
+        self.db = connect(host=os.environ.get('MONGODB_TEST_HOST') + \
+                          os.environ.get('MONGODB_TEST_NAME'))
+
+    def tearDown(self):
+        self.db.drop_database(os.environ.get('MONGODB_TEST_NAME'))
+
+    def append_records(self, audit_log, count):
+        for i in range(count):
+            audit_log.append(user_id=str(i), request_type='message',
+                             request_message='test', response_text='test')
+
+    def test_flush_on_close(self):
+        audit_log = AuditLog(batch_size=2, flush_interval=60)
+        self.append_records(audit_log, 5)
+        audit_log.close()
+
+        self.assertEqual(RequestResponse.objects.count(), 5)
+        self.assertEqual(audit_log.stats()['written'], 5)
+        self.assertEqual(audit_log.stats()['buffered'], 0)
+
+    def test_drop_policy(self):
+        audit_log = AuditLog(max_buffer_size=3, batch_size=10,
+                             flush_interval=60, policy=DROP)
+        self.append_records(audit_log, 5)
+        self.assertEqual(audit_log.stats()['dropped'], 2)
+
+        audit_log.close()
+        self.assertEqual(RequestResponse.objects.count(), 3)
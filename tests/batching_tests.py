@@ -0,0 +1,47 @@
+import threading
+import unittest
+
+from classifiers.batching import BatchPredictor
+
+
+class BatchPredictorTestCase(unittest.TestCase):
+
+    def setUp(self):
+        self.batches = []
+        self.predictor = BatchPredictor(self.predict, max_batch_size=4,
+                                        max_latency=0.05)
+
+    def tearDown(self):
+        self.predictor.close()
+
+    def predict(self, items):
+        self.batches.append(items)
+        return [item * 2 for item in items]
+
+    def test_concurrent_items_are_batched(self):
+        results = dict()
+
+        def worker(item):
+            results[item] = self.predictor.predict(item)
+
+        threads = [threading.Thread(target=worker, args=(item,))
+                   for item in range(8)]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+
+        self.assertEqual(results, {item: item * 2 for item in range(8)})
+        self.assertTrue(all(len(batch) <= 4 for batch in self.batches))
+        self.assertLess(len(self.batches), 8)
+        self.assertEqual(self.predictor.stats()['items'], 8)
+
+    def test_single_item_waits_at_most_max_latency(self):
+        self.assertEqual(self.predictor.predict(1), 2)
+        self.assertEqual(self.batches, [[1]])
+        self.assertLess(self.predictor.stats()['latency_p50'], 1)
+
+    def test_exception_is_passed_to_caller(self):
+        predictor = BatchPredictor(lambda items: 1 / 0)
+        self.assertRaises(ZeroDivisionError, predictor.predict, 1)
+        predictor.close()
@@ -0,0 +1,81 @@
+import time
+import threading
+import unittest
+
+from base.cache import LRUCache, SingleFlight
+
+
+class LRUCacheTestCase(unittest.TestCase):
+
+    def test_get_set(self):
+        cache = LRUCache(max_size=2)
+        self.assertIsNone(cache.get('a'))
+
+        cache.set('a', 1)
+        self.assertEqual(cache.get('a'), 1)
+        self.assertIn('a', cache)
+        self.assertEqual(cache.stats()['hits'], 1)
+        self.assertEqual(cache.stats()['misses'], 1)
+        self.assertEqual(cache.stats()['hit_rate'], 0.5)
+
+    def test_eviction(self):
+        cache = LRUCache(max_size=2)
+        cache.set('a', 1)
+        cache.set('b', 2)
+
+        # 'a' becomes most recently used, so 'b' is evicted
+        cache.get('a')
+        cache.set('c', 3)
+        self.assertEqual(len(cache), 2)
+        self.assertNotIn('b', cache)
+        self.assertEqual(cache.get('a'), 1)
+        self.assertEqual(cache.stats()['evictions'], 1)
+
+    def test_ttl(self):
+        cache = LRUCache(ttl=0.01)
+        cache.set('a', 1)
+        self.assertEqual(cache.get('a'), 1)
+
+        time.sleep(0.02)
+        self.assertEqual(cache.get('a', 'expired'), 'expired')
+        self.assertEqual(len(cache), 0)
+
+
+class SingleFlightTestCase(unittest.TestCase):
+
+    def test_concurrent_calls_share_result(self):
+        singleflight = SingleFlight()
+        calls = []
+        started = threading.Event()
+        release = threading.Event()
+        results = []
+
+        def load(key):
+            calls.append(key)
+            started.set()
+            release.wait()
+            return key * 2
+
+        def worker():
+            results.append(singleflight.do(1, load, 1))
+
+        leader = threading.Thread(target=worker)
+        leader.start()
+        started.wait()
+        followers = [threading.Thread(target=worker) for _ in range(3)]
+        for thread in followers:
+            thread.start()
+        time.sleep(0.05)
+        release.set()
+        for thread in [leader] + followers:
+            thread.join()
+
+        self.assertEqual(calls, [1])
+        self.assertEqual(results, [2] * 4)
+        self.assertFalse(singleflight.in_flight(1))
+
+    def test_exception_is_raised_for_all_callers(self):
+        singleflight = SingleFlight()
+        self.assertRaises(ZeroDivisionError, singleflight.do, 1,
+                          lambda: 1 / 0)
+        self.assertEqual(singleflight.do(1, lambda: 'ok'), 'ok')
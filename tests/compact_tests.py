@@ -0,0 +1,56 @@
+import random
+import shutil
+import tempfile
+import unittest
+
+from sklearn.ensemble import RandomForestClassifier
+from sklearn.feature_extraction.text import CountVectorizer
+
+from classifiers.compact import CompactForestModel, export_compact_model
+from classifiers.preprocessors import identity_preprocessor
+
+
+class CompactForestModelTestCase(unittest.TestCase):
+
+    def setUp(self):
+        self.path = tempfile.mkdtemp()
+
+        rnd = random.Random(0)
+        words = ['данные', 'анализ', 'модель', 'погода', 'курс', 'доллар',
+                 'регрессия', 'кластер', 'дождь', 'ветер', 'обучение']
+        self.texts = [' '.join(rnd.choice(words)
+                               for _ in range(rnd.randint(1, 8)))
+                      for _ in range(200)]
+        labels = ['1' if set(text.split()) & set(words[:3] + words[6:8])
+                  else '0' for text in self.texts]
+
+        self.vectorizer = CountVectorizer(analyzer='word',
+                                          preprocessor=identity_preprocessor,
+                                          max_df=0.8)
+        features = self.vectorizer.fit_transform(self.texts)
+        self.forest = RandomForestClassifier(n_estimators=10, random_state=0)
+        self.forest.fit(features.toarray(), labels)
+
+        export_compact_model(self.vectorizer, self.forest, self.path)
+
+    def tearDown(self):
+        shutil.rmtree(self.path)
+
+    def test_predictions_are_identical(self):
+        model = CompactForestModel(self.path)
+        texts = self.texts + ['', 'незнакомое слово', 'данные данные курс']
+
+        expected_features = self.vectorizer.transform(texts).toarray()
+        self.assertEqual(model.predict(texts),
+                         list(self.forest.predict(expected_features)))
+
+        proba = self.forest.predict_proba(expected_features)
+        for text, expected in zip(texts, proba):
+            self.assertEqual(list(model.predict_proba_one(text)),
+                             list(expected))
+
+    def test_lookup(self):
+        model = CompactForestModel(self.path, mmap_mode=None)
+        for term, column in self.vectorizer.vocabulary_.items():
+            self.assertEqual(model.lookup(term), column)
+        self.assertIsNone(model.lookup('незнакомое'))
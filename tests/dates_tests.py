@@ -0,0 +1,100 @@
+import unittest
+from datetime import date
+
+from unittest.mock import patch
+
+from base.dates import DateResolver, parse_period
+
+
+class ParsePeriodTestCase(unittest.TestCase):
+
+    def setUp(self):
+        self.today = date(2017, 7, 15)
+
+    def test_last_days(self):
+        self.assertEqual(parse_period('за неделю', self.today),
+                         (date(2017, 7, 9), self.today))
+        self.assertEqual(parse_period('курс за 3 дня', self.today),
+                         (date(2017, 7, 13), self.today))
+        self.assertEqual(parse_period('За последний месяц', self.today),
+                         (date(2017, 6, 16), self.today))
+
+    def test_long_period_is_cut(self):
+        period = (date(1967, 7, 29), self.today)
+        self.assertEqual(parse_period('за 10000 лет', self.today), period)
+        self.assertEqual(parse_period('за 99999999 дней', self.today),
+                         period)
+
+    def test_month(self):
+        self.assertEqual(parse_period('за март', self.today),
+                         (date(2017, 3, 1), date(2017, 3, 31)))
+        self.assertEqual(parse_period('в мае 2016', self.today),
+                         (date(2016, 5, 1), date(2016, 5, 31)))
+
+        # current month ends today
+        self.assertEqual(parse_period('за июль', self.today),
+                         (date(2017, 7, 1), self.today))
+
+        # month that has not come yet is of last year
+        self.assertEqual(parse_period('за декабрь', self.today),
+                         (date(2016, 12, 1), date(2016, 12, 31)))
+
+    def test_no_period(self):
+        self.assertIsNone(parse_period('сегодня', self.today))
+        self.assertIsNone(parse_period('01.07.2017', self.today))
+        self.assertIsNone(parse_period('за день', self.today))
+        self.assertIsNone(parse_period(None, self.today))
+
+
+class DateResolverTestCase(unittest.TestCase):
+
+    def setUp(self):
+        self.resolver = DateResolver()
+        self.today = date(2017, 7, 15)
+
+    def test_fast_path(self):
+        cases = [
+            ('сегодня', self.today),
+            ('Курс на вчера', date(2017, 7, 14)),
+            ('позавчера', date(2017, 7, 13)),
+            ('3 дня назад', date(2017, 7, 12)),
+            ('01.07.2017', date(2017, 7, 1)),
+            ('курс на 01.07.2017.', date(2017, 7, 1)),
+            ('2016-07-01', date(2016, 7, 1)),
+            ('на 2016-7-1?', date(2016, 7, 1)),
+            ('1.7.17', date(2017, 7, 1)),
+            ('5/3', date(2017, 3, 5)),
+            ('1 июля 2016', date(2016, 7, 1)),
+            ('15 марта', date(2017, 3, 15)),
+        ]
+        with patch('base.dates.dateparser') as dateparser_mock:
+            for text, expected in cases:
+                self.assertEqual(self.resolver.resolve(text, self.today),
+                                 expected)
+            self.assertFalse(dateparser_mock.parse.called)
+
+    def test_cache(self):
+        self.resolver.resolve('вчера', self.today)
+        self.assertEqual(self.resolver.stats()['misses'], 1)
+
+        # offset is cached, so result depends on today
+        self.assertEqual(self.resolver.resolve('вчера', date(2017, 8, 1)),
+                         date(2017, 7, 31))
+        self.assertEqual(self.resolver.stats()['hits'], 1)
+        self.assertEqual(self.resolver.stats()['fast_path_hits'], 1)
+
+    def test_dateparser_fallback(self):
+        with patch('base.dates.dateparser') as dateparser_mock:
+            dateparser_mock.parse.return_value = None
+            self.assertIsNone(self.resolver.resolve('test', self.today))
+            self.assertIsNone(self.resolver.resolve('Test ', self.today))
+            self.assertEqual(dateparser_mock.parse.call_count, 1)
+
+            # dateparser result is recomputed on next day
+            self.resolver.resolve('test', date(2017, 7, 16))
+            self.assertEqual(dateparser_mock.parse.call_count, 2)
+
+            # offset too large for date
+            self.assertIsNone(self.resolver.resolve('999999999 дней назад',
+                                                    self.today))
+            self.assertEqual(dateparser_mock.parse.call_count, 3)
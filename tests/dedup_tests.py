@@ -0,0 +1,87 @@
+import unittest
+from unittest.mock import patch, Mock
+
+from base.dedup import EventDeduplicator, get_event_key, DUPLICATE_EVENTS
+from base.server import WebhookServer
+from base.storage import MemoryStorage
+
+
+def message_event(mid, sender_id='1', text='test'):
+    return {'sender': {'id': sender_id}, 'timestamp': 1500000000000,
+            'message': {'mid': mid, 'text': text}}
+
+
+def postback_event(timestamp, payload='PAYLOAD'):
+    return {'sender': {'id': '1'}, 'timestamp': timestamp,
+            'postback': {'payload': payload}}
+
+
+class EventDeduplicatorTestCase(unittest.TestCase):
+
+    def test_event_key(self):
+        self.assertEqual(get_event_key(message_event('mid.1')), 'mid:mid.1')
+        self.assertEqual(get_event_key(postback_event(10)),
+                         'event:1:10:PAYLOAD')
+        self.assertIsNone(get_event_key({'sender': {'id': '1'}}))
+
+    def test_repeated_events_are_duplicates(self):
+        deduplicator = EventDeduplicator()
+        duplicates = DUPLICATE_EVENTS.get()
+
+        self.assertFalse(deduplicator.is_duplicate(message_event('mid.1')))
+        self.assertTrue(deduplicator.is_duplicate(message_event('mid.1')))
+        self.assertFalse(deduplicator.is_duplicate(postback_event(10)))
+        self.assertTrue(deduplicator.is_duplicate(postback_event(10)))
+        self.assertFalse(deduplicator.is_duplicate(postback_event(11)))
+        # events without keys are never skipped
+        self.assertFalse(deduplicator.is_duplicate({}))
+        self.assertFalse(deduplicator.is_duplicate({}))
+
+        self.assertEqual(DUPLICATE_EVENTS.get(), duplicates + 2)
+
+    def test_shared_store(self):
+        storage = MemoryStorage()
+        first = EventDeduplicator(storage=storage)
+        second = EventDeduplicator(storage=storage)
+
+        self.assertFalse(first.is_duplicate(message_event('mid.1')))
+        self.assertTrue(second.is_duplicate(message_event('mid.1')))
+
+    def test_failing_shared_store(self):
+        storage = Mock()
+        storage.mark_event_seen.side_effect = ConnectionError
+        deduplicator = EventDeduplicator(storage=storage)
+
+        self.assertFalse(deduplicator.is_duplicate(message_event('mid.1')))
+        self.assertTrue(deduplicator.is_duplicate(message_event('mid.1')))
+
+
+class ServerDeduplicationTestCase(unittest.TestCase):
+
+    def setUp(self):
+        self.storage = MemoryStorage()
+        self.handler = Mock(return_value=('response', None))
+        self.server = WebhookServer(storage=self.storage,
+                                    deduplicator=EventDeduplicator())
+        self.server.set_message_handler(self.handler, 'DEDUP',
+                                        default=True)
+
+    def request(self, *events):
+        request = Mock()
+        request.get_json.return_value = {
+            'object': 'page', 'entry': [{'messaging': list(events)}]
+        }
+        return request
+
+    def test_redelivered_events_are_skipped(self):
+        with patch.object(self.server.sender, 'send') as send:
+            self.server.handle_request(self.request(message_event('mid.1'),
+                                                    message_event('mid.2')))
+            # redelivered batch with one new event
+            self.server.handle_request(self.request(message_event('mid.1'),
+                                                    message_event('mid.2'),
+                                                    message_event('mid.3')))
+
+        self.assertEqual(self.handler.call_count, 3)
+        self.assertEqual(send.call_count, 3)
+        self.assertEqual(len(self.storage.request_responses), 3)
@@ -1,7 +1,8 @@
 import os
 import json
+import time
 import unittest
-from datetime import datetime
+from datetime import datetime, timedelta
 from unittest.mock import patch, Mock
 
 import responses
@@ -10,8 +11,11 @@ from mongoengine import connect
 from base.server import WebhookServer, MESSAGES_POST_LINK
 from base.handlers import (usd_rub_rate_postback_handler, EXCHANGE_RATES_URL,
                            usd_rub_exchange_rate_date_message_handler,
+                           euro_rub_exchange_rate_date_message_handler,
+                           exchange_rate_service, weather_service,
                            current_weather_message_handler, WEATHER_URL,
                            UPDATE_WEATHER_TIME_GAP)
+from base.exchange_rates import EXCHANGE_RATES_DYNAMIC_URL
 from base.models import ExchangeRate, Weather
 from .test_utils import set_env_variable
 
@@ -24,6 +28,8 @@ class HandlersTestCase(unittest.TestCase):
         self.server = WebhookServer()
         self.server.set_message_handler(self.message_handler, "handler",
                                         default=True)
+        exchange_rate_service.cache.clear()
+        weather_service.clear()
 
     def tearDown(self):
         self.db.drop_database(os.environ.get('MONGODB_TEST_NAME'))
@@ -58,13 +64,78 @@ class HandlersTestCase(unittest.TestCase):
             self.server.handle_message({'text': 'test'}, 1)
             self.assertEqual(ExchangeRate.objects.count(), 1)
             self.assertEqual(ExchangeRate.objects(date=today).first().rate,
-                             '100500,000')
+                             100500.0)
 
             # today's rate in db
             rsps.add(responses.POST, MESSAGES_POST_LINK, status=200)
             self.server.handle_message({'text': 'сегодня'}, 1)
             self.assertEqual(ExchangeRate.objects.count(), 1)
 
+    def test_exchange_rates_document_is_saved_whole(self):
+        today = datetime.now().date()
+        body = '<ValCurs>' \
+               '<Valute><CharCode>USD</CharCode><Value>60,1</Value></Valute>' \
+               '<Valute><CharCode>EUR</CharCode><Value>70,2</Value></Valute>' \
+               '</ValCurs>'
+
+        with responses.RequestsMock() as rsps:
+            rsps.add(responses.GET, EXCHANGE_RATES_URL, body=body)
+            message, _ = usd_rub_exchange_rate_date_message_handler(
+                {'text': 'сегодня'}
+            )
+            self.assertIn('60.1000RUB', message)
+            self.assertEqual(ExchangeRate.objects.count(), 2)
+
+            # EUR rate is known without loading document again
+            message, _ = euro_rub_exchange_rate_date_message_handler(
+                {'text': 'сегодня'}
+            )
+            self.assertIn('70.2000RUB', message)
+            self.assertEqual(len(rsps.calls), 1)
+
+        # rates are read from DB when not in memory
+        exchange_rate_service.cache.clear()
+        weather_service.clear()
+        self.assertEqual(
+            exchange_rate_service.get_known_rate('EUR', 'RUB', today), 70.2
+        )
+
+    def test_unknown_exchange_rate(self):
+        body = '<ValCurs>' \
+               '<Valute><CharCode>EUR</CharCode><Value>70,2</Value></Valute>' \
+               '</ValCurs>'
+
+        with responses.RequestsMock() as rsps:
+            rsps.add(responses.GET, EXCHANGE_RATES_URL, body=body)
+            message, _ = usd_rub_exchange_rate_date_message_handler(
+                {'text': 'сегодня'}
+            )
+            self.assertIn('Нет данных о курсе USD к RUB', message)
+
+    def test_exchange_rate_for_period(self):
+        today = datetime.now().date()
+        body = '<ValCurs ID="R01235">' +\
+               '<Record Date="{}"><Value>60,0</Value></Record>' +\
+               '<Record Date="{}"><Value>62,0</Value></Record>' +\
+               '</ValCurs>'
+        body = body.format((today - timedelta(days=2)).strftime('%d.%m.%Y'),
+                           today.strftime('%d.%m.%Y'))
+
+        with responses.RequestsMock() as rsps:
+            # db is empty, rates dynamic is loaded
+            rsps.add(responses.GET, EXCHANGE_RATES_DYNAMIC_URL, body=body)
+            message, _ = usd_rub_exchange_rate_date_message_handler(
+                {'text': 'за неделю'}
+            )
+            self.assertIn('минимальный 60.0000RUB', message)
+            self.assertIn('максимальный 62.0000RUB', message)
+            self.assertIn('средний 61.0000RUB', message)
+            self.assertEqual(ExchangeRate.objects.count(), 2)
+
+            # rates are in db
+            usd_rub_exchange_rate_date_message_handler({'text': 'за неделю'})
+            self.assertEqual(len(rsps.calls), 1)
+
     @set_env_variable('PAGE_ACCESS_TOKEN', 'test')
     def test_current_weather_message_handler(self):
         now = datetime.now()
@@ -80,10 +151,32 @@ class HandlersTestCase(unittest.TestCase):
             rsps.add(responses.POST, MESSAGES_POST_LINK, status=200)
             self.server.handle_postback({'payload': handler_code}, 1)
             self.assertEqual(Weather.objects.count(), 1)
-            self.assertEqual(Weather.objects().first().temp, '20.6')
-            self.assertEqual(Weather.objects().first().wind_speed, '6')
+            self.assertEqual(Weather.objects().first().temp, 20.6)
+            self.assertEqual(Weather.objects().first().wind_speed, 6.0)
 
             # recent weather data in db
             rsps.add(responses.POST, MESSAGES_POST_LINK, status=200)
             self.server.handle_postback({'payload': handler_code}, 1)
             self.assertEqual(Weather.objects.count(), 1)
+
+    def test_stale_weather_is_refreshed_in_background(self):
+        stale_time = datetime.now() - \
+            timedelta(minutes=UPDATE_WEATHER_TIME_GAP + 1)
+        Weather(city='Moscow', temp=10.0, wind_speed=1.0,
+                time=stale_time).save()
+
+        with responses.RequestsMock() as rsps:
+            body = {'main': {'temp': 20.6}, 'wind': {'speed': 6}}
+            rsps.add(responses.GET, WEATHER_URL, body=json.dumps(body))
+
+            # stale weather is returned without waiting
+            message, _ = current_weather_message_handler({})
+            self.assertIn('Температура 10C', message)
+
+            deadline = time.time() + 5
+            while Weather.objects.count() < 2 and time.time() < deadline:
+                time.sleep(0.01)
+            self.assertEqual(Weather.objects.count(), 2)
+
+        message, _ = current_weather_message_handler({})
+        self.assertIn('Температура 20.6C', message)
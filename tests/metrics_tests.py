@@ -0,0 +1,113 @@
+import io
+import unittest
+from unittest.mock import patch, Mock
+
+from base.metrics import Registry
+from base.server import WebhookServer, STAGE_SECONDS, HANDLER_SECONDS, EVENTS
+from base.storage import MemoryStorage
+from base.utils import (log, setup_logging, stop_logging, DEBUG, INFO,
+                        WARNING)
+
+
+class MetricsTestCase(unittest.TestCase):
+
+    def setUp(self):
+        self.registry = Registry()
+
+    def test_counter(self):
+        counter = self.registry.counter('events_total', 'Events',
+                                        labels=('type',))
+        counter.inc(type='message')
+        counter.inc(2, type='message')
+        counter.inc(type='post"back')
+
+        self.assertEqual(counter.get(type='message'), 3)
+        self.assertIs(self.registry.counter('events_total', 'Events',
+                                            labels=('type',)), counter)
+        self.assertEqual(self.registry.render(), '\n'.join([
+            '# HELP events_total Events',
+            '# TYPE events_total counter',
+            'events_total{type="message"} 3.0',
+            'events_total{type="post\\"back"} 1.0',
+        ]) + '\n')
+
+        with self.assertRaises(ValueError):
+            counter.inc(other='label')
+        with self.assertRaises(ValueError):
+            self.registry.histogram('events_total', 'Events')
+
+    def test_histogram(self):
+        histogram = self.registry.histogram('latency_seconds', 'Latency',
+                                            buckets=(0.1, 1))
+        histogram.observe(0.05)
+        histogram.observe(0.1)
+        histogram.observe(5)
+
+        self.assertEqual(histogram.get(), (3, 5.15))
+        self.assertEqual(self.registry.render().splitlines()[2:], [
+            'latency_seconds_bucket{le="0.1"} 2',
+            'latency_seconds_bucket{le="1.0"} 2',
+            'latency_seconds_bucket{le="+Inf"} 3',
+            'latency_seconds_sum 5.15',
+            'latency_seconds_count 3',
+        ])
+
+    def test_histogram_time(self):
+        histogram = self.registry.histogram('stage_seconds', 'Stages',
+                                            labels=('stage',))
+        with self.assertRaises(KeyError):
+            with histogram.time(stage='send'):
+                raise KeyError
+
+        self.assertEqual(histogram.get(stage='send')[0], 1)
+
+    def test_server_stages(self):
+        server = WebhookServer(storage=MemoryStorage())
+        server.set_message_handler(lambda request: ('Test', None),
+                                   'METRICS_HANDLER', default=True)
+        request = Mock()
+        request.get_json.return_value = {
+            'object': 'page',
+            'entry': [{'messaging': [{'sender': {'id': 1},
+                                      'message': {'text': 'test'}}]}]
+        }
+
+        stages = ('parse', 'user_state', 'audit', 'state_switch', 'send')
+        before = {stage: STAGE_SECONDS.get(stage=stage)[0]
+                  for stage in stages}
+        messages = EVENTS.get(type='message')
+
+        with patch.object(server.sender, 'send'):
+            server.handle_request(request)
+
+        for stage in stages:
+            self.assertEqual(STAGE_SECONDS.get(stage=stage)[0],
+                             before[stage] + 1)
+        self.assertEqual(HANDLER_SECONDS.get(handler='METRICS_HANDLER')[0], 1)
+        self.assertEqual(EVENTS.get(type='message'), messages + 1)
+
+
+class LoggingTestCase(unittest.TestCase):
+
+    def tearDown(self):
+        setup_logging()
+
+    def test_leveled_sampled_logging(self):
+        stream = io.StringIO()
+        setup_logging(level=INFO, sample_rate=1, stream=stream)
+        log('info %s', 1)
+        log('debug', level=DEBUG)
+        log('warning', level=WARNING)
+        stop_logging()
+
+        lines = stream.getvalue().splitlines()
+        self.assertEqual(len(lines), 2)
+        self.assertTrue(lines[0].endswith('INFO info 1'))
+        self.assertTrue(lines[1].endswith('WARNING warning'))
+
+        stream = io.StringIO()
+        setup_logging(level=DEBUG, sample_rate=0, stream=stream)
+        log('debug', level=DEBUG)
+        log('info')
+        stop_logging()
+        self.assertEqual(len(stream.getvalue().splitlines()), 1)
@@ -0,0 +1,70 @@
+import shutil
+import tempfile
+import unittest
+from unittest.mock import patch
+
+from base.storage import MemoryStorage
+from classifiers.online import (OnlineModel, train_from_storage,
+                                publish_model, load_model, list_versions,
+                                get_latest_version, read_meta)
+
+
+def lowercase_texts(texts):
+    return [text.lower() for text in texts]
+
+
+class OnlineModelTestCase(unittest.TestCase):
+
+    def setUp(self):
+        self.path = tempfile.mkdtemp()
+        self.model = OnlineModel(classes=['weather', 'rates'],
+                                 n_features=2 ** 10)
+        self.storage = MemoryStorage()
+
+    def tearDown(self):
+        shutil.rmtree(self.path)
+
+    def save_requests(self, requests):
+        self.storage.save_request_responses([
+            {'user_id': '1', 'request_type': 'message',
+             'request_message': text, 'response_text': 'r', 'label': label}
+            for text, label in requests
+        ])
+
+    @patch('classifiers.online.normalize_texts', lowercase_texts)
+    def test_train_from_storage(self):
+        requests = [('Дождь и ветер', 'weather'), ('курс доллара', 'rates'),
+                    ('погода дождь', 'weather'), ('курс евро', 'rates')]
+        self.save_requests(requests * 10 + [('что-то', 'unknown'),
+                                            ('', 'rates')])
+
+        self.assertEqual(train_from_storage(self.model, self.storage,
+                                            batch_size=7), 40)
+        self.assertEqual(self.model.trained_records, 40)
+        self.assertEqual(self.model.predict(['дождь', 'курс']),
+                         ['weather', 'rates'])
+
+        # only new requests are read
+        self.assertEqual(train_from_storage(self.model, self.storage), 0)
+        self.save_requests([('ветер', 'weather')])
+        self.assertEqual(train_from_storage(self.model, self.storage), 1)
+
+    def test_published_versions(self):
+        self.assertIsNone(load_model(path=self.path))
+
+        self.model.partial_fit(['дождь', 'курс'], ['weather', 'rates'])
+        self.model.last_record_id = 2
+        self.assertEqual(publish_model(self.model, self.path), '000001')
+        self.model.partial_fit(['ветер'], ['weather'])
+        self.assertEqual(publish_model(self.model, self.path), '000002')
+
+        self.assertEqual(list_versions(self.path), ['000001', '000002'])
+        self.assertEqual(get_latest_version(self.path), '000002')
+        self.assertEqual(read_meta('000001', self.path)['trained_records'], 2)
+
+        model = load_model(path=self.path)
+        self.assertEqual(model.trained_records, 3)
+        self.assertEqual(model.last_record_id, 2)
+        self.assertEqual(model.predict(['дождь']),
+                         self.model.predict(['дождь']))
+        self.assertEqual(load_model('000001', self.path).trained_records, 2)
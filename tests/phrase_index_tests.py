@@ -0,0 +1,36 @@
+import unittest
+
+from classifiers.phrase_index import PhraseIndex
+
+
+class PhraseIndexTestCase(unittest.TestCase):
+
+    def setUp(self):
+        self.index = PhraseIndex.from_phrases([
+            (['big', 'data'], 'big data'),
+            (['big', 'data'], 'Big Data'),
+            (['data'], 'data'),
+            (['анализ', 'данные'], 'анализ данных'),
+            (['кластерный', 'анализ'], 'кластерный анализ'),
+            ([], 'empty'),
+        ])
+
+    def test_search(self):
+        self.assertEqual(len(self.index), 5)
+        self.assertEqual(
+            self.index.search('кластерный анализ данные'.split()),
+            ['кластерный анализ', 'анализ данных']
+        )
+        self.assertEqual(self.index.search('про big data'.split()),
+                         ['big data', 'Big Data', 'data'])
+        self.assertEqual(self.index.search([]), [])
+
+    def test_whole_words_only(self):
+        self.assertEqual(self.index.search(['bigdata', 'database']), [])
+
+    def test_phrase_found_once(self):
+        self.assertEqual(self.index.search('data и data'.split()), ['data'])
+
+    def test_add_after_build(self):
+        self.index.add(['sql'], 'sql')
+        self.assertEqual(self.index.search(['sql']), ['sql'])
@@ -0,0 +1,48 @@
+import unittest
+
+from classifiers.analysis import analyze_text
+from classifiers.preprocessors import (tokenize, normalizing_preprocessor,
+                                       normalize_texts, warm_lemma_cache,
+                                       lemma_cache)
+
+
+class PreprocessorsTestCase(unittest.TestCase):
+
+    def setUp(self):
+        lemma_cache.clear()
+
+    def test_tokenize(self):
+        self.assertEqual(tokenize('Что такое big-data? А 42'),
+                         ['Что', 'такое', 'big', 'data'])
+
+    def test_lemma_cache(self):
+        # words are lemmatized once, then taken from cache
+        misses = lemma_cache.stats()['misses']
+        normalized = normalizing_preprocessor('больших данных')
+        self.assertEqual(lemma_cache.stats()['misses'], misses + 2)
+        self.assertEqual(normalized, ' '.join([lemma_cache.get('больших'),
+                                               lemma_cache.get('данных')]))
+
+        stats = lemma_cache.stats()
+        self.assertEqual(normalizing_preprocessor('больших данных'),
+                         normalized)
+        self.assertEqual(lemma_cache.stats()['misses'], stats['misses'])
+        self.assertEqual(lemma_cache.stats()['hits'], stats['hits'] + 2)
+
+    def test_warm_lemma_cache(self):
+        warm_lemma_cache(['анализ данных'])
+        self.assertIn('данных', lemma_cache)
+
+    def test_normalize_texts(self):
+        texts = ['анализ данных', 'машинное обучение', '']
+        self.assertEqual(normalize_texts(texts),
+                         [normalizing_preprocessor(text) for text in texts])
+
+    def test_analyze_text(self):
+        analysis = analyze_text('Анализ больших данных!')
+        self.assertEqual(analysis.tokens, ['Анализ', 'больших', 'данных'])
+        self.assertEqual(analysis.normalized_text,
+                         normalizing_preprocessor(analysis.text))
+        self.assertEqual(analysis.normalized_text.split(),
+                         analysis.normalized_tokens)
+        self.assertEqual(analyze_text(None).normalized_tokens, [])
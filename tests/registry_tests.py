@@ -0,0 +1,96 @@
+import shutil
+import tempfile
+import unittest
+
+from classifiers.online import (OnlineModel, publish_model,
+                                set_latest_version)
+from classifiers.registry import (ModelRegistry, BASELINE_VERSION,
+                                  PREDICTIONS, is_holdout)
+
+
+HOLDOUT = (['дождь', 'ветер', 'курс', 'доллар'],
+           ['weather', 'weather', 'rates', 'rates'])
+
+
+class ModelRegistryTestCase(unittest.TestCase):
+
+    def setUp(self):
+        self.path = tempfile.mkdtemp()
+        self.registry = ModelRegistry(
+            path=self.path, holdout=lambda: HOLDOUT, min_accuracy=0.5,
+            fallback=lambda: lambda texts: ['weather'] * len(texts)
+        )
+
+    def tearDown(self):
+        self.registry.stop_watch()
+        shutil.rmtree(self.path)
+
+    def publish(self, texts, labels):
+        model = OnlineModel(classes=['weather', 'rates'], n_features=2 ** 10)
+        for _ in range(5):
+            model.partial_fit(texts, labels)
+        return publish_model(model, self.path)
+
+    def test_fallback_without_published_versions(self):
+        predictions = PREDICTIONS.get(version=BASELINE_VERSION)
+        self.assertEqual(self.registry.predict(['курс']),
+                         (BASELINE_VERSION, ['weather']))
+        self.assertEqual(PREDICTIONS.get(version=BASELINE_VERSION),
+                         predictions + 1)
+        self.assertFalse(self.registry.check())
+
+    def test_new_version_is_validated_and_swapped(self):
+        self.registry.get()
+        good = self.publish(*HOLDOUT)
+        self.assertTrue(self.registry.check())
+        self.assertEqual(self.registry.predict(['курс', 'дождь']),
+                         (good, ['rates', 'weather']))
+        self.assertEqual(self.registry.get().accuracy, 1.0)
+        self.assertFalse(self.registry.check())
+
+        # model with inverted labels fails holdout validation
+        bad = self.publish(HOLDOUT[0], list(reversed(HOLDOUT[1])))
+        self.assertFalse(self.registry.check())
+        self.assertIn(bad, self.registry.rejected)
+        self.assertEqual(self.registry.get().version, good)
+
+    def test_rollback(self):
+        self.registry.get()
+        first = self.publish(*HOLDOUT)
+        self.registry.check()
+        second = self.publish(*HOLDOUT)
+        self.registry.check()
+        self.assertEqual(self.registry.get().version, second)
+
+        self.assertEqual(self.registry.rollback(), first)
+        self.assertIn(second, self.registry.rejected)
+        # rolled back version isn't loaded again
+        self.assertFalse(self.registry.check())
+
+        # rollback of all servers by marking older version latest
+        set_latest_version(second, self.path)
+        self.registry.rejected.discard(second)
+        self.registry.check()
+        self.assertEqual(self.registry.get().version, second)
+        set_latest_version(first, self.path)
+        self.assertTrue(self.registry.check())
+        self.assertEqual(self.registry.get().version, first)
+
+        with self.assertRaises(ValueError):
+            self.registry.rollback(second)
+
+    def test_latest_version_is_loaded_first(self):
+        version = self.publish(*HOLDOUT)
+        self.assertEqual(self.registry.get().version, version)
+
+    def test_holdout_split(self):
+        sentences = ['sentence {}'.format(i) for i in range(1000)]
+        held_out = [sentence for sentence in sentences
+                    if is_holdout(sentence)]
+        self.assertTrue(50 < len(held_out) < 150)
+        # split doesn't depend on order of rows
+        self.assertEqual(held_out[::-1], [sentence for sentence
+                                          in reversed(sentences)
+                                          if is_holdout(sentence)])
+        self.assertFalse(any(is_holdout(sentence, fraction=0)
+                             for sentence in sentences))
@@ -0,0 +1,97 @@
+import unittest
+from unittest.mock import patch, Mock
+
+from base import handlers
+from base.response_cache import (ResponseCache, RESPONSE_CACHE_REQUESTS,
+                                 RESPONSE_CACHE_EVICTIONS)
+from classifiers.analysis import TextAnalysis
+
+
+class ResponseCacheTestCase(unittest.TestCase):
+
+    def setUp(self):
+        self.cache = ResponseCache(max_size=2)
+        self.respond = Mock(side_effect=lambda: ('message', None))
+
+    def test_repeated_texts_are_answered_from_cache(self):
+        hits = RESPONSE_CACHE_REQUESTS.get(handler='TEST', result='hit')
+        misses = RESPONSE_CACHE_REQUESTS.get(handler='TEST', result='miss')
+
+        for _ in range(3):
+            self.assertEqual(self.cache.get_or_compute('TEST', 'привет',
+                                                       ('1', 1),
+                                                       self.respond),
+                             ('message', None))
+
+        self.assertEqual(self.respond.call_count, 1)
+        self.assertEqual(RESPONSE_CACHE_REQUESTS.get(handler='TEST',
+                                                     result='hit'), hits + 2)
+        self.assertEqual(RESPONSE_CACHE_REQUESTS.get(handler='TEST',
+                                                     result='miss'),
+                         misses + 1)
+        self.assertAlmostEqual(self.cache.stats()['hit_rate'], 2 / 3)
+
+    def test_cache_is_bounded(self):
+        evictions = RESPONSE_CACHE_EVICTIONS.get()
+        for text in ('a', 'b', 'c'):
+            self.cache.get_or_compute('TEST', text, ('1', 1), self.respond)
+
+        self.assertEqual(self.cache.stats()['size'], 2)
+        self.assertEqual(RESPONSE_CACHE_EVICTIONS.get(), evictions + 1)
+        self.cache.get_or_compute('TEST', 'a', ('1', 1), self.respond)
+        self.assertEqual(self.respond.call_count, 4)
+
+    def test_new_versions_invalidate_cache(self):
+        self.cache.get_or_compute('TEST', 'a', ('1', 1), self.respond)
+        self.cache.get_or_compute('TEST', 'b', ('1', 1), self.respond)
+
+        # new glossary
+        self.cache.get_or_compute('TEST', 'a', ('1', 2), self.respond)
+        self.assertEqual(self.respond.call_count, 3)
+        self.assertEqual(self.cache.stats()['size'], 1)
+
+        # new model
+        self.cache.get_or_compute('TEST', 'a', ('2', 2), self.respond)
+        self.assertEqual(self.respond.call_count, 4)
+
+
+class CachedHandlersTestCase(unittest.TestCase):
+
+    def setUp(self):
+        handlers.enable_response_cache(max_size=10)
+        self.classify = patch('base.handlers.classify',
+                              return_value=('0', 'v1'))
+        self.analyze = patch(
+            'base.handlers.analyze_text',
+            side_effect=lambda text: TextAnalysis(text, [text], [text], text)
+        )
+        self.model = patch.object(handlers.model_registry, 'get',
+                                  return_value=Mock(version='v1'))
+        for patcher in (self.classify, self.analyze, self.model):
+            patcher.start()
+
+    def tearDown(self):
+        for patcher in (self.classify, self.analyze, self.model):
+            patcher.stop()
+        handlers.response_cache = None
+
+    def test_data_science_responses_are_cached(self):
+        for _ in range(2):
+            request = {'text': 'погода'}
+            self.assertEqual(handlers.data_science_message_handler(request),
+                             ("Ничего не могу сказать на эту тему.", None))
+            self.assertEqual(request['_model_version'], 'v1')
+
+        self.assertEqual(handlers.classify.call_count, 1)
+
+    def test_model_is_got_once(self):
+        # version activated while response is computed
+        # doesn't change cache key and saved version
+        models = [Mock(version='v1'), Mock(version='v2')]
+        handlers.model_registry.get.side_effect = models
+        request = {'text': 'погода'}
+        handlers.data_science_message_handler(request)
+
+        self.assertEqual(request['_model_version'], 'v1')
+        self.assertIs(handlers.classify.call_args[0][1], models[0])
+        self.assertEqual(handlers.response_cache.versions[0], 'v1')
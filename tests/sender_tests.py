@@ -0,0 +1,151 @@
+import json
+import time
+import asyncio
+import threading
+import unittest
+from urllib.parse import parse_qs
+from http.server import BaseHTTPRequestHandler, HTTPServer
+
+from base.aio import close_session
+from base.sender import MessageSender
+
+
+class StubGraphAPIHandler(BaseHTTPRequestHandler):
+    """
+    Answers with statuses from server's `statuses` list,
+    then with 200
+    """
+
+    def do_POST(self):
+        length = int(self.headers.get('Content-Length', 0))
+        body = json.loads(self.rfile.read(length).decode('utf-8'))
+        self.server.requests.append((self.path, body))
+
+        status = self.server.statuses.pop(0) if self.server.statuses else 200
+        headers = self.server.headers.pop(0) if self.server.headers else {}
+        if 'batch' in body and status == 200:
+            response = [{"code": 200, "body": "{}"} for _ in body['batch']]
+        else:
+            response = {}
+
+        self.send_response(status)
+        for header, value in headers.items():
+            self.send_header(header, value)
+        self.send_header('Content-Type', 'application/json')
+        self.end_headers()
+        self.wfile.write(json.dumps(response).encode('utf-8'))
+
+    def log_message(self, *args):
+        pass
+
+
+class MessageSenderTestCase(unittest.TestCase):
+
+    def setUp(self):
+        self.stub = HTTPServer(('127.0.0.1', 0), StubGraphAPIHandler)
+        self.stub.requests = []
+        self.stub.statuses = []
+        self.stub.headers = []
+        self.thread = threading.Thread(target=self.stub.serve_forever)
+        self.thread.start()
+
+        url = 'http://127.0.0.1:{}'.format(self.stub.server_port)
+        self.sender = MessageSender(
+            access_token='test', url=url + '/v2.6/me/messages', batch_url=url,
+            backoff_factor=0.01
+        )
+
+    def tearDown(self):
+        self.sender.close()
+        self.stub.shutdown()
+        self.stub.server_close()
+        self.thread.join()
+
+    def test_send(self):
+        r = self.sender.send(1, 'test')
+        self.assertEqual(r.status_code, 200)
+
+        path, body = self.stub.requests[0]
+        self.assertEqual(path, '/v2.6/me/messages?access_token=test')
+        self.assertEqual(body, {'recipient': {'id': 1},
+                                'message': {'text': 'test'}})
+
+    def test_retry(self):
+        # retried until success
+        self.stub.statuses = [429, 503]
+        r = self.sender.send(1, 'test')
+        self.assertEqual(r.status_code, 200)
+        self.assertEqual(len(self.stub.requests), 3)
+
+        # client errors are not retried
+        self.stub.statuses = [400]
+        r = self.sender.send(1, 'test')
+        self.assertEqual(r.status_code, 400)
+        self.assertEqual(len(self.stub.requests), 4)
+
+        # give up after max retries
+        self.stub.statuses = [500] * 10
+        r = self.sender.send(1, 'test')
+        self.assertEqual(r.status_code, 500)
+        self.assertEqual(len(self.stub.requests),
+                         4 + 1 + self.sender.max_retries)
+
+    def test_send_aio(self):
+        loop = asyncio.new_event_loop()
+        self.addCleanup(loop.close)
+
+        async def send():
+            try:
+                return await self.sender.send_aio(1, 'test')
+            finally:
+                await close_session()
+
+        # retried like threaded sending
+        self.stub.statuses = [429, 503]
+        self.stub.headers = [{'Retry-After': '0'}]
+        self.assertEqual(loop.run_until_complete(send()), 200)
+        self.assertEqual(len(self.stub.requests), 3)
+
+        path, body = self.stub.requests[0]
+        self.assertEqual(path, '/v2.6/me/messages?access_token=test')
+        self.assertEqual(body, {'recipient': {'id': 1},
+                                'message': {'text': 'test'}})
+
+        self.stub.statuses = [400]
+        self.assertEqual(loop.run_until_complete(send()), 400)
+        self.assertEqual(len(self.stub.requests), 4)
+
+    def test_rate_limit_headers(self):
+        self.stub.headers = [{'X-App-Usage': json.dumps(
+            {'call_count': 95, 'total_time': 10, 'total_cputime': 10}
+        )}]
+        self.sender.send(1, 'test')
+        self.assertGreater(self.sender._paused_until, time.time())
+
+        self.stub.headers = [{'X-App-Usage': json.dumps(
+            {'call_count': 10, 'total_time': 10, 'total_cputime': 10}
+        )}]
+        self.sender._paused_until = 0
+        self.sender.send(1, 'test')
+        self.assertEqual(self.sender._paused_until, 0)
+
+    def test_send_batch(self):
+        messages = [(recipient_id, 'test') for recipient_id in range(60)]
+        statuses = self.sender.send_batch(messages)
+        self.assertEqual(statuses, [200] * 60)
+        self.assertEqual(len(self.stub.requests), 2)
+
+        path, body = self.stub.requests[0]
+        self.assertEqual(len(body['batch']), 50)
+        request = body['batch'][0]
+        self.assertEqual(request['relative_url'], 'v2.6/me/messages')
+        self.assertEqual(json.loads(parse_qs(request['body'])['recipient'][0]),
+                         {'id': 0})
+
+    def test_batch_window(self):
+        self.sender.batch_window = 0.05
+        futures = [self.sender.send(recipient_id, 'test')
+                   for recipient_id in range(3)]
+        self.assertEqual([future.result(timeout=5) for future in futures],
+                         [200] * 3)
+        self.assertEqual(len(self.stub.requests), 1)
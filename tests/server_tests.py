@@ -94,28 +94,28 @@ class WebhookServerTestCase(unittest.TestCase):
         )
 
     @set_env_variable('PAGE_ACCESS_TOKEN', 'test')
-    @patch('base.server.requests')
-    def test_send_message(self, mock_obj):
+    def test_send_message(self):
         recipient_id = 1
         message_text = "test"
         response_mock = Mock()
         response_mock.status_code = 200
-        mock_obj.post.return_value = response_mock
         expected_params = {"access_token": os.environ["PAGE_ACCESS_TOKEN"]}
-        expected_headers = {"Content-Type": "application/json"}
         expected_data = json.dumps({
             "recipient": {"id": recipient_id},
             "message": {"text": message_text}
         })
 
-        self.server.send_message(recipient_id, message_text)
-        mock_obj.post.assert_called_with(
-            MESSAGES_POST_LINK, params=expected_params, headers=expected_headers,
-            data=expected_data
+        with patch.object(self.server.sender.session, 'post',
+                          return_value=response_mock) as mock_post:
+            self.server.send_message(recipient_id, message_text)
+        mock_post.assert_called_with(
+            MESSAGES_POST_LINK, params=expected_params, data=expected_data
         )
+        self.assertEqual(self.server.sender.session.headers['Content-Type'],
+                         "application/json")
 
     @set_env_variable('PAGE_ACCESS_TOKEN', 'test')
-    @patch('base.server.requests')
+    @patch('base.server.MessageSender.send')
     def test_handle_message(self, mock_obj):
         message = {'text': "test"}
         sender_id = 1
@@ -137,7 +137,7 @@ class WebhookServerTestCase(unittest.TestCase):
         )
 
     @set_env_variable('PAGE_ACCESS_TOKEN', 'test')
-    @patch('base.server.requests')
+    @patch('base.server.MessageSender.send')
     def test_handle_postback(self, mock_obj):
         handler_code = "handler"
         sender_id = 1
@@ -158,6 +158,6 @@ class WebhookServerTestCase(unittest.TestCase):
         )
 
     @set_env_variable('PAGE_ACCESS_TOKEN', 'test')
-    @patch('base.server.requests')
+    @patch('base.server.MessageSender.send')
     def test_handle_request(self, mock):
         pass
@@ -0,0 +1,61 @@
+import os
+import unittest
+from unittest.mock import patch
+
+import settings
+from base.storage import MemoryStorage
+
+
+@patch.dict(os.environ, {'STORAGE_URL': 'memory://', 'LAZY_LOADING': '1'})
+class SettingsTestCase(unittest.TestCase):
+
+    def setUp(self):
+        settings._components = None
+        settings._server = None
+
+    def tearDown(self):
+        settings._components = None
+        settings._server = None
+
+    def test_server_is_created_once_per_process(self):
+        server = settings.get_server()
+        self.assertIs(settings.get_server(), server)
+        self.assertIsInstance(server.storage, MemoryStorage)
+        self.assertIs(server.state_store.storage, server.storage)
+
+        # forked process creates its own connections and threads
+        with patch('settings.os.getpid', return_value=-1):
+            forked_server = settings.get_server()
+        self.assertIsNot(forked_server, server)
+        self.assertIsNot(forked_server.storage, server.storage)
+
+    @patch.dict(os.environ, {'WEBHOOK_WORKERS': '2'})
+    def test_close_handles_queued_events(self):
+        server = settings.get_server()
+        handled = []
+        server.worker_pool.submit(1, handled.append, 'event')
+
+        settings.close()
+        self.assertEqual(handled, ['event'])
+        self.assertEqual(server.worker_pool.threads, [])
+        self.assertIsNone(settings._components)
+
+    def test_app_is_created_without_server(self):
+        import app
+
+        with patch('settings.preload') as preload:
+            flask_app = app.create_app(preload=False)
+            self.assertFalse(preload.called)
+            self.assertIsNone(settings._components)
+
+            app.create_app(preload=True)
+            self.assertTrue(preload.called)
+
+        response = flask_app.test_client().get('/')
+        self.assertEqual(response.status_code, 200)
+        self.assertIsNone(settings._components)
+
+        response = flask_app.test_client().get('/metrics')
+        self.assertEqual(response.status_code, 200)
+        self.assertIn(b'# TYPE webhook_stage_seconds histogram',
+                      response.data)
@@ -0,0 +1,48 @@
+import os
+import unittest
+
+from mongoengine import connect
+
+from base.models import User
+from base.state import (ConversationStateStore, WRITE_THROUGH,
+                        WRITE_BEHIND)
+
+
+class ConversationStateStoreTestCase(unittest.TestCase):
+
+    def setUp(self):
+        self.db = connect(host=os.environ.get('MONGODB_TEST_HOST') + \
+                          os.environ.get('MONGODB_TEST_NAME'))
+
+    def tearDown(self):
+        self.db.drop_database(os.environ.get('MONGODB_TEST_NAME'))
+
+    def test_write_through(self):
+        store = ConversationStateStore(mode=WRITE_THROUGH)
+        self.assertIsNone(store.get_next_handler(1))
+
+        store.set_next_handler(1, 'handler')
+        self.assertEqual(User.objects(user_id='1').first().next_handler,
+                         'handler')
+
+        # state is read from cache
+        User.objects(user_id='1').update_one(set__next_handler='other')
+        self.assertEqual(store.get_next_handler(1), 'handler')
+        self.assertEqual(store.stats()['hits'], 1)
+        self.assertEqual(store.stats()['misses'], 1)
+
+    def test_write_behind(self):
+        store = ConversationStateStore(mode=WRITE_BEHIND,
+                                       flush_interval=60)
+        store.set_next_handler(1, 'handler1')
+        store.set_next_handler(1, 'handler2')
+        store.set_next_handler(2, 'handler1')
+        self.assertEqual(store.get_next_handler(1), 'handler2')
+        self.assertEqual(User.objects.count(), 0)
+        self.assertEqual(store.stats()['pending_writes'], 2)
+
+        store.close()
+        self.assertEqual(User.objects(user_id='1').first().next_handler,
+                         'handler2')
+        self.assertEqual(User.objects(user_id='2').first().next_handler,
+                         'handler1')
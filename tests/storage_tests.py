@@ -0,0 +1,311 @@
+import os
+import shutil
+import sqlite3
+import tempfile
+import unittest
+from datetime import datetime, timedelta
+from urllib.parse import unquote
+
+import responses
+from mongoengine import connect
+
+from base.storage import (MemoryStorage, SQLiteStorage, MongoStorage,
+                          CityWeather, create_storage)
+from base.state import ConversationStateStore, WRITE_BEHIND
+from base.audit import AuditLog
+from base.exchange_rates import (ExchangeRateService, EXCHANGE_RATES_URL,
+                                 EXCHANGE_RATES_DYNAMIC_URL,
+                                 find_missing_periods, parse_exchange_rates,
+                                 parse_dynamic_exchange_rates)
+from base.models import WEATHER_RETENTION
+
+
+class StorageTestMixin:
+
+    def create_storage(self):
+        raise NotImplementedError
+
+    def setUp(self):
+        self.storage = self.create_storage()
+
+    def tearDown(self):
+        self.storage.close()
+
+    def test_next_handlers(self):
+        self.assertIsNone(self.storage.get_next_handler('1'))
+
+        self.storage.set_next_handler('1', 'handler1')
+        self.storage.set_next_handlers({'1': 'handler2', '2': 'handler1'})
+        self.assertEqual(self.storage.get_next_handler('1'), 'handler2')
+        self.assertEqual(self.storage.get_next_handler('2'), 'handler1')
+
+    def test_request_responses(self):
+        self.storage.save_request_responses([])
+        self.storage.save_request_responses([
+            {'user_id': '1', 'request_type': 'message',
+             'request_message': 'test', 'response_text': 'response'},
+            {'user_id': '1', 'request_type': 'postback',
+             'postback_type': 'PAYLOAD', 'response_text': 'response'},
+        ])
+
+    def test_labeled_requests(self):
+        self.storage.save_request_responses([
+            {'user_id': '1', 'request_type': 'message',
+             'request_message': 'text{}'.format(i), 'response_text': 'r',
+             'label': str(i % 2) if i % 3 else None}
+            for i in range(7)
+        ])
+
+        records = self.storage.get_labeled_requests(limit=3)
+        self.assertEqual([(text, label) for _, text, label in records],
+                         [('text1', '1'), ('text2', '0'), ('text4', '0')])
+
+        records = self.storage.get_labeled_requests(after=records[-1][0])
+        self.assertEqual([(text, label) for _, text, label in records],
+                         [('text5', '1')])
+        self.assertEqual(
+            self.storage.get_labeled_requests(after=records[-1][0]), []
+        )
+
+    def test_seen_events(self):
+        self.assertTrue(self.storage.mark_event_seen('mid:1', 60))
+        self.assertFalse(self.storage.mark_event_seen('mid:1', 60))
+        self.assertTrue(self.storage.mark_event_seen('mid:2', 60))
+
+        # expired event is new again
+        self.assertTrue(self.storage.mark_event_seen('mid:3', -1))
+        self.assertTrue(self.storage.mark_event_seen('mid:3', 60))
+
+    def test_exchange_rates(self):
+        today = datetime.now().date()
+        yesterday = today - timedelta(days=1)
+        self.assertIsNone(self.storage.get_exchange_rate('USD', 'RUB', today))
+
+        self.storage.save_exchange_rates([
+            ('USD', 'RUB', today, 60.0),
+            ('USD', 'RUB', yesterday, 59.5),
+            ('EUR', 'RUB', today, 70.0),
+        ])
+        # rates for same date are replaced
+        self.storage.save_exchange_rates([('USD', 'RUB', today, 61.0)])
+
+        self.assertEqual(self.storage.get_exchange_rate('USD', 'RUB', today),
+                         61.0)
+        self.assertEqual(
+            self.storage.get_exchange_rates_range(
+                'USD', 'RUB', yesterday - timedelta(days=7), today
+            ),
+            [(yesterday, 59.5), (today, 61.0)]
+        )
+        self.assertEqual(
+            self.storage.get_exchange_rates_range('USD', 'RUB', today, today),
+            [(today, 61.0)]
+        )
+
+    def test_weather(self):
+        now = datetime.now().replace(microsecond=0)
+        self.assertIsNone(self.storage.get_latest_weather('Moscow', now))
+
+        self.storage.save_weather(
+            CityWeather('Moscow', 10.0, 1.0, now - timedelta(hours=1))
+        )
+        self.storage.save_weather(CityWeather('Moscow', 20.6, 6.0, now))
+        self.storage.save_weather(
+            CityWeather('Saint Petersburg', 15.0, 3.0, now)
+        )
+
+        self.assertEqual(
+            self.storage.get_latest_weather('Moscow',
+                                            now - timedelta(hours=2)),
+            CityWeather('Moscow', 20.6, 6.0, now)
+        )
+        self.assertIsNone(self.storage.get_latest_weather(
+            'Moscow', now + timedelta(minutes=1)
+        ))
+
+
+class MemoryStorageTestCase(StorageTestMixin, unittest.TestCase):
+
+    def create_storage(self):
+        return MemoryStorage()
+
+    def test_request_responses_are_bounded(self):
+        storage = MemoryStorage(max_request_responses=2)
+        storage.save_request_responses([{'user_id': str(i)}
+                                        for i in range(3)])
+        self.assertEqual([record['user_id'] for record in
+                          storage.request_responses], ['1', '2'])
+
+
+class SQLiteStorageTestCase(StorageTestMixin, unittest.TestCase):
+
+    def create_storage(self):
+        return SQLiteStorage()
+
+    def test_old_weather_is_removed(self):
+        now = datetime.now()
+        self.storage.save_weather(CityWeather(
+            'Moscow', 10.0, 1.0,
+            now - timedelta(seconds=WEATHER_RETENTION + 60)
+        ))
+        self.storage.save_weather(CityWeather('Moscow', 20.0, 2.0, now))
+        self.assertEqual(
+            self.storage._fetchone('SELECT COUNT(*) FROM weather', ())[0], 1
+        )
+
+
+class SQLiteFileStorageTestCase(StorageTestMixin, unittest.TestCase):
+
+    def create_storage(self):
+        self.directory = tempfile.mkdtemp()
+        return create_storage(
+            'sqlite:///' + os.path.join(self.directory, 'bot.db')
+        )
+
+    def tearDown(self):
+        super().tearDown()
+        shutil.rmtree(self.directory)
+
+    def test_data_is_kept_in_file(self):
+        self.storage.set_next_handler('1', 'handler')
+        self.storage.close()
+
+        self.storage = SQLiteStorage(self.storage.path)
+        self.assertEqual(self.storage.get_next_handler('1'), 'handler')
+
+    def test_label_column_is_added(self):
+        self.storage.close()
+        path = os.path.join(self.directory, 'old.db')
+        connection = sqlite3.connect(path)
+        connection.execute(
+            'CREATE TABLE request_responses (id INTEGER PRIMARY KEY, '
+            'user_id TEXT NOT NULL, request_type TEXT NOT NULL, '
+            'request_message TEXT, postback_type TEXT, '
+            'response_text TEXT NOT NULL)'
+        )
+        connection.close()
+
+        self.storage = SQLiteStorage(path)
+        self.storage.save_request_responses([
+            {'user_id': '1', 'request_type': 'message',
+             'request_message': 'text', 'response_text': 'r', 'label': '1'}
+        ])
+        self.assertEqual(len(self.storage.get_labeled_requests()), 1)
+
+
+class MongoStorageTestCase(StorageTestMixin, unittest.TestCase):
+
+    def create_storage(self):
+        self.db = connect(host=os.environ.get('MONGODB_TEST_HOST') + \
+                          os.environ.get('MONGODB_TEST_NAME'))
+        return MongoStorage()
+
+    def tearDown(self):
+        super().tearDown()
+        self.db.drop_database(os.environ.get('MONGODB_TEST_NAME'))
+
+
+class StorageUsersTestCase(unittest.TestCase):
+
+    def test_create_storage(self):
+        self.assertIsInstance(create_storage('memory://'), MemoryStorage)
+        self.assertEqual(create_storage('sqlite://').path, ':memory:')
+        with self.assertRaises(ValueError):
+            create_storage('redis://localhost')
+
+    def test_state_store(self):
+        storage = MemoryStorage()
+        store = ConversationStateStore(mode=WRITE_BEHIND, flush_interval=60,
+                                       storage=storage)
+        store.set_next_handler(1, 'handler')
+        self.assertIsNone(storage.get_next_handler('1'))
+
+        store.close()
+        self.assertEqual(storage.get_next_handler('1'), 'handler')
+
+    def test_state_store_pending_update_evicted_from_cache(self):
+        storage = MemoryStorage()
+        storage.set_next_handler('1', 'stale')
+        store = ConversationStateStore(max_size=1, mode=WRITE_BEHIND,
+                                       flush_interval=60, storage=storage)
+        store.set_next_handler(1, 'handler')
+        store.set_next_handler(2, 'handler')
+
+        self.assertEqual(store.get_next_handler(1), 'handler')
+        store.close()
+        self.assertEqual(storage.get_next_handler('1'), 'handler')
+
+    def test_audit_log(self):
+        storage = SQLiteStorage()
+        audit_log = AuditLog(batch_size=2, flush_interval=60, storage=storage)
+        for i in range(3):
+            audit_log.append(user_id=str(i), request_type='message',
+                             response_text='response')
+        audit_log.close()
+
+        self.assertEqual(audit_log.stats()['written'], 3)
+        self.assertEqual(storage._fetchone(
+            'SELECT COUNT(*) FROM request_responses', ()
+        )[0], 3)
+
+    def test_exchange_rate_service(self):
+        today = datetime.now().date()
+        service = ExchangeRateService(storage=MemoryStorage())
+        body = '<ValCurs><Valute><CharCode>USD</CharCode>' +\
+               '<Value>60,1</Value></Valute></ValCurs>'
+
+        with responses.RequestsMock() as rsps:
+            rsps.add(responses.GET, EXCHANGE_RATES_URL, body=body)
+            self.assertEqual(service.get_rate('USD', 'RUB', today), 60.1)
+
+        service.cache.clear()
+        self.assertEqual(service.get_known_rate('USD', 'RUB', today), 60.1)
+
+    def test_rates_of_several_units(self):
+        body = '<ValCurs><Valute><CharCode>USD</CharCode>' \
+               '<Nominal>1</Nominal><Value>60,1</Value></Valute>' \
+               '<Valute><CharCode>JPY</CharCode><Nominal>100</Nominal>' \
+               '<Value>53,6</Value></Valute></ValCurs>'
+        self.assertEqual(parse_exchange_rates(body),
+                         {'USD': 60.1, 'JPY': 0.536})
+
+        body = '<ValCurs><Record Date="01.07.2017"><Nominal>10</Nominal>' \
+               '<Value>33,4</Value></Record></ValCurs>'
+        self.assertEqual(parse_dynamic_exchange_rates(body),
+                         {datetime(2017, 7, 1).date(): 3.34})
+
+    def test_exchange_rates_range_backfills_missing_period(self):
+        today = datetime.now().date()
+        year_ago = today - timedelta(days=364)
+        month_ago = today - timedelta(days=30)
+        storage = MemoryStorage()
+        storage.save_exchange_rates([('USD', 'RUB', today, 60.1)])
+        service = ExchangeRateService(storage=storage)
+        body = '<ValCurs><Record Date="{}"><Value>55,5</Value></Record>' \
+               '</ValCurs>'.format(month_ago.strftime('%d.%m.%Y'))
+
+        with responses.RequestsMock() as rsps:
+            rsps.add(responses.GET, EXCHANGE_RATES_DYNAMIC_URL, body=body)
+            rates = service.get_rates_range('USD', 'RUB', year_ago, today)
+            self.assertEqual(len(rsps.calls), 1)
+            self.assertIn('date_req1=' + year_ago.strftime('%d/%m/%Y'),
+                          unquote(rsps.calls[0].request.url))
+
+            # gaps cbr.ru has no rates for aren't loaded again
+            service.get_rates_range('USD', 'RUB', year_ago, today)
+            self.assertEqual(len(rsps.calls), 1)
+
+        self.assertEqual(rates, [(month_ago, 55.5), (today, 60.1)])
+
+    def test_find_missing_periods(self):
+        day = timedelta(days=1)
+        date_from = datetime(2019, 1, 1).date()
+        date_to = date_from + 20 * day
+        self.assertEqual(find_missing_periods([], date_from, date_to),
+                         [(date_from, date_to)])
+        # weekend isn't missing
+        dates = [date_from, date_from + 3 * day, date_from + 10 * day,
+                 date_from + 14 * day,
+                 date_to - 2 * day]
+        self.assertEqual(find_missing_periods(dates, date_from, date_to),
+                         [(date_from + 4 * day, date_from + 9 * day)])
@@ -0,0 +1,113 @@
+import time
+import random
+import unittest
+import threading
+from unittest.mock import patch, Mock
+
+from base.workers import PartitionedWorkerPool
+from base.server import WebhookServer
+from base.storage import MemoryStorage
+
+
+class PartitionedWorkerPoolTestCase(unittest.TestCase):
+
+    def setUp(self):
+        self.pool = PartitionedWorkerPool(workers=4)
+        self.pool.start()
+
+    def tearDown(self):
+        self.pool.stop()
+
+    def test_tasks_with_same_key_run_in_order(self):
+        results = {key: [] for key in range(10)}
+
+        def task(key, index):
+            time.sleep(random.random() / 1000)
+            results[key].append(index)
+
+        for index in range(20):
+            for key in results:
+                self.pool.submit(key, task, key, index)
+        self.pool.join()
+
+        for key, indexes in results.items():
+            self.assertEqual(indexes, list(range(20)))
+
+    def test_failed_task_does_not_stop_worker(self):
+        results = []
+
+        def failing_task():
+            raise ValueError
+
+        self.pool.submit(1, failing_task)
+        self.pool.submit(1, results.append, 'done')
+        self.pool.join()
+
+        self.assertEqual(results, ['done'])
+
+    def test_stop_processes_queued_tasks(self):
+        results = []
+        for index in range(10):
+            self.pool.submit(1, time.sleep, 0.01)
+            self.pool.submit(1, results.append, index)
+        self.pool.stop()
+
+        self.assertEqual(results, list(range(10)))
+        self.assertEqual(self.pool.threads, [])
+        # stopping again does nothing
+        self.pool.stop()
+
+
+class BatchConcurrencyTestCase(unittest.TestCase):
+
+    def setUp(self):
+        self.server = WebhookServer(storage=MemoryStorage(),
+                                    batch_concurrency=4)
+        self.handled = []
+        self.lock = threading.Lock()
+        self.server.set_message_handler(self.message_handler, 'BATCH',
+                                        default=True)
+
+    def message_handler(self, message):
+        if message['text'] == 'fail':
+            raise ValueError
+        time.sleep(0.1)
+        with self.lock:
+            self.handled.append(message['text'])
+        return 'ok', None
+
+    def request(self, events):
+        request = Mock()
+        request.get_json.return_value = {
+            'object': 'page',
+            'entry': [{'messaging': events[:len(events) // 2]},
+                      {'messaging': events[len(events) // 2:]}]
+        }
+        return request
+
+    def test_senders_are_handled_in_parallel_and_in_order(self):
+        events = [{'sender': {'id': sender},
+                   'message': {'text': sender + text if text else 'fail'}}
+                  for text in ('1', None, '2')
+                  for sender in ('a', 'b', 'c', 'd')]
+
+        start = time.monotonic()
+        with patch.object(self.server.sender, 'send'):
+            self.server.handle_request(self.request(events))
+        elapsed = time.monotonic() - start
+
+        # each sender's two slow events run one after another,
+        # senders run at once
+        self.assertLess(elapsed, 0.4)
+        self.assertEqual(len(self.handled), 8)
+        for sender in ('a', 'b', 'c', 'd'):
+            self.assertLess(self.handled.index(sender + '1'),
+                            self.handled.index(sender + '2'))
+
+    def test_serial_without_batch_concurrency(self):
+        server = WebhookServer(storage=MemoryStorage())
+        self.assertIsNone(server.batch_executor)
+        server = WebhookServer(storage=MemoryStorage(), workers=1,
+                               batch_concurrency=4)
+        self.assertIsNone(server.batch_executor)
+        server.worker_pool.stop()
@@ -1,60 +1,183 @@
 import csv
+import time
+import argparse
+import resource
+from contextlib import contextmanager
+from multiprocessing import Pool
 
 from sklearn.externals import joblib
 from sklearn.ensemble import RandomForestClassifier
 from sklearn.feature_extraction.text import CountVectorizer
 
-from classifiers.preprocessors import normalizing_preprocessor
+from base.utils import format_memory_usage
+from classifiers.compact import CompactForestModel, export_compact_model
+from classifiers.registry import is_holdout
+from classifiers.preprocessors import (normalizing_preprocessor,
+                                       identity_preprocessor,
+                                       normalize_texts, load_morph)
 
 
 DATASET_PATH = './data/dataset.csv'
 CLASSIFIER_PATH = './data/forest.pkl'
 VECTORIZER_PATH = './data/vectorizer.pkl'
+COMPACT_MODEL_PATH = './data/compact_model'
 
+# rows lemmatized by one task of process pool
+CHUNK_SIZE = 1000
+N_ESTIMATORS = 10
 
-def vectorize_data(data):
+
+@contextmanager
+def profile(stage):
+    """
+    Print time of training stage and memory after it.
+    Peak rss is max for process lifetime, so it grows
+    only at stages that need more memory than previous ones
+
+    :param: stage: str
+    """
+    start = time.monotonic()
+    yield
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024
+    children_peak = \
+        resource.getrusage(resource.RUSAGE_CHILDREN).ru_maxrss / 1024
+    print("{:<10} {:>8.2f}s  {}, peak rss {:.1f}MB, "
+          "children peak rss {:.1f}MB".format(
+              stage, time.monotonic() - start, format_memory_usage(),
+              peak, children_peak))
+
+
+def read_dataset(path, chunk_size=CHUNK_SIZE):
+    """
+    Read dataset by chunks, so it's never fully loaded in raw form.
+    Rows held out for validation of models are skipped
+
+    :param: path: str: csv file with sentence and category columns
+    :param: chunk_size: int: rows in chunk
+    :return: generator: (list, list) chunks of sentences and labels
+    """
+    with open(path, 'r') as csvfile:
+        sentences = []
+        labels = []
+        for row in csv.DictReader(csvfile):
+            if is_holdout(row['sentence']):
+                continue
+            sentences.append(row['sentence'])
+            labels.append(row['category'])
+            if len(sentences) == chunk_size:
+                yield sentences, labels
+                sentences = []
+                labels = []
+        if sentences:
+            yield sentences, labels
+
+
+def normalize_chunk(chunk):
+    """
+    Lemmatize chunk in process of pool
+
+    :param: chunk: (list, list): sentences and labels
+    :return: (list, list): normalized sentences and labels
+    """
+    sentences, labels = chunk
+    return normalize_texts(sentences), labels
+
+
+def normalize_dataset(path, processes=None, chunk_size=CHUNK_SIZE):
+    """
+    Lemmatize dataset in parallel by process pool, keeping order of rows
+
+    :param: path: str: dataset csv file
+    :param: processes: int: size of pool, number of cpus by default
+    :param: chunk_size: int: rows lemmatized by one task
+    :return: (list, list): normalized sentences and labels
+    """
+    normalized_data = []
+    labels = []
+    # morphological analyzer is loaded once in each process
+    with Pool(processes, initializer=load_morph) as pool:
+        for chunk_data, chunk_labels in pool.imap(
+                normalize_chunk, read_dataset(path, chunk_size)):
+            normalized_data.extend(chunk_data)
+            labels.extend(chunk_labels)
+    return normalized_data, labels
+
+
+def vectorize_data(normalized_data):
     """
     Vectorizing data for training
 
-    :param: data: list: raw data
-    :return: numpy.array: vectorized data
+    :param: normalized_data: list: lemmatized data
+    :return: (scipy.sparse.csr_matrix, CountVectorizer): vectorized data
+             and vectorizer
     """
 
+    # data is normalized in parallel beforehand, vectorizer used in
+    # chatbot normalizes raw messages itself
     vectorizer = CountVectorizer(analyzer='word',
-                                 preprocessor=normalizing_preprocessor,
+                                 preprocessor=identity_preprocessor,
                                  stop_words=None, max_df=0.8)
-    vectorized_data = vectorizer.fit_transform(data)
-    data_array = vectorized_data.toarray()
+    vectorized_data = vectorizer.fit_transform(normalized_data)
+    vectorizer.set_params(preprocessor=normalizing_preprocessor)
 
-    # pickle vectorizer
-    joblib.dump(vectorizer, VECTORIZER_PATH)
+    return vectorized_data, vectorizer
 
-    return data_array
 
-
-def main():
+def export_compact(vectorizer, forest, normalized_data, vectorized_data):
     """
-    Training classifier and then pickling it for use in chatbot
+    Export model for inference without sklearn and check
+    that it predicts same classes as pickled model
+
+    :param: vectorizer: CountVectorizer
+    :param: forest: RandomForestClassifier
+    :param: normalized_data: list: lemmatized data
+    :param: vectorized_data: scipy.sparse.csr_matrix: normalized_data
+            vectorized by vectorizer
     """
-    with open(DATASET_PATH, 'r') as csvfile:
-        reader = csv.DictReader(csvfile)
+    export_compact_model(vectorizer, forest, COMPACT_MODEL_PATH)
 
-        unprocessed_data = []
-        labels = []
-        for row in reader:
-            unprocessed_data.append(row['sentence'])
-            labels.append(row['category'])
+    compact_model = CompactForestModel(COMPACT_MODEL_PATH)
+    expected = list(forest.predict(vectorized_data))
+    if compact_model.predict(normalized_data) != expected:
+        raise ValueError("Compact model predictions differ from forest's")
 
-        # process and vectorize data
-        vectorized_data = vectorize_data(unprocessed_data)
 
-        # train classifier
-        forest = RandomForestClassifier(n_estimators=10)
+def main():
+    """
+    Training classifier and then pickling it for use in chatbot
+    """
+    parser = argparse.ArgumentParser(description="Train classifier")
+    parser.add_argument('--dataset', default=DATASET_PATH)
+    parser.add_argument('--processes', type=int, default=None,
+                        help='lemmatizing processes, number of cpus '
+                             'by default')
+    parser.add_argument('--chunk-size', type=int, default=CHUNK_SIZE)
+    parser.add_argument('--trees', type=int, default=N_ESTIMATORS)
+    parser.add_argument('--jobs', type=int, default=-1,
+                        help='threads fitting trees, all cpus by default')
+    args = parser.parse_args()
+
+    with profile('normalize'):
+        normalized_data, labels = normalize_dataset(
+            args.dataset, args.processes, args.chunk_size
+        )
+
+    # features stay sparse, forest is fitted on sparse matrix as well
+    with profile('vectorize'):
+        vectorized_data, vectorizer = vectorize_data(normalized_data)
+
+    with profile('fit'):
+        forest = RandomForestClassifier(n_estimators=args.trees,
+                                        n_jobs=args.jobs)
         forest.fit(vectorized_data, labels)
 
-        # pickling classifier
+    with profile('save'):
+        joblib.dump(vectorizer, VECTORIZER_PATH)
         joblib.dump(forest, CLASSIFIER_PATH)
 
+    with profile('compact'):
+        export_compact(vectorizer, forest, normalized_data, vectorized_data)
+
 
 if __name__ == '__main__':
     main()